@@ -1,23 +1,453 @@
+import hashlib
+import json
+import os
+import numpy as np
 import pandas as pd
 import re
+from ultis import weight_series
+
+# 缓存格式版本号，解析逻辑或缓存内容变化时加1，旧缓存自动失效
+CACHE_VERSION = 1
+# 缓存目录下记录 文件路径 -> (大小, mtime, 内容哈希) 的索引文件
+CACHE_INDEX_NAME = 'index.json'
+
+# 按需加载(lazy)模式下首次加载就读入的列：样本筛选和按ID查找都要用到
+LAZY_CORE_COLUMNS = ('ID', '样本状态')
+# 与pd.read_excel默认na_values一致的缺失值字符串，保证按需加载与整表读取结果相同
+EXCEL_NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+])
+
+# 本进程内的缓存命中统计
+_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def get_cache_stats():
+    """
+    返回本进程内SurveyData缓存的命中统计
+    返回
+        dict: {'hits': 命中次数, 'misses': 未命中次数, 'hit_rate': 命中率(0~1)}
+    """
+    total = _cache_stats['hits'] + _cache_stats['misses']
+    return {
+        'hits': _cache_stats['hits'],
+        'misses': _cache_stats['misses'],
+        'hit_rate': _cache_stats['hits'] / total if total else 0.0
+    }
+
+
+def reset_cache_stats():
+    """清零缓存命中统计"""
+    _cache_stats['hits'] = 0
+    _cache_stats['misses'] = 0
+
+
+def file_content_hash(source, chunk_size=1 << 20):
+    """
+    计算文件内容的sha1哈希
+    source: 文件路径，或file-like对象（如streamlit的UploadedFile）
+    """
+    h = hashlib.sha1()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                h.update(chunk)
+        return h.hexdigest()
+    # file-like: 读完后把指针放回原处，不影响后续读取
+    pos = source.tell() if hasattr(source, 'tell') else None
+    if hasattr(source, 'getvalue'):
+        h.update(source.getvalue())
+    else:
+        source.seek(0)
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            h.update(chunk)
+    if pos is not None:
+        source.seek(pos)
+    return h.hexdigest()
+
 
 class SurveyData:
     """
     处理问卷调查数据的类，支持从Excel文件读取数据，
     解析题目信息，获取被试答题数据等功能。
     """
-    def __init__(self, filename):
+    def __init__(self, filename, cache_dir=None, lazy=False, compact=False, weight_col=None):
+        """
+        filename:  Excel文件路径或file-like对象
+        cache_dir: 缓存目录。指定后，首次读取会把df和qinfo写入缓存，
+                   之后读取同一内容的文件直接从缓存加载，跳过Excel解析
+        lazy:      按需加载模式。只解析表头和ID/样本状态列，其余列在
+                   get_answers_by_qid/load_qids 用到时才以只读流式方式读入df
+        compact:   紧凑存储模式，加载后调用compact()，见该方法说明
+        weight_col: 样本权重列名，指定后所有指标按加权计算，见set_weights
+        """
+        self._init_state()
+        if lazy:
+            if cache_dir is not None:
+                raise ValueError("lazy模式与cache_dir不能同时使用。")
+            self._init_lazy(filename)
+        elif cache_dir is not None:
+            self._load_with_cache(filename, cache_dir)
+        else:
+            self.df = self.read_excel(filename)
+            # qinfo: pandas DataFrame，存储问卷题目的元数据信息
+            # 包含字段:
+            # - raw_col: 原始Excel列名
+            # - original_qid: 提取的原始题号前缀（如S66、M10、F3等）
+            # - question_id: 题号的数字部分
+            # - qtype: 题型（S:单选题, M:多选题, F:开放题, R:排序题, META:元数据列）
+            # - short_name: 简化后的列名
+            self.qinfo = self.parse_headers(self.df.columns)
+        if compact:
+            self.compact()
+        if weight_col is not None:
+            self.set_weights(weight_col)
+
+    def _init_state(self):
+        """初始化与数据来源无关的状态字段"""
+        # 文件内容哈希（仅在使用缓存时计算）及本次是否命中缓存
+        self.source_hash = None
+        self.cache_hit = False
+        # 按需加载模式的数据源；为None表示df已包含全部列
+        self._lazy_source = None
+        # 是否已转为紧凑存储，及转换前后的内存报告
+        self._compact = False
+        self.memory_report = None
+        # 样本权重列名；为None表示不加权
+        self.weight_col = None
+
+    @classmethod
+    def from_frames(cls, df, qinfo=None, weight_col=None):
+        """
+        由已有的df（和qinfo）直接构造SurveyData，不读Excel
+        qinfo为None时按df列名解析；weight_col为样本权重列名
+        """
+        survey = cls.__new__(cls)
+        survey._init_state()
+        survey.df = df
+        survey.qinfo = qinfo if qinfo is not None else survey.parse_headers(df.columns)
+        if weight_col is not None:
+            survey.set_weights(weight_col)
+        return survey
+
+    def to_pickle(self, path):
+        """把当前df和qinfo（含筛选、衍生列、权重列设置）保存为快照文件，可用from_pickle快速恢复"""
+        pd.to_pickle({'df': self.df, 'qinfo': self.qinfo, 'weight_col': self.weight_col}, path, protocol=5)
+
+    @classmethod
+    def from_pickle(cls, path):
+        """从to_pickle保存的快照恢复SurveyData"""
+        snapshot = pd.read_pickle(path)
+        return cls.from_frames(snapshot['df'], snapshot['qinfo'], weight_col=snapshot.get('weight_col'))
+
+    def set_weights(self, weights, name='weight'):
+        """
+        设置样本权重，之后NPS/NSS/排序题/多选题/交叉分析等全部指标按加权计算
+        weights: 已有的权重列名；或与df行对齐的Series/数组（作为META衍生列name加入df）；
+                 None表示取消加权
+        权重缺失记为0（不计入），负数报错
+        """
+        if weights is None:
+            self.weight_col = None
+            return
+        if isinstance(weights, str):
+            if self._lazy_source is not None and weights in self._col_pos:
+                self.load_columns([weights])
+            if weights not in self.df.columns:
+                raise ValueError(f"权重列{weights}不存在。")
+            weight_series(self.df[weights], self.df.index)
+            self.weight_col = weights
+            return
+        values = weight_series(weights, self.df.index)
+        self.add_derived_column(name, values, name, qtype='META')
+        self.weight_col = name
+
+    @property
+    def weights(self):
+        """与df行对齐的float权重Series；未设置权重时为None"""
+        if self.weight_col is None:
+            return None
+        return weight_series(self.df[self.weight_col], self.df.index)
+
+    @staticmethod
+    def read_excel(filename):
+        """读取Excel第一个sheet，所有单元格按字符串读入，缺失值统一为pd.NA"""
         # 只读取第一个sheet，sheet_name=0表示第一个sheet
-        self.df = pd.read_excel(filename, sheet_name=0, dtype=str)
-        self.df = self.df.fillna(value=pd.NA)
-        # qinfo: pandas DataFrame，存储问卷题目的元数据信息
-        # 包含字段:
-        # - raw_col: 原始Excel列名
-        # - original_qid: 提取的原始题号前缀（如S66、M10、F3等）
-        # - question_id: 题号的数字部分
-        # - qtype: 题型（S:单选题, M:多选题, F:开放题, R:排序题, META:元数据列）
-        # - short_name: 简化后的列名
+        df = pd.read_excel(filename, sheet_name=0, dtype=str)
+        return df.fillna(value=pd.NA)
+
+    def _load_with_cache(self, filename, cache_dir):
+        """
+        带缓存的加载：以文件内容哈希为键。
+        对路径输入，若文件大小和mtime与索引记录一致，直接复用记录的哈希，
+        否则重新计算哈希；哈希对应的缓存文件不存在时才解析Excel。
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.source_hash = self._resolve_hash(filename, cache_dir)
+        cache_path = os.path.join(cache_dir, f"{self.source_hash}_v{CACHE_VERSION}.pkl")
+        if os.path.exists(cache_path):
+            try:
+                cached = pd.read_pickle(cache_path)
+                self.df, self.qinfo = cached['df'], cached['qinfo']
+                self.cache_hit = True
+                _cache_stats['hits'] += 1
+                return
+            except Exception as e:
+                # 缓存损坏时按未命中处理，重新解析
+                print(f"缓存文件读取失败，将重新解析Excel: {e}")
+        _cache_stats['misses'] += 1
+        self.df = self.read_excel(filename)
         self.qinfo = self.parse_headers(self.df.columns)
+        # 先写临时文件再替换，避免并发读到写了一半的缓存
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        pd.to_pickle({'df': self.df, 'qinfo': self.qinfo}, tmp_path, protocol=5)
+        os.replace(tmp_path, cache_path)
+
+    @staticmethod
+    def _resolve_hash(filename, cache_dir):
+        """取文件内容哈希；路径输入通过 (大小, mtime) 判断是否需要重新计算"""
+        if not isinstance(filename, (str, os.PathLike)):
+            return file_content_hash(filename)
+        index_path = os.path.join(cache_dir, CACHE_INDEX_NAME)
+        try:
+            with open(index_path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        key = os.path.abspath(filename)
+        st = os.stat(filename)
+        entry = index.get(key)
+        if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+            return entry['hash']
+        digest = file_content_hash(filename)
+        index[key] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': digest}
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, index_path)
+        return digest
+
+    def _init_lazy(self, filename):
+        """按需加载模式初始化：一次扫描读表头生成qinfo，同时读入核心列"""
+        self._lazy_source = filename
+        header, core = self._scan_sheet(LAZY_CORE_COLUMNS)
+        self.qinfo = self.parse_headers(header)
+        self._col_pos = {col: i for i, col in enumerate(header)}
+        self.df = pd.DataFrame(core, index=pd.RangeIndex(self._n_rows), dtype=object)
+
+    def _open_sheet(self):
+        """以openpyxl只读模式打开第一个sheet，返回(workbook, worksheet)"""
+        from openpyxl import load_workbook
+        if hasattr(self._lazy_source, 'seek'):
+            self._lazy_source.seek(0)
+        wb = load_workbook(self._lazy_source, read_only=True, data_only=True)
+        ws = wb.worksheets[0]
+        # 部分导出文件记录的表格范围不准确，与pandas一样重置后按实际内容读取
+        ws.reset_dimensions()
+        return wb, ws
+
+    @staticmethod
+    def _make_header(raw_header):
+        """按pd.read_excel的规则处理表头：空列名记为Unnamed: i，重名依次加.1/.2后缀"""
+        header, seen = [], {}
+        for i, name in enumerate(raw_header):
+            name = f"Unnamed: {i}" if name is None or name == '' else str(name)
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            header.append(name)
+        return header
+
+    def _scan_sheet(self, core_cols):
+        """
+        流式扫描一遍sheet：取表头，统计数据行数（去掉末尾的全空行），
+        并顺带读出core_cols中存在的列
+        返回 (header, {列名: 值list})
+        """
+        wb, ws = self._open_sheet()
+        try:
+            rows = ws.iter_rows(values_only=True)
+            header = self._make_header(next(rows, ()))
+            core = {c: header.index(c) for c in core_cols if c in header}
+            values = {c: [] for c in core}
+            n_rows = 0
+            for i, row in enumerate(rows, start=1):
+                width = len(row)
+                for c, pos in core.items():
+                    values[c].append(self._cell_to_str(row[pos]) if pos < width else pd.NA)
+                if any(v is not None and v != '' for v in row):
+                    n_rows = i
+        finally:
+            wb.close()
+        self._n_rows = n_rows
+        return header, {c: v[:n_rows] for c, v in values.items()}
+
+    @staticmethod
+    def _cell_to_str(value):
+        """按pd.read_excel(dtype=str)的规则把单元格值转为字符串，缺失值为pd.NA"""
+        if value is None:
+            return pd.NA
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        value = str(value)
+        return pd.NA if value in EXCEL_NA_STRINGS else value
+
+    def load_columns(self, cols):
+        """
+        按需加载模式下，把尚未读入的原始列流式读入df（一次扫描读取全部缺失列）。
+        已有的列不会重复读取；非lazy模式下不做任何事。
+        """
+        if self._lazy_source is None:
+            return
+        missing = [c for c in dict.fromkeys(cols) if c not in self.df.columns]
+        if not missing:
+            return
+        positions = [self._col_pos[c] for c in missing]
+        values = [[] for _ in missing]
+        wb, ws = self._open_sheet()
+        try:
+            rows = ws.iter_rows(min_row=2, max_row=self._n_rows + 1, values_only=True)
+            for row in rows:
+                width = len(row)
+                for buf, pos in zip(values, positions):
+                    buf.append(self._cell_to_str(row[pos]) if pos < width else pd.NA)
+        finally:
+            wb.close()
+        loaded = pd.DataFrame(dict(zip(missing, values)), index=pd.RangeIndex(self._n_rows), dtype=object)
+        # df可能已被drop_invalid_samples等筛选过，按保留的行号对齐
+        loaded = loaded.loc[self.df.index]
+        if self._compact:
+            loaded = pd.DataFrame({c: self._compact_series(loaded[c])[0] for c in loaded.columns})
+        self.df = pd.concat([self.df, loaded], axis=1)
+
+    def append_responses(self, source, valid_only=False, status_col='样本状态', valid_value='有效'):
+        """
+        增量模式：从更新后的导出中只读入df中还没有的ID，追加到df末尾，已有样本不重新处理
+        source: 新导出的Excel路径/file-like对象，或已读入的DataFrame（列名为原始表头）
+        valid_only: 为True时只追加样本状态为有效的新样本（与drop_invalid_samples一致）
+        返回
+            新增样本的DataFrame（index为其在df中的行号），可直接交给incremental模块累加统计量
+        说明
+            新导出中新增的列会登记到qinfo，已有样本在这些列上为缺失；
+            衍生列（如收入分组、权重）对新增样本为缺失，需要重新生成
+            （incremental.IncrementalSurvey的prepare回调会对新增样本重新生成并写回）
+        """
+        if self._lazy_source is not None:
+            raise ValueError("lazy模式不支持追加样本，请先完整读入数据。")
+        new = source if isinstance(source, pd.DataFrame) else self.read_excel(source)
+        # 按字符串比较ID：source为DataFrame时ID可能是数值，紧凑存储下已有ID列为category
+        known = set(self._df['ID'].dropna().astype(str))
+        new = new[new['ID'].notna() & ~new['ID'].astype(str).isin(known)]
+        new = new.drop_duplicates('ID')
+        if valid_only:
+            new = new[new[status_col] == valid_value]
+        extra = [c for c in new.columns if c not in self._df.columns]
+        start = int(self._df.index.max()) + 1 if len(self._df) else 0
+        delta = new.reset_index(drop=True).reindex(columns=list(self._df.columns) + extra)
+        delta.index = pd.RangeIndex(start, start + len(delta))
+        if extra:
+            self.qinfo = pd.concat([self._qinfo, self.parse_headers(extra)], ignore_index=True)
+        if self._compact:
+            delta = pd.DataFrame({c: self._match_dtype(delta[c], self._df[c].dtype if c in self._df.columns else None)
+                                  for c in delta.columns}, index=delta.index)
+        combined = pd.concat([self._df, delta])
+        if self._compact:
+            # 两批category类别不同时concat会退化为object，合并类别后恢复
+            for col in self._df.columns:
+                if isinstance(self._df[col].dtype, pd.CategoricalDtype) and combined[col].dtype == object:
+                    combined[col] = combined[col].astype('category')
+        self.df = combined
+        return delta
+
+    def _match_dtype(self, ser, dtype):
+        """紧凑存储模式下把新增样本的列转换为与已有列相同的类型（转换会丢值时保持原样）"""
+        if dtype is None:
+            return self._compact_series(ser)[0]
+        if isinstance(dtype, pd.BooleanDtype):
+            selected = ser.notna().to_numpy()
+            return pd.Series(pd.arrays.BooleanArray(selected.copy(), ~selected), index=ser.index, name=ser.name)
+        if isinstance(dtype, pd.api.extensions.ExtensionDtype) and dtype.kind in 'iu':
+            num = pd.to_numeric(ser, errors='coerce')
+            info = np.iinfo(dtype.numpy_dtype)
+            lossless = ser.dropna().empty or self._is_int_text(ser.dropna())
+            if lossless and (num.dropna().between(info.min, info.max)).all():
+                return num.astype(dtype)
+        return ser
+
+    def load_qids(self, *original_qids):
+        """按需加载模式下预先读入若干题号的全部列（合并成一次扫描）"""
+        cols = []
+        for qid in original_qids:
+            cols.extend(self.get_columns_by_original_qid(qid))
+        self.load_columns(cols)
+
+    def compact(self):
+        """
+        把df转换为紧凑存储，返回转换前后的内存报告（同时保存在self.memory_report）：
+        - R列（排名）：取值全为整数时存为可空小整数Int8/16/32
+        - S/META列：重复值较多时存为category（类别仍为原字符串，交叉表/分组标签与完整读入时一致）
+        - M题选项列：存为可空boolean掩码，选中为True、未选为<NA>，notna()语义不变
+        - 开放题、M题填空列保持字符串
+        to_numeric_series、calc_nps_from_series、multiple_choice_dummy等可直接使用转换后的列。
+        """
+        before = self.df.memory_usage(deep=True, index=False)
+        kinds, converted = {}, {}
+        for col in self.df.columns:
+            converted[col], kinds[col] = self._compact_series(self.df[col])
+        self.df = pd.DataFrame(converted, index=self.df.index)
+        self._compact = True
+        after = self.df.memory_usage(deep=True, index=False)
+        report = pd.DataFrame({
+            '存储类型': pd.Series(kinds),
+            '压缩前(MB)': before / 1e6,
+            '压缩后(MB)': after / 1e6,
+        })
+        report = report.groupby('存储类型').agg(
+            列数=('压缩前(MB)', 'size'), **{'压缩前(MB)': ('压缩前(MB)', 'sum'), '压缩后(MB)': ('压缩后(MB)', 'sum')}
+        )
+        report.loc['合计'] = [len(kinds), before.sum() / 1e6, after.sum() / 1e6]
+        report['列数'] = report['列数'].astype(int)
+        self.memory_report = report
+        return report
+
+    def _compact_series(self, ser):
+        """按题型把单列转换为紧凑类型，返回 (新Series, 存储类型)"""
+        if ser.dtype != object:
+            return ser, 'unchanged'
+        info = self._col_index.get(ser.name, {})
+        qtype = info.get('qtype', 'META')
+        short_name = info.get('short_name', '')
+        if qtype == 'M' and '填空' not in str(short_name):
+            selected = ser.notna().to_numpy()
+            return pd.Series(pd.arrays.BooleanArray(selected.copy(), ~selected), index=ser.index, name=ser.name), 'bool_mask'
+        if qtype not in ('S', 'R', 'META'):
+            return ser, 'unchanged'
+        nonnull = ser.dropna()
+        # 只有排名列转为整数：S列的取值是交叉表/分组的标签，转成整数会改变标签类型与排序；
+        # ID等META列是标识符；排名列也只在能原样还原为字符串时转换
+        if qtype == 'R' and self._is_int_text(nonnull):
+            num = pd.to_numeric(nonnull)
+            for dtype in ('Int8', 'Int16', 'Int32'):
+                bounds = np.iinfo(dtype.lower())
+                if bounds.min <= num.min() and num.max() <= bounds.max:
+                    return pd.to_numeric(ser, errors='coerce').astype(dtype), 'small_int'
+        if nonnull.nunique() <= len(ser) // 2:
+            return ser.astype('category'), 'category'
+        return ser, 'unchanged'
+
+    @staticmethod
+    def _is_int_text(nonnull):
+        """非空字符串值全为整数的规范写法（转为整数再转回字符串不变），如'10'，不含'007'、'1.0'、'+1'"""
+        if nonnull.empty:
+            return False
+        num = pd.to_numeric(nonnull, errors='coerce')
+        # 只转换为Int8/16/32，超出范围的直接跳过
+        if num.isna().any() or (num % 1 != 0).any() or num.abs().max() >= 2 ** 31:
+            return False
+        return (num.astype(np.int64).astype(str) == nonnull.astype(str)).all()
 
     def parse_headers(self, columns):
         """
@@ -66,34 +496,141 @@ class SurveyData:
         else:
             return col[:60].replace('\n','').strip()  # 保留60字符、去换行和前后空白
 
+    @property
+    def df(self):
+        """答题数据DataFrame；重新赋值（如筛选有效样本）后ID索引会在下次查找时重建"""
+        return self._df
+
+    @df.setter
+    def df(self, value):
+        self._df = value
+        self._id_index = None
+
+    @property
+    def qinfo(self):
+        """题目元数据DataFrame；重新赋值后自动重建题号/列名索引"""
+        return self._qinfo
+
+    @qinfo.setter
+    def qinfo(self, value):
+        self._qinfo = value
+        self.refresh_index()
+
+    def refresh_index(self):
+        """
+        根据qinfo一次性构建查找索引，替代每次查询时对qinfo的布尔扫描：
+        - _qid_index: original_qid -> {cols, qtype, short_name, option_cols, option_names, txt_cols, txt_names}
+        - _col_index: raw_col -> 该列qinfo记录(dict)
+        - _type_index: qtype -> 列名list
+        直接原地修改qinfo（如qinfo.loc[...] = ...）后需手动调用本方法。
+        """
+        qid_index, col_index, type_index, short_names = {}, {}, {}, {}
+        for rec in self._qinfo.to_dict('records'):
+            col = rec['raw_col']
+            col_index.setdefault(col, rec)
+            short_names[col] = rec['short_name']
+            type_index.setdefault(rec['qtype'], []).append(col)
+            entry = qid_index.get(rec['original_qid'])
+            if entry is None:
+                entry = qid_index[rec['original_qid']] = {
+                    'cols': [], 'qtype': rec['qtype'], 'short_name': rec['short_name'],
+                    'option_cols': [], 'option_names': {}, 'txt_cols': [], 'txt_names': {}
+                }
+            entry['cols'].append(col)
+            # 填空列（短名包含"填空"）单独归类，其余为定量选项
+            kind = 'txt' if isinstance(rec['short_name'], str) and '填空' in rec['short_name'] else 'option'
+            entry[f'{kind}_cols'].append(col)
+            entry[f'{kind}_names'][col] = rec['short_name']
+        self._qid_index = qid_index
+        self._col_index = col_index
+        self._type_index = type_index
+        self._short_names = short_names
+
+    def _id_positions(self):
+        """ID -> 当前df中的行位置（同一ID重复时取第一次出现），首次使用时构建"""
+        if self._id_index is None:
+            index = {}
+            for pos, rid in enumerate(self._df['ID'].tolist()):
+                if not pd.isna(rid) and rid not in index:
+                    index[rid] = pos
+            self._id_index = index
+        return self._id_index
+
+    @property
+    def short_names(self):
+        """{原始列名: 题目短名}，只读，请勿修改"""
+        return self._short_names
+
+    def add_derived_column(self, raw_col, values, original_qid, qtype='S', short_name=None):
+        """
+        添加衍生列（如收入分组g1），同时登记到qinfo并更新索引
+        raw_col: 新列名；values: 与df行对齐的Series或数组
+        original_qid/qtype/short_name: 新列在qinfo中的题号、题型和短名
+        """
+        self._df[raw_col] = values
+        if raw_col not in self._col_index:
+            self.qinfo = pd.concat([
+                self._qinfo,
+                pd.DataFrame([{
+                    'raw_col': raw_col,
+                    'original_qid': original_qid,
+                    'question_id': original_qid,
+                    'qtype': qtype,
+                    'short_name': short_name if short_name is not None else raw_col
+                }])
+            ], ignore_index=True)
+
     def get_columns_by_type(self, qtype):
-        return self.qinfo.loc[self.qinfo['qtype'] == qtype, 'raw_col'].tolist()
+        return list(self._type_index.get(qtype, []))
     
     def get_columns_by_original_qid(self, original_qid):
-        mask = self.qinfo['original_qid'] == original_qid
-        cols = self.qinfo.loc[mask, 'raw_col'].tolist()
-        if not cols:
+        entry = self._qid_index.get(original_qid)
+        if entry is None:
             # 可用print也可用raise，更严谨用raise
             raise ValueError(f"没有找到题号 '{original_qid}' 对应的题目字段，请检查题号是否输入正确。")
-        return cols
+        return list(entry['cols'])
+
+    def get_qtype(self, original_qid):
+        """返回题号的主要题型（多列时取第一列的题型）"""
+        entry = self._qid_index.get(original_qid)
+        if entry is None:
+            raise ValueError(f"没有找到题号'{original_qid}'，请检查输入。")
+        return entry['qtype']
+
+    def get_qid_label(self, original_qid):
+        """返回题号第一列的短名，用作结果表标签"""
+        entry = self._qid_index.get(original_qid)
+        if entry is None:
+            raise ValueError(f"没有找到题号'{original_qid}'，请检查输入。")
+        return entry['short_name']
+
+    def get_multi_choice_info(self, original_qid):
+        """
+        返回 (选择项列名list, 填空型列名list, 选项短名dict, 填空短名dict)，与preprocess_multi_choice一致。
+        返回的是副本，调用方可以自由修改。
+        """
+        entry = self._qid_index.get(original_qid)
+        if entry is None:
+            return [], [], {}, {}
+        return (list(entry['option_cols']), list(entry['txt_cols']),
+                dict(entry['option_names']), dict(entry['txt_names']))
 
     def get_question_info(self, col):
         """
         根据列名获取题目信息。
         """
-        row = self.qinfo[self.qinfo.raw_col == col]
-        if row.empty:
-            return {}
-        return row.iloc[0].to_dict()
+        rec = self._col_index.get(col)
+        return dict(rec) if rec is not None else {}
 
     def get_answer(self, respondent_id):
         """
         根据ID获取被试的答题数据。
+        按需加载模式下只包含已读入的列。
         """
-        row = self.df[self.df['ID'] == respondent_id]
-        if row.empty:
+        pos = self._id_positions().get(respondent_id)
+        if pos is None:
             return {}
-        return row.iloc[0].to_dict()
+        return self._df.iloc[pos].to_dict()
 
     def get_answers_by_qid(self, original_qid, return_qtype=False):
         """
@@ -101,19 +638,18 @@ class SurveyData:
         return_qtype: 若True同时返回主要题型
         """
         # 1. 找所有相关列名（原始列）
-        mask = self.qinfo['original_qid'] == original_qid
-        cols = self.qinfo.loc[mask, 'raw_col'].tolist()
-        if not cols:
+        entry = self._qid_index.get(original_qid)
+        if entry is None:
             raise ValueError(f"没有找到题号'{original_qid}'，请检查输入。")
-        # 2. 切DataFrame取实际答案数据
-        answers = self.df[cols]
+        cols = entry['cols']
+        # 2. 切DataFrame取实际答案数据（按需加载模式下先读入这些列）
+        self.load_columns(cols)
+        answers = self._df[cols]
         if not return_qtype:
             return answers
         else:
             # 返回主要题型（可能有多列题型不一致，这里取第一个为主）
-            match_rows = self.qinfo[mask]
-            qtype = match_rows.iloc[0]['qtype'] if not match_rows.empty else None
-            return answers, qtype
+            return answers, entry['qtype']
 
 # ==== 示例测试 ====
 if __name__ == '__main__':
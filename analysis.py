@@ -1,13 +1,15 @@
 from ultis import *
 from metrics_cal import *
+from metric_results import *
 from cross_analysis import cross_analysis
 
-def cross_analysis_handler(survey, cross_args):
+def cross_analysis_handler(survey, cross_args, as_result=False):
     """
     处理交叉分析
     参数:
         survey: SurveyData对象
         cross_args: 交叉分析参数
+        as_result: 为True时频数交叉表以CrossTabResult、单选NPS交叉以NPSResult返回
     返回:
         all_tables: 包含所有交叉分析结果的字典
     """
@@ -25,7 +27,8 @@ def cross_analysis_handler(survey, cross_args):
         row_qid=row_qid,
         col_qid=col_qid,
         row_labels=row_labels,
-        is_nps=is_nps
+        is_nps=is_nps,
+        as_result=as_result
     )
 
     # 处理结果
@@ -35,61 +38,64 @@ def cross_analysis_handler(survey, cross_args):
         all_tables.update(cross_result)
     else:
         # 获取行变量标签
-        row_label = survey.qinfo.loc[survey.qinfo['original_qid'] == row_qid, 'short_name'].iloc[0]
+        row_label = survey.get_qid_label(row_qid)
         all_tables[row_label] = cross_result
 
     return all_tables
 
-def nps_analysis(survey, qid):
+def nps_analysis(survey, qid, as_result=False):
     """
     处理NPS分析
     参数:
         survey: SurveyData对象
         qid: 题号
+        as_result: 为True时返回NPSResult数值结果，否则返回字符串表
     返回:
         table: 包含NPS分析结果的字典
     """
     answers, qtype = survey.get_answers_by_qid(qid, return_qtype=True)
     check_question_type(qtype, 'S', qid)
-    nps_df = nps_table(answers) 
+    result = NPSResult.from_series(answers, weights=survey.weights, qid=qid)
     table = {}
-    table[qid] = nps_df
+    table[qid] = result if as_result else result.render()
     print(f'{qid} NPS 分析完成!')
     return table
 
-def nss_analysis(survey, qid):
+def nss_analysis(survey, qid, as_result=False):
     """
     处理NSS分析
     参数:
         survey: SurveyData对象
         qid: 题号
+        as_result: 为True时返回NSSResult数值结果，否则返回字符串表
     返回:
         table: 包含NSS分析结果的字典
     """
     answers, qtype = survey.get_answers_by_qid(qid, return_qtype=True)
     check_question_type(qtype, 'S', qid)
-    subtitle_map = survey.qinfo.set_index('raw_col')['short_name'].to_dict()
-    nss_df = calc_nss_table(answers, short_names=subtitle_map)
+    subtitle_map = survey.short_names
+    result = NSSResult.from_frame(answers, short_names=subtitle_map, weights=survey.weights, qid=qid)
     table = {}
-    table[qid] = nss_df
+    table[qid] = result if as_result else result.render()
     print(f'{qid} NSS 分析完成!')
     return table
 
-def nss_detail_analysis(survey, qid):
+def nss_detail_analysis(survey, qid, as_result=False):
     """
     处理NSS详细分析
     参数:
         survey: SurveyData对象
         qid: 题号
+        as_result: 为True时返回ChoiceDetailResult数值结果，否则返回字符串表
     返回:
         table: 包含NSS详细分析结果的字典
     """
     answers, qtype = survey.get_answers_by_qid(qid, return_qtype=True)
     check_question_type(qtype, 'M', qid)
-    options_cols, txt_cols, option_names, _ = preprocess_multi_choice(survey.qinfo, qid)
-    multi_df = calc_nss_detail(survey.df, options_cols, option_names)
+    options_cols, txt_cols, option_names, _ = preprocess_multi_choice(survey, qid)
+    result = ChoiceDetailResult.from_frame(survey.df, options_cols, option_names, weights=survey.weights, qid=qid)
     table = {}
-    table[qid] = multi_df
+    table[qid] = result if as_result else result.render()
     print(f'{qid} NSS 分析完成!')
     
     multi_text = collect_openended_texts(survey.df, txt_cols)
@@ -97,23 +103,26 @@ def nss_detail_analysis(survey, qid):
     print(f'{qid} NSS细节 导出完成!')
     return table
 
-def rank_analysis(survey, qid):
+def rank_analysis(survey, qid, max_rank=5, rank_weights=None, as_result=False):
     """
     处理排序题分析
     参数:
         survey: SurveyData对象
         qid: 题号
+        max_rank: 统计的最大排名，默认5（前5名）；None时取数据中的最大排名
+        rank_weights: 可选，第1名~第max_rank名的权重，默认max_rank~1
+        as_result: 为True时返回RankResult数值结果，否则返回字符串表
     返回:
         table: 包含排序题分析结果的字典
     """
     answers, qtype = survey.get_answers_by_qid(qid, return_qtype=True)
     check_question_type(qtype, 'R', qid)
-    options_cols, txt_cols, option_names, _ = preprocess_multi_choice(survey.qinfo, qid)
-    max_rank = 5
-    subtitle_map = survey.qinfo.set_index('raw_col')['short_name'].to_dict()
-    rank_df = rank_table(answers, max_rank, options_cols, short_names=subtitle_map)
+    options_cols, txt_cols, option_names, _ = preprocess_multi_choice(survey, qid)
+    subtitle_map = survey.short_names
+    result = RankResult.from_frame(answers, max_rank, options_cols, short_names=subtitle_map,
+                                   rank_weights=rank_weights, weights=survey.weights, qid=qid)
     table = {}
-    table[qid] = rank_df
+    table[qid] = result if as_result else result.render()
 
     rank_text = collect_openended_texts(survey.df, txt_cols)
     table['others'] = pd.DataFrame({'others补充': rank_text})
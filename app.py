@@ -1,11 +1,14 @@
 import streamlit as st
 import pandas as pd
-import os
-from Survey_Data import SurveyData
+import io
+from Survey_Data import SurveyData, file_content_hash
 from ultis import *
 from metrics_cal import nps_table, calc_nps_from_series, calc_nss_from_series
 from cross_analysis import cross_analysis
 from analysis import *
+from batch_runner import run_analysis
+from metric_results import MetricResult
+from charts import result_figure
 # 设置页面配置
 st.set_page_config(
     page_title="NPS分析工具",
@@ -17,14 +20,53 @@ st.set_page_config(
 st.title("NPS分析工具")
 st.markdown("这是一个用于分析问卷调查数据的交互式工具，支持NPS、NSS、排序题等多种分析类型。")
 
+
+@st.cache_resource(show_spinner="读取数据中...", max_entries=8)
+def load_survey(file_hash, _file_bytes):
+    """
+    按上传文件的内容哈希缓存解析并筛选后的问卷数据，
+    只有上传了内容不同的文件才会重新解析Excel
+    """
+    survey = SurveyData(io.BytesIO(_file_bytes))
+    survey.df = drop_invalid_samples(survey.df)
+    survey.source_hash = file_hash
+    return survey
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def run_cached_analysis(file_hash, analysis_type, qid=None, cross_args=None, _survey=None):
+    """
+    按 (文件哈希, 分析类型, 题号, 交叉参数) 缓存分析结果，相同参数再次运行直接返回；
+    超过max_entries时按最近最少使用淘汰
+    返回 {label: 数值结果对象或DataFrame}（展示时再render）
+    """
+    if analysis_type == 'cross':
+        return cross_analysis_handler(_survey, cross_args, as_result=True)
+    return run_analysis(_survey, analysis_type, qid, as_result=True)
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def cached_figure(file_hash, analysis_type, qid, cross_args, label, _result):
+    """
+    按与分析结果相同的键缓存plotly图，控件交互触发的重跑不会重新作图；
+    图只由聚合后的数值生成，传到浏览器的数据量与样本量无关
+    """
+    return result_figure(_result)
+
+
+def display_table(item):
+    """数值结果对象渲染为展示表，其他（如开放题文本表）原样返回"""
+    return item.render() if isinstance(item, MetricResult) else item
+
+
 # 文件上传部分
 st.sidebar.header("数据上传")
 uploaded_file = st.sidebar.file_uploader("上传Excel文件", type="xlsx")
 
 if uploaded_file is not None:
-    # 读取数据
-    survey = SurveyData(uploaded_file)
-    survey.df = drop_invalid_samples(survey.df)
+    # 读取数据（按内容哈希缓存，控件交互触发的重跑不会重新解析）
+    file_hash = file_content_hash(uploaded_file)
+    survey = load_survey(file_hash, uploaded_file.getvalue())
     st.session_state['survey'] = survey
     st.success("数据加载成功！")
     
@@ -58,15 +100,10 @@ if analysis_type in ['nps', 'nss', 'nss_detail', 'rank']:
     # 运行分析按钮
     if st.sidebar.button("运行分析"):
         with st.spinner("分析中..."):
-            if analysis_type == 'nps':
-                result = nps_analysis(survey, qid)
-            elif analysis_type == 'nss':
-                result = nss_analysis(survey, qid)
-            elif analysis_type == 'nss_detail':
-                result = nss_detail_analysis(survey, qid)
-            elif analysis_type == 'rank':
-                result = rank_analysis(survey, qid)
+            result = run_cached_analysis(file_hash, analysis_type, qid=qid, _survey=survey)
             st.session_state['result'] = result
+            st.session_state['result_key'] = (file_hash, analysis_type, qid, None)
+            st.session_state.pop('export_bytes', None)
             st.success("分析完成！")
 elif analysis_type == 'cross':
     # 添加计算方式选择框
@@ -75,13 +112,13 @@ elif analysis_type == 'cross':
     # 添加计算方式选择框
     calc_method = st.sidebar.selectbox('计算方式', ['不计算', 'NPS'], index=0)
     # 根据题型和选择设置统计函数和行名
-    _, row_qtype = survey.get_answers_by_qid(row_col, return_qtype=True)
+    row_qtype = survey.get_qtype(row_col)
 
     col_col = st.sidebar.selectbox("选择列变量题号", qids)
 
     # 获取选项标签
-    row_meta = survey.qinfo[survey.qinfo['original_qid'] == row_col].iloc[0]
-    col_meta = survey.qinfo[survey.qinfo['original_qid'] == col_col].iloc[0]
+    row_meta = survey.get_question_info(survey.get_columns_by_original_qid(row_col)[0])
+    col_meta = survey.get_question_info(survey.get_columns_by_original_qid(col_col)[0])
     row_labels = row_meta.get('options', {})
     col_labels = col_meta.get('options', {})
 
@@ -95,37 +132,40 @@ elif analysis_type == 'cross':
     # 运行分析按钮（确保在交叉分析分支内）
     if st.sidebar.button("运行分析"):
         with st.spinner("分析中..."):
-            result = cross_analysis_handler(survey, cross_args)
+            result = run_cached_analysis(file_hash, analysis_type, cross_args=cross_args, _survey=survey)
             st.session_state['result'] = result
+            st.session_state['result_key'] = (file_hash, analysis_type, None, cross_args)
+            st.session_state.pop('export_bytes', None)
             st.success("分析完成！")
 
 # 显示结果
 if 'result' in st.session_state:
     st.header("分析结果")
     result = st.session_state['result']
-    
-    if analysis_type == 'cross':
-        for label, df in result.items():
+    result_key = st.session_state['result_key']
+    show_charts = st.sidebar.checkbox("显示图表", value=True)
+
+    for label, item in result.items():
+        if result_key[1] == 'cross':
             st.subheader(f"交叉分析结果: {label}")
-            st.dataframe(df)
-    else:
-        for label, df in result.items():
+        else:
             st.subheader(f"{label} 分析结果")
-            st.dataframe(df)
+        fig = cached_figure(*result_key, label, item) if show_charts else None
+        if fig is not None:
+            st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(display_table(item))
 
 # 导出功能
 if 'result' in st.session_state:
     st.sidebar.header("导出结果")
     if st.sidebar.button("导出到Excel"):
-        # 创建临时文件
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-            save_multi_tables_to_excel(result, "分析结果", analysis_type, os.path.dirname(tmp.name))
-            st.sidebar.success(f"结果已导出到: {tmp.name}")
-            st.sidebar.download_button(
-                label="下载Excel文件",
-                data=open(tmp.name, 'rb'),
-                file_name="分析结果.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-            os.unlink(tmp.name)
\ No newline at end of file
+        # 直接在内存中生成xlsx，不写临时文件
+        st.session_state['export_bytes'] = tables_to_excel_bytes(
+            {label: display_table(item) for label, item in result.items()})
+    if 'export_bytes' in st.session_state:
+        st.sidebar.download_button(
+            label="下载Excel文件",
+            data=st.session_state['export_bytes'],
+            file_name=f"分析结果_{st.session_state['result_key'][1]}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
@@ -0,0 +1,123 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from Survey_Data import SurveyData
+from analysis import cross_analysis_handler, nps_analysis, nss_analysis, nss_detail_analysis, rank_analysis
+
+# 分析类型 -> 处理函数；cross的参数为cross_args字典，其余为题号
+ANALYSIS_HANDLERS = {
+    'nps': nps_analysis,
+    'nss': nss_analysis,
+    'nss_detail': nss_detail_analysis,
+    'rank': rank_analysis,
+    'cross': cross_analysis_handler,
+}
+
+# 子进程中的SurveyData，由进程初始化函数从快照文件加载一次
+_worker_survey = None
+
+
+def run_analysis(survey, analysis_type, arg, as_result=False, **options):
+    """
+    执行单个分析任务
+    输入
+        survey: SurveyData对象
+        analysis_type: 'nps', 'nss', 'nss_detail', 'rank', 'cross'
+        arg: 题号（cross分析时为cross_args字典）
+        as_result: 为True时返回数值结果对象（见metric_results），否则为字符串表
+        options: 传给分析函数的其他参数（如rank的max_rank、rank_weights）
+    返回
+        {label: DataFrame或MetricResult}
+    """
+    handler = ANALYSIS_HANDLERS.get(analysis_type)
+    if handler is None:
+        raise ValueError(f"不支持的分析类型: {analysis_type}")
+    return handler(survey, arg, as_result=as_result, **options)
+
+
+def job_options(job):
+    """任务的附加参数：(类型, 参数, {附加参数}) 的第三项，没有时为{}"""
+    return dict(job[2]) if len(job) > 2 else {}
+
+
+def job_qids(job):
+    """返回任务用到的题号list"""
+    analysis_type, arg = job[0], job[1]
+    if analysis_type == 'cross':
+        return [arg['row_qid'], arg['col_qid']]
+    return [arg]
+
+
+def job_name(job):
+    """任务名称，用于合并结果时区分重名的表"""
+    return '_'.join(job_qids(job))
+
+
+def merge_results(jobs, results):
+    """
+    把各任务的 {label: DataFrame} 合并为一个字典；
+    不同任务出现同名表（如都有'others'）时，后出现的表名前加任务名，仍重名再加序号
+    """
+    merged = {}
+    for job, tables in zip(jobs, results):
+        for label, table in tables.items():
+            key = label if label not in merged else f"{job_name(job)}_{label}"
+            n = 2
+            while key in merged:
+                key = f"{job_name(job)}_{label}_{n}"
+                n += 1
+            merged[key] = table
+    return merged
+
+
+def _init_worker(snapshot_path):
+    """进程池初始化：每个子进程只加载一次数据快照"""
+    global _worker_survey
+    _worker_survey = SurveyData.from_pickle(snapshot_path)
+
+
+def _run_job(job):
+    return run_analysis(_worker_survey, job[0], job[1], **job_options(job))
+
+
+def run_jobs(survey, jobs, max_workers=None):
+    """
+    执行一组分析任务，返回与jobs一一对应的结果list（不合并），多个任务时分发到进程池并行计算
+    输入
+        survey: SurveyData对象（可已筛选样本、添加衍生列）
+        jobs:   [(analysis_type, 题号或cross_args), ...]，可带第三项附加参数，如('rank', 'S67', {'max_rank': 3})
+        max_workers: 进程数，默认CPU核数；为1时在当前进程串行执行
+    说明
+        数据只通过快照文件传给子进程一次（进程初始化时加载），任务本身只传(类型, 参数)
+    """
+    jobs = [tuple(job) for job in jobs]
+    for job in jobs:
+        if job[0] not in ANALYSIS_HANDLERS:
+            raise ValueError(f"不支持的分析类型: {job[0]}")
+    workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [run_analysis(survey, job[0], job[1], **job_options(job)) for job in jobs]
+
+    # 按需加载模式下先一次读入所有任务用到的题，再写快照
+    survey.load_qids(*dict.fromkeys(q for job in jobs for q in job_qids(job)))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = os.path.join(tmp_dir, 'survey.pkl')
+        survey.to_pickle(snapshot_path)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(snapshot_path,)) as pool:
+            # 每个进程分到若干个任务一批，减少进程间通信次数
+            chunksize = max(1, len(jobs) // (workers * 4))
+            return list(pool.map(_run_job, jobs, chunksize=chunksize))
+
+
+def run_batch(survey, jobs, max_workers=None):
+    """
+    批量执行分析任务，多个任务时分发到进程池并行计算
+    输入
+        survey: SurveyData对象（可已筛选样本、添加衍生列）
+        jobs:   [(analysis_type, 题号或cross_args), ...]，可带第三项附加参数（见run_jobs）
+        max_workers: 进程数，默认CPU核数；为1时在当前进程串行执行
+    返回
+        {label: DataFrame}，与单个分析函数返回的结构相同
+    """
+    jobs = [tuple(job) for job in jobs]
+    return merge_results(jobs, run_jobs(survey, jobs, max_workers=max_workers))
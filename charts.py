@@ -0,0 +1,136 @@
+import numpy as np
+import plotly.graph_objects as go
+from metrics_cal import NPS_SCORES, NPS_PROMOTER_SCORES, NPS_PASSIVE_SCORES, NSS_SCORES
+from metric_results import NPSResult, NSSResult, RankResult, ChoiceDetailResult, CrossTabResult
+
+# 推荐者/中立者/贬损者与1~5分的配色
+NPS_COLORS = {'promoter': '#2ca02c', 'passive': '#bdbdbd', 'detractor': '#d62728'}
+NSS_COLORS = ['#d73027', '#fc8d59', '#fee08b', '#91cf60', '#1a9850']
+# 图中数值保留的小数位（只传聚合后的数值，保留两位足够展示）
+CHART_DECIMALS = 2
+
+
+def _layout(fig, title, height=None):
+    fig.update_layout(title=title, template='plotly_white', margin={'l': 10, 'r': 10, 't': 50, 'b': 10},
+                      legend={'orientation': 'h', 'y': -0.15}, height=height)
+    return fig
+
+
+def _bar_height(n_bars):
+    """横向条形图高度随条数增长"""
+    return max(300, 28 * n_bars + 120)
+
+
+def _labels(index, names=None):
+    names = names or {}
+    return [str(names.get(i, i)) for i in index]
+
+
+def nps_figure(result, title=None):
+    """
+    NPS分布图
+    未分组：0~10分占比柱状图（按推荐者/中立者/贬损者着色）
+    分组：各组贬损者/中立者/推荐者占比堆积条形图，组名后标注NPS与Base（跳过没有作答的组）
+    """
+    values = result.values
+    if not result.meta.get('grouped'):
+        stats = values.iloc[0]
+        colors = [NPS_COLORS['promoter'] if s in NPS_PROMOTER_SCORES else
+                  NPS_COLORS['passive'] if s in NPS_PASSIVE_SCORES else NPS_COLORS['detractor'] for s in NPS_SCORES]
+        pct = np.round(stats[NPS_SCORES].to_numpy(dtype=np.float64), CHART_DECIMALS)
+        fig = go.Figure(go.Bar(x=[str(s) for s in NPS_SCORES], y=pct, marker_color=colors,
+                               hovertemplate='%{x}分: %{y:.2f}%<extra></extra>'))
+        fig.update_xaxes(title='推荐意愿得分', type='category')
+        fig.update_yaxes(title='占比%')
+        return _layout(fig, title or f"NPS = {stats['nps']:.2f}（Base {stats['base']:.0f}）")
+
+    answered = np.asarray(result.meta.get('answered', np.ones(len(values))))
+    values = values[answered > 0]
+    groups = [f"{g}（NPS {nps:.1f}，n={base:.0f}）" for g, nps, base in zip(values.index, values['nps'], values['base'])]
+    fig = go.Figure()
+    for col, name, seg in [('pct_detractor', '贬损者', 'detractor'), ('pct_passive', '中立者', 'passive'),
+                           ('pct_recommend', '推荐者', 'promoter')]:
+        fig.add_trace(go.Bar(y=groups, x=np.round(values[col].to_numpy(dtype=np.float64), CHART_DECIMALS),
+                             name=name, orientation='h', marker_color=NPS_COLORS[seg],
+                             hovertemplate=f'%{{y}}<br>{name}: %{{x:.2f}}%<extra></extra>'))
+    fig.update_layout(barmode='stack')
+    fig.update_xaxes(title='占比%', range=[0, 100])
+    fig.update_yaxes(autorange='reversed')
+    return _layout(fig, title or 'NPS分组对比', _bar_height(len(groups)))
+
+
+def nss_figure(result, title=None):
+    """NSS矩阵：每个维度1~5分占比的100%堆积条形图，维度名后标注NSS"""
+    values = result.values
+    names = _labels(values.index, result.meta.get('short_names'))
+    dims = [f"{name}（NSS {nss:.1f}）" for name, nss in zip(names, values['nss'])]
+    fig = go.Figure()
+    for score, color in zip(NSS_SCORES, NSS_COLORS):
+        fig.add_trace(go.Bar(y=dims, x=np.round(values[score].to_numpy(dtype=np.float64), CHART_DECIMALS),
+                             name=f'{score}分', orientation='h', marker_color=color,
+                             hovertemplate=f'%{{y}}<br>{score}分: %{{x:.2f}}%<extra></extra>'))
+    fig.update_layout(barmode='stack')
+    fig.update_xaxes(title='占比%', range=[0, 100])
+    fig.update_yaxes(autorange='reversed')
+    return _layout(fig, title or 'NSS满意度分布', _bar_height(len(dims)))
+
+
+def rank_figure(result, title=None):
+    """排序题：赋值后重要性index条形图（从高到低），悬停显示被选比例"""
+    values = result.values.sort_values('index', ascending=False)
+    names = _labels(values.index, result.meta.get('short_names'))
+    fig = go.Figure(go.Bar(
+        y=names, x=np.round(values['index'].to_numpy(dtype=np.float64), CHART_DECIMALS), orientation='h',
+        customdata=np.round(values['pct_selected'].to_numpy(dtype=np.float64), CHART_DECIMALS),
+        marker_color='#1f77b4',
+        hovertemplate='%{y}<br>重要性index: %{x:.2f}%<br>被选比例: %{customdata:.2f}%<extra></extra>'))
+    fig.update_xaxes(title='赋值后重要性index%')
+    fig.update_yaxes(autorange='reversed')
+    return _layout(fig, title or '排序题重要性', _bar_height(len(names)))
+
+
+def choice_detail_figure(result, title=None):
+    """多选题：各选项被选比例条形图（从高到低）"""
+    values = result.values.sort_values('pct', ascending=False)
+    names = _labels(values.index, result.meta.get('option_names'))
+    fig = go.Figure(go.Bar(y=names, x=np.round(values['pct'].to_numpy(dtype=np.float64), CHART_DECIMALS),
+                           orientation='h', marker_color='#1f77b4',
+                           hovertemplate='%{y}: %{x:.2f}%<extra></extra>'))
+    fig.update_xaxes(title='占比%')
+    fig.update_yaxes(autorange='reversed')
+    return _layout(fig, title or f'选项占比（Base {result.base}）', _bar_height(len(names)))
+
+
+def crosstab_figure(result, title=None):
+    """交叉表：列百分比热力图（含总计列），格内标注百分比"""
+    col_pct = result.percentages()['col_pct']
+    z = np.round(col_pct.to_numpy(dtype=np.float64), CHART_DECIMALS)
+    fig = go.Figure(go.Heatmap(
+        z=z, x=[str(c) for c in col_pct.columns], y=[str(r) for r in col_pct.index], colorscale='Blues',
+        text=z, texttemplate='%{text:.1f}', hovertemplate='%{y} × %{x}: %{z:.2f}%<extra></extra>',
+        colorbar={'title': '列%'}))
+    fig.update_xaxes(type='category', side='top')
+    fig.update_yaxes(type='category', autorange='reversed')
+    meta = result.meta
+    default = f"{meta['row_qid']} × {meta['col_qid']} 列百分比" if 'row_qid' in meta else '列百分比'
+    return _layout(fig, title or default, max(350, 30 * len(col_pct) + 150))
+
+
+# 结果类型 -> 作图函数
+FIGURE_BUILDERS = {
+    NPSResult: nps_figure,
+    NSSResult: nss_figure,
+    RankResult: rank_figure,
+    ChoiceDetailResult: choice_detail_figure,
+    CrossTabResult: crosstab_figure,
+}
+
+
+def result_figure(result, title=None):
+    """
+    由数值结果对象生成plotly图；图中只有聚合后的数值（与样本量无关），不支持的结果（如开放题文本表）返回None
+    """
+    builder = FIGURE_BUILDERS.get(type(result))
+    if builder is None or len(result.values) == 0:
+        return None
+    return builder(result, title=title)
@@ -0,0 +1,156 @@
+from statistics import NormalDist
+from metrics_cal import *
+
+# 置信区间计算方式：analytic为三项分布方差公式（零成本），bootstrap为多项分布重抽样
+CI_METHODS = ('analytic', 'bootstrap')
+# 每批同时重抽样的单元格数，限制 (n_boot, 单元格数, 3) 数组的内存
+BOOTSTRAP_CHUNK_CELLS = 64
+
+
+def z_value(confidence):
+    """双侧置信水平对应的正态分位数，如0.95 -> 1.96"""
+    if not 0 < confidence < 1:
+        raise ValueError(f"confidence应在0~1之间，实际为{confidence}。")
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def net_score_analytic(top, bottom, totals, confidence=0.95):
+    """
+    净值型指标（NPS=推荐者%-贬损者%，NSS=T2B%-1~3分%）的解析置信区间
+    输入
+        top, bottom: 各单元格的推荐者(T2B)人数、贬损者(1~3分)人数
+        totals:      各单元格分母
+    返回
+        (score, se, lower, upper)，均为百分数数组；分母为0的单元格score为0，其余为NaN
+    说明
+        三项分布下 Var(p_top - p_bottom) = (p_top + p_bottom - (p_top - p_bottom)²) / n
+    """
+    top, bottom, totals = (np.asarray(x, dtype=np.float64) for x in (top, bottom, totals))
+    has_base = totals > 0
+    denom = np.where(has_base, totals, 1)
+    p_top, p_bottom = top / denom, bottom / denom
+    score = np.where(has_base, (p_top - p_bottom) * 100, 0.0)
+    var = (p_top + p_bottom - (p_top - p_bottom) ** 2) / denom
+    se = np.where(has_base, np.sqrt(np.maximum(var, 0)) * 100, np.nan)
+    z = z_value(confidence)
+    return score, se, score - z * se, score + z * se
+
+
+def net_score_bootstrap(top, bottom, totals, n_boot=10000, seed=None):
+    """
+    净值型指标的多项分布bootstrap：每个单元格按(top, bottom, 其余)三类的频数直接做多项分布抽样，
+    不在样本行上重抽样，耗时只与 单元格数 × n_boot 有关，与样本量无关
+    返回
+        shape (单元格数, n_boot) 的重抽样指标（百分数）；分母为0的单元格为NaN
+    说明
+        加权数据传入按有效样本量折算的人数（可为小数），抽样次数取其四舍五入值
+    """
+    top, bottom, totals = (np.asarray(x, dtype=np.float64) for x in (top, bottom, totals))
+    sizes = np.rint(totals).astype(np.int64)
+    rng = np.random.default_rng(seed)
+    replicates = np.full((len(totals), n_boot), np.nan)
+    cells = np.flatnonzero(sizes > 0)
+    for start in range(0, len(cells), BOOTSTRAP_CHUNK_CELLS):
+        idx = cells[start:start + BOOTSTRAP_CHUNK_CELLS]
+        n = sizes[idx]
+        rest = np.maximum(totals[idx] - top[idx] - bottom[idx], 0)
+        pvals = np.column_stack([top[idx], bottom[idx], rest]) / (top[idx] + bottom[idx] + rest)[:, None]
+        # (n_boot, 单元格数, 3)，一次抽完这一批单元格的全部重抽样
+        draws = rng.multinomial(n, pvals, size=(n_boot, len(idx)))
+        replicates[idx] = ((draws[..., 0] - draws[..., 1]) / n * 100).T
+    return replicates
+
+
+def net_score_ci(top, bottom, totals, method='analytic', confidence=0.95, n_boot=10000, seed=None):
+    """
+    净值型指标的置信区间
+    返回
+        DataFrame：base + score + se + lower + upper（bootstrap时se为重抽样标准差，区间为百分位数区间）
+    """
+    if method not in CI_METHODS:
+        raise ValueError(f"不支持的置信区间方法: {method}，可选 {'/'.join(CI_METHODS)}")
+    score, se, lower, upper = net_score_analytic(top, bottom, totals, confidence)
+    if method == 'bootstrap':
+        replicates = net_score_bootstrap(top, bottom, totals, n_boot=n_boot, seed=seed)
+        alpha = (1 - confidence) / 2
+        # 只对有样本的单元格求重抽样标准差与百分位数区间
+        has_base = np.rint(np.asarray(totals, dtype=np.float64)) > 0
+        se, lower, upper = (np.full(len(score), np.nan) for _ in range(3))
+        if has_base.any():
+            if n_boot > 1:
+                se[has_base] = replicates[has_base].std(axis=1, ddof=1)
+            lower[has_base], upper[has_base] = np.quantile(replicates[has_base], [alpha, 1 - alpha], axis=1)
+    return pd.DataFrame({'base': np.asarray(totals), 'score': score, 'se': se, 'lower': lower, 'upper': upper})
+
+
+def _with_group_keys(group_keys, ci):
+    return pd.concat([group_keys.reset_index(drop=True), ci], axis=1)
+
+
+def weighted_net_score_ci(top, bottom, totals, eff_base, method='analytic', confidence=0.95, n_boot=10000, seed=None):
+    """
+    加权数据的净值指标置信区间：占比取加权占比，方差与重抽样的样本量取有效样本量 (Σw)²/Σw²
+    返回
+        DataFrame：base(加权Base) + eff_base + score + se + lower + upper
+    """
+    totals, eff_base = np.asarray(totals, dtype=np.float64), np.asarray(eff_base, dtype=np.float64)
+    scale = np.divide(eff_base, totals, out=np.zeros_like(totals), where=totals > 0)
+    ci = net_score_ci(np.asarray(top) * scale, np.asarray(bottom) * scale, eff_base,
+                      method, confidence, n_boot, seed)
+    ci = ci.rename(columns={'base': 'eff_base'})
+    ci.insert(0, 'base', totals)
+    return ci
+
+
+def nps_ci(scores, by=None, method='analytic', confidence=0.95, n_boot=10000, seed=None, weights=None):
+    """
+    NPS置信区间
+    输入
+        scores: 0~10分Series（非数字或缺失自动忽略）
+        by:     可选，分组Series或Series列表（如收入分组g1、交叉表的列变量），每组一个区间
+        method: 'analytic'（三项分布方差，零成本）或 'bootstrap'（多项分布重抽样）
+        confidence: 置信水平，默认0.95
+        n_boot: bootstrap重抽样次数
+        seed:   随机种子，固定后结果可复现
+        weights: 可选，样本权重；指定时按加权占比与有效样本量计算
+    返回
+        DataFrame：[分组键列] + base + nps + se + lower + upper（百分数）；加权时base后加eff_base
+    """
+    if by is None:
+        by = pd.Series('整体调研用户', index=scores.index, name='group')
+    group_keys, counts, totals, _, eff_base = nps_counts_by_group(scores, by, weights)
+    top = counts[:, NPS_PROMOTER_SCORES].sum(axis=1)
+    bottom = counts[:, NPS_DETRACTOR_SCORES].sum(axis=1)
+    if weights is None:
+        ci = net_score_ci(top, bottom, totals, method, confidence, n_boot, seed)
+    else:
+        ci = weighted_net_score_ci(top, bottom, totals, eff_base, method, confidence, n_boot, seed)
+    return _with_group_keys(group_keys, ci.rename(columns={'score': 'nps'}))
+
+
+def nss_ci(scores, by=None, method='analytic', confidence=0.95, n_boot=10000, seed=None, weights=None):
+    """
+    NSS置信区间（NSS = T2B% - 1~3分%）
+    输入
+        scores: 满意度Series（单列），或满意度矩阵题DataFrame（每列一个区间，此时不能指定by）
+        其余参数同nps_ci
+    返回
+        DataFrame：[分组键列/题目列] + base + nss + se + lower + upper（百分数）；加权时base后加eff_base
+    """
+    if isinstance(scores, pd.DataFrame):
+        if by is not None:
+            raise ValueError("矩阵题按列计算置信区间时不能同时指定by。")
+        group_keys = pd.DataFrame({'题目': list(scores.columns)})
+        w = weight_series(weights, scores.index)
+        counts, totals, eff_base = nss_counts_from_matrix(to_numeric_matrix(scores), None if w is None else w.to_numpy())
+    else:
+        if by is None:
+            by = pd.Series('整体调研用户', index=scores.index, name='group')
+        group_keys, counts, totals, eff_base = nss_counts_by_group(scores, by, weights)
+    top = counts[:, 3:].sum(axis=1)
+    bottom = counts[:, :3].sum(axis=1)
+    if weights is None:
+        ci = net_score_ci(top, bottom, totals, method, confidence, n_boot, seed)
+    else:
+        ci = weighted_net_score_ci(top, bottom, totals, eff_base, method, confidence, n_boot, seed)
+    return _with_group_keys(group_keys, ci.rename(columns={'score': 'nss'}))
@@ -1,8 +1,9 @@
 from metrics_cal import *
+from metric_results import *
 from ultis import *
 from Survey_Data import SurveyData
 
-def cross_analysis(survey, row_qid, col_qid, is_nps=False, row_labels=None, col_labels=None):
+def cross_analysis(survey, row_qid, col_qid, is_nps=False, row_labels=None, col_labels=None, as_result=False):
     # 确保标签参数不为None
     row_labels = row_labels or {}
     col_labels = col_labels or {}
@@ -15,70 +16,99 @@ def cross_analysis(survey, row_qid, col_qid, is_nps=False, row_labels=None, col_
         row_labels: 行变量label映射 dict
         col_labels: 列变量label映射 dict
         is_nps: 是否进行NPS计算
+        as_result: 为True时频数交叉表以CrossTabResult、单选NPS交叉以NPSResult返回
+                   （多选题的NPS交叉仍为字符串表）
     返回
         交叉分析结果DataFrame
+    说明
+        survey设置了样本权重（survey.set_weights）时，频数为加权频数、NPS为加权NPS
     """
+    meta = {'row_qid': row_qid, 'col_qid': col_qid}
+    weights = survey.weights
 
     # 获取行变量题型
-    _, row_qtype = survey.get_answers_by_qid(row_qid, return_qtype=True)
+    row_qtype = survey.get_qtype(row_qid)
     # 获取列变量题型
-    _, col_qtype = survey.get_answers_by_qid(col_qid, return_qtype=True)
+    col_qtype = survey.get_qtype(col_qid)
+    # 按需加载模式下一次扫描读入两题的列
+    survey.load_qids(row_qid, col_qid)
 
     # 处理多选题与多选题的交叉分析
     if row_qtype == 'M' and col_qtype == 'M':
-        return count_cross_analysis_multiple(survey, row_qid, col_qid, row_labels, col_labels)
+        result = count_cross_analysis_multiple(survey, row_qid, col_qid, row_labels, col_labels, weights=weights)
+        return CrossTabResult(result, meta) if as_result else result
 
-    # 处理行变量为多选题的情况
-    if row_qtype == 'M':
-        return process_multiple_choice_analysis(survey, row_qid, col_qid, row_labels, col_labels, 'row', is_nps=is_nps)
-
-    # 处理列变量为多选题的情况
-    if col_qtype == 'M':
-        return process_multiple_choice_analysis(survey, row_qid, col_qid, row_labels, col_labels, 'col', is_nps=is_nps)
+    # 处理行变量或列变量为多选题的情况
+    if row_qtype == 'M' or col_qtype == 'M':
+        multiple_type = 'row' if row_qtype == 'M' else 'col'
+        result = process_multiple_choice_analysis(survey, row_qid, col_qid, row_labels, col_labels, multiple_type,
+                                                  is_nps=is_nps, weights=weights)
+        return CrossTabResult(result, meta) if as_result and not is_nps else result
 
     # 处理非多选题之间的交叉分析
     row_s = survey.get_answers_by_qid(row_qid, return_qtype=False).iloc[:, 0]
     col_s = survey.get_answers_by_qid(col_qid, return_qtype=False).iloc[:, 0]
-    return count_cross_analysis(row_s, col_s, row_labels, col_labels)
+    if is_nps:
+        # 行变量为0-10分数，按列变量各选项分组计算NPS
+        if as_result:
+            combined = pd.DataFrame({'row': row_s, 'col': col_s})
+            return NPSResult.from_groups(combined['row'], combined['col'], weights=weights, **meta)
+        return nps_cross_table(row_s, col_s, weights=weights)
+    result = count_cross_analysis(row_s, col_s, row_labels, col_labels, weights=weights)
+    if as_result and weights is not None:
+        meta['eff_bases'] = column_effective_bases(row_s, col_s, weights, col_labels)
+    return CrossTabResult(result, meta) if as_result else result
+
+
+def nps_cross_table(row_s, col_s, weights=None):
+    """
+    NPS计算型交叉分析：以row_s为分数、col_s为分组，一次分组计算所有组的NPS
+    返回按分组横向拼接的nps_table格式表（每组两列：'{组}_整体调研用户'、'{组}_占比/百分比'），
+    分组按col_s中首次出现的顺序，没有任何作答的组不输出
+    weights: 可选，样本权重（与row_s索引对齐）
+    """
+    # 确保row_s和col_s索引对齐
+    combined = pd.DataFrame({'row': row_s, 'col': col_s})
+    return NPSResult.from_groups(combined['row'], combined['col'], weights=weights).render()
 
 
 def compute_cross_analysis(
     row_s, col_s, group_val, row_labels=None
 ):
     """
-    NPS计算型交叉分析：对每个分组应用NPS计算
-    返回每个选项的单列统计结果DataFrame
+    NPS计算型交叉分析：对单个分组应用NPS计算
+    返回该分组的单列统计结果DataFrame；需要所有分组时直接用nps_cross_table一次算完
     """
     # 确保row_s和col_s索引对齐
     combined = pd.DataFrame({'row': row_s, 'col': col_s}).dropna()
-    row_s = combined['row']
-    col_s = combined['col']
-
-    # 筛选当前分组数据
-    group_data = row_s[col_s == group_val]
-    if not group_data.empty:
-        # 应用NPS计算函数
-        stat_result = nps_table(group_data)
-        # 添加分组名称前缀
-        stat_result.columns = [f'{group_val}_{col}' for col in stat_result.columns]
-        return stat_result
-    return pd.DataFrame()
+    mask = combined['col'] == group_val
+    return nps_cross_table(combined['row'][mask], combined['col'][mask])
 
 
 def count_cross_analysis(
-    row_s, col_s, row_labels=None, col_labels=None
+    row_s, col_s, row_labels=None, col_labels=None, weights=None
 ):
     """
     非计算型交叉分析：仅计算选项间频次分布
+    weights: 可选，样本权重；指定时每格为权重和
     返回标准交叉表DataFrame
     """
     # 确保row_s和col_s索引对齐
     combined = pd.DataFrame({'row': row_s, 'col': col_s}).dropna()
     row_s = combined['row']
     col_s = combined['col']
+    # 紧凑存储的category列：去掉筛选后未出现的类别，避免交叉表出现全0行列
+    if isinstance(row_s.dtype, pd.CategoricalDtype):
+        row_s = row_s.cat.remove_unused_categories()
+    if isinstance(col_s.dtype, pd.CategoricalDtype):
+        col_s = col_s.cat.remove_unused_categories()
 
     # 基础频次交叉表
-    cross_tab = pd.crosstab(row_s, col_s, dropna=False)
+    w = weight_series(weights, row_s.index)
+    if w is None:
+        cross_tab = pd.crosstab(row_s, col_s, dropna=False)
+    else:
+        cross_tab = pd.crosstab(row_s, col_s, values=w, aggfunc='sum', dropna=False).fillna(0.0)
 
     # 应用标签映射
     if row_labels:
@@ -89,6 +119,24 @@ def count_cross_analysis(
     return cross_tab
 
 
+def column_effective_bases(row_s, col_s, weights, col_labels=None):
+    """
+    加权交叉表各列的有效样本量 (Σw)²/Σw²（只计行、列都有作答的样本），用于列间显著性检验
+    返回 Series，index为（映射标签后的）列名
+    """
+    combined = pd.DataFrame({'row': row_s, 'col': col_s}).dropna()
+    w = weight_series(weights, combined.index)
+    col_s = combined['col']
+    if isinstance(col_s.dtype, pd.CategoricalDtype):
+        col_s = col_s.cat.remove_unused_categories()
+    sums = w.groupby(col_s, observed=True).sum()
+    squares = (w ** 2).groupby(col_s, observed=True).sum()
+    eff = (sums ** 2 / squares.where(squares > 0)).fillna(0.0)
+    if col_labels:
+        eff.index = [col_labels.get(col, col) for col in eff.index]
+    return eff
+
+
 def multiple_choice_dummy(survey, qid):
     """
     处理多选题数据，返回每个选项的虚拟变量矩阵
@@ -98,44 +146,50 @@ def multiple_choice_dummy(survey, qid):
     返回
         包含每个选项虚拟变量的DataFrame
     """
-    options_cols, _, option_names, _ = preprocess_multi_choice(survey.qinfo, qid)
-    
-    # 创建虚拟变量矩阵
-    dummy_df = pd.DataFrame()
-    for col in options_cols:
-        # 将非空值设为1，空值设为0
-        dummy_df[option_names.get(col, col)] = survey.df[col].notna().astype(int)
-    
+    options_cols, _, option_names, _ = preprocess_multi_choice(survey, qid)
+
+    # 创建虚拟变量矩阵：将非空值设为1，空值设为0（选项短名重复时与逐列赋值一样保留后者）
+    selected = survey.df[options_cols].notna().astype(int)
+    dummy_df = pd.DataFrame({option_names.get(col, col): selected[col] for col in options_cols}, index=survey.df.index)
+
     return dummy_df
 
-def count_cross_analysis_multiple(survey, row_qid, col_qid, row_labels=None, col_labels=None):
+
+def multiple_choice_matrix(survey, qid):
     """
-    多选题×多选题的非计算型交叉分析
+    多选题虚拟变量的NumPy形式，用于矩阵运算
+    返回 (选项名list, shape (样本数, 选项数) 的float64 0/1矩阵)
     """
-    row_dummy_df = multiple_choice_dummy(survey, row_qid)
-    col_dummy_df = multiple_choice_dummy(survey, col_qid)
+    dummy_df = multiple_choice_dummy(survey, qid)
+    return list(dummy_df.columns), dummy_df.to_numpy(dtype=np.float64)
 
-    # 计算选项间的共现频率
-    result = pd.DataFrame()
-    for row_col in row_dummy_df.columns:
-        row_result = []
-        for col_col in col_dummy_df.columns:
-            count = (row_dummy_df[row_col] & col_dummy_df[col_col]).sum()
-            row_result.append(count)
-        result[row_col] = row_result
 
-    result.index = col_dummy_df.columns
-    base = row_dummy_df.sum()
+def count_cross_analysis_multiple(survey, row_qid, col_qid, row_labels=None, col_labels=None, weights=None):
+    """
+    多选题×多选题的非计算型交叉分析
+    共现频数由一次矩阵乘法 Cᵀ·R 得到（R、C为行/列题的0/1虚拟变量矩阵），Base与Total为矩阵列和
+    weights: 可选，样本权重；指定时为 (C·diag(w))ᵀ·R，Base与Total为加权列和
+    """
+    row_names, row_mat = multiple_choice_matrix(survey, row_qid)
+    col_names, col_mat = multiple_choice_matrix(survey, col_qid)
+    w = weight_series(weights, survey.df.index)
+    if w is not None:
+        col_mat = col_mat * w.to_numpy()[:, None]
+        row_base = w.to_numpy() @ row_mat
+    else:
+        row_base = row_mat.sum(axis=0).astype(np.int64)
+
+    # 计算选项间的共现频率：行为列题选项，列为行题选项
+    co_counts = col_mat.T @ row_mat
+    if w is None:
+        co_counts = co_counts.astype(np.int64)
+    result = pd.DataFrame(co_counts, index=col_names, columns=row_names)
+    base = pd.Series(row_base, index=row_names)
     result = pd.concat([pd.DataFrame([base], columns=result.columns, index=['Base']), result])
 
-    # 添加Total列：使用列变量选项的原始计数并通过索引映射
-    result['Total'] = result.index.map(col_dummy_df.sum().to_dict())
-
-    # 调整列顺序，将Total放在第二列
-    cols = result.columns.tolist()
-    if len(cols) > 1:
-        cols.insert(0, cols.pop())
-        result = result[cols]
+    # 添加Total列：列变量各选项的选中人数，Base行无Total
+    total = np.concatenate([[np.nan], col_mat.sum(axis=0)])
+    result.insert(0, 'Total', total)
 
     if row_labels:
         result.columns = [row_labels.get(x, x) for x in result.columns]
@@ -145,10 +199,12 @@ def count_cross_analysis_multiple(survey, row_qid, col_qid, row_labels=None, col
     return result
 
 
-def process_multiple_choice_analysis(survey, row_qid, col_qid, row_labels, col_labels, multiple_type, is_nps=False):
+def process_multiple_choice_analysis(survey, row_qid, col_qid, row_labels, col_labels, multiple_type, is_nps=False,
+                                     weights=None):
     """
     多选题交叉分析通用处理函数
     multiple_type: 'row'表示多选题作为行变量, 'col'表示作为列变量
+    weights: 可选，样本权重；指定时频数、Base与NPS均为加权值
     """
     # 根据类型获取对应的虚拟变量矩阵和数据系列
     if multiple_type == 'row':
@@ -175,25 +231,16 @@ def process_multiple_choice_analysis(survey, row_qid, col_qid, row_labels, col_l
             current_col_labels = {str(col): f"{col_labels.get(col, col)}"}
 
         if is_nps:
-            # 计算型分析
-            # 处理所有分组
-            group_results = []
-            for group_val in filtered_col_s.unique():
-                group_df = compute_cross_analysis(
-                    filtered_row_s, filtered_col_s, group_val,
-                    row_labels=current_row_labels if multiple_type == 'row' else row_labels
-                )
-                # 保留非空结果
-                if not group_df.empty:
-                    group_results.append(group_df)
-            cross_df = pd.concat(group_results, axis=1) if group_results else pd.DataFrame()
+            # 计算型分析：一次分组计算所有分组的NPS
+            cross_df = nps_cross_table(filtered_row_s, filtered_col_s, weights=weights)
 
         else:
             if multiple_type == 'col':
                  cross_df = count_cross_analysis(
                      filtered_row_s, filtered_col_s,
                      row_labels=current_row_labels,
-                     col_labels=current_col_labels
+                     col_labels=current_col_labels,
+                     weights=weights
                  )
                  # 添加Total列（每行选项的总人数）
 
@@ -201,10 +248,11 @@ def process_multiple_choice_analysis(survey, row_qid, col_qid, row_labels, col_l
                 cross_df = count_cross_analysis(
                      filtered_col_s, filtered_row_s,
                      col_labels=current_col_labels,
-                     row_labels=current_row_labels
+                     row_labels=current_row_labels,
+                     weights=weights
                  )
  
-            sample_size = mask.sum()
+            sample_size = mask.sum() if weights is None else weight_series(weights, mask.index)[mask].sum()
 
             # 添加Base行：当前多选题选项的样本量
             base_row = pd.DataFrame([[sample_size]*len(cross_df.columns)], columns=cross_df.columns, index=['Base'])
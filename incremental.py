@@ -0,0 +1,344 @@
+import copy
+from abc import ABC, abstractmethod
+from metrics_cal import *
+from metric_results import *
+from cross_analysis import cross_analysis
+from Survey_Data import SurveyData
+
+
+def union_add(left, right):
+    """
+    两张统计表按行、列并集相加（缺失按0），行列顺序保持先出现的顺序；
+    两边都缺失的格（如多选交叉表Base行的Total）仍为缺失
+    """
+    index = left.index.append(right.index.difference(left.index, sort=False))
+    columns = left.columns.append(right.columns.difference(left.columns, sort=False))
+    return left.reindex(index=index, columns=columns).add(right.reindex(index=index, columns=columns), fill_value=0)
+
+
+def _squared_base(totals, eff_base):
+    """由Base与有效样本量还原Σw²（可相加），不加权时等于Base"""
+    totals, eff_base = np.asarray(totals, dtype=np.float64), np.asarray(eff_base, dtype=np.float64)
+    return np.divide(totals ** 2, eff_base, out=np.zeros_like(totals), where=eff_base > 0)
+
+
+def _effective(table):
+    """由累计的Base与Σw²计算有效样本量"""
+    base, squares = table['base'].to_numpy(dtype=np.float64), table['base_sq'].to_numpy(dtype=np.float64)
+    return np.divide(base ** 2, squares, out=np.zeros_like(base), where=squares > 0)
+
+
+def _restore_int(table):
+    """相加后全为整数的计数列恢复为int"""
+    values = table.to_numpy(dtype=np.float64)
+    int_cols = [c for i, c in enumerate(table.columns)
+                if not np.isnan(values[:, i]).any() and (values[:, i] == np.round(values[:, i])).all()]
+    return table.astype({c: np.int64 for c in int_cols})
+
+
+class SufficientStats(ABC):
+    """
+    可合并的充分统计量（分数频数、排名计数、共现频数等），指标由它们直接算出
+    方法
+        update(survey): 累加一批样本（SurveyData，通常只含新增样本）
+        merge(other):   合并另一份同题的统计量（如分批/分进程统计的结果），也可写作 a + b
+        result():       生成与一次性计算相同的数值结果对象（NPSResult/NSSResult/RankResult/...）
+    """
+
+    def __init__(self, table=None, weighted=False):
+        self.table = table
+        self.weighted = weighted
+
+    def update(self, survey):
+        if len(survey.df) == 0:
+            return self
+        self.weighted = self.weighted or survey.weights is not None
+        batch = self._collect(survey)
+        self.table = batch if self.table is None else union_add(self.table, batch)
+        return self
+
+    def merge(self, other):
+        merged = copy.copy(self)
+        merged.weighted = self.weighted or other.weighted
+        if self.table is None or other.table is None:
+            merged.table = self.table if other.table is None else other.table
+        else:
+            merged.table = union_add(self.table, other.table)
+        return merged
+
+    __add__ = merge
+
+    @abstractmethod
+    def qids(self):
+        """统计量用到的题号"""
+
+    @abstractmethod
+    def _collect(self, survey):
+        """一批样本的统计表（可与已有统计表按行列并集相加）"""
+
+    @abstractmethod
+    def result(self):
+        """由累计的统计表生成数值结果对象"""
+
+
+class NPSStats(SufficientStats):
+    """
+    NPS充分统计量：每组一行，0..10分频数 + base + base_sq(Σw²) + answered
+    by: 可选，分组题号（单列题，如收入分组g1、wave）
+    """
+
+    def __init__(self, qid, by=None, **kwargs):
+        super().__init__(**kwargs)
+        self.qid, self.by = qid, by
+
+    def qids(self):
+        return [self.qid] if self.by is None else [self.qid, self.by]
+
+    def _collect(self, survey):
+        scores = survey.get_answers_by_qid(self.qid).iloc[:, 0]
+        if self.by is None:
+            by = pd.Series('整体调研用户', index=scores.index, name='group')
+        else:
+            by = survey.get_answers_by_qid(self.by).iloc[:, 0]
+        group_keys, counts, totals, answered, eff_base = nps_counts_by_group(scores, by, survey.weights)
+        table = pd.DataFrame(counts, index=pd.Index(group_keys.iloc[:, 0]), columns=NPS_SCORES)
+        table['base'] = totals
+        table['base_sq'] = _squared_base(totals, eff_base)
+        table['answered'] = answered
+        return table
+
+    def result(self):
+        table = self.table
+        values = nps_from_counts(table[NPS_SCORES].to_numpy(), table['base'].to_numpy())
+        if self.weighted:
+            values.insert(0, 'eff_base', _effective(table))
+        values.insert(0, 'base', table['base'].to_numpy())
+        meta = {'qid': self.qid, 'grouped': self.by is not None}
+        if self.by is None:
+            values.index = ['整体调研用户']
+        else:
+            values.index = table.index
+            meta['answered'] = table['answered'].to_numpy()
+        return NPSResult(values, meta)
+
+
+class NSSStats(SufficientStats):
+    """NSS充分统计量：满意度矩阵题每列一行，1..5分频数 + base + base_sq + sum(分数之和)"""
+
+    def __init__(self, qid, **kwargs):
+        super().__init__(**kwargs)
+        self.qid = qid
+        self.short_names = {}
+
+    def qids(self):
+        return [self.qid]
+
+    def _collect(self, survey):
+        answers = survey.get_answers_by_qid(self.qid)
+        self.short_names = survey.short_names
+        values = to_numeric_matrix(answers)
+        w = survey.weights
+        w = None if w is None else w.to_numpy()
+        counts, totals, eff_base = nss_counts_from_matrix(values, w)
+        filled = np.where(np.isnan(values), 0.0, values)
+        table = pd.DataFrame(counts, index=answers.columns, columns=NSS_SCORES)
+        table['base'] = totals
+        table['base_sq'] = _squared_base(totals, eff_base)
+        table['sum'] = filled.sum(axis=0) if w is None else w @ filled
+        return table
+
+    def result(self):
+        table = self.table
+        values = nss_from_counts(table[NSS_SCORES].to_numpy(), table['base'].to_numpy(), table['sum'].to_numpy(),
+                                 table.index, _effective(table) if self.weighted else None)
+        return NSSResult(values, {'qid': self.qid, 'short_names': self.short_names})
+
+
+class RankStats(SufficientStats):
+    """排序题充分统计量：每个选项一行，1..max_rank计数 + n_selected + n(样本数或权重和)"""
+
+    def __init__(self, qid, max_rank=5, rank_weights=None, **kwargs):
+        super().__init__(**kwargs)
+        if not max_rank or max_rank < 1:
+            raise ValueError(f"增量统计需要固定的max_rank（正整数），实际为{max_rank}。")
+        self.qid, self.max_rank, self.rank_weights = qid, max_rank, rank_weights
+        self.short_names = {}
+
+    def qids(self):
+        return [self.qid]
+
+    def _collect(self, survey):
+        options_cols = preprocess_multi_choice(survey, self.qid)[0]
+        self.short_names = survey.short_names
+        ranks = to_numeric_matrix(survey.df[options_cols])
+        w = survey.weights
+        w = None if w is None else w.to_numpy()
+        table = pd.DataFrame(rank_counts_matrix(ranks, self.max_rank, w), index=pd.Index(options_cols),
+                             columns=list(range(1, self.max_rank + 1)))
+        table['n_selected'] = (~np.isnan(ranks)).sum(axis=0) if w is None else w @ ~np.isnan(ranks)
+        table['n'] = len(ranks) if w is None else w.sum()
+        return table
+
+    def result(self):
+        table = self.table
+        ranks = list(range(1, self.max_rank + 1))
+        n = table['n'].iloc[0] if len(table) else 0
+        values = rank_from_counts(table[ranks].to_numpy(), table['n_selected'].to_numpy(), n, table.index,
+                                  rank_weight_vector(self.max_rank, self.rank_weights))
+        if not self.weighted:
+            values = _restore_int(values[['n_selected', *ranks]]).join(values[['pct_selected', 'index']])
+        meta = {'qid': self.qid, 'max_rank': self.max_rank, 'rank_weights': self.rank_weights,
+                'short_names': self.short_names}
+        return RankResult(values, meta)
+
+
+class ChoiceDetailStats(SufficientStats):
+    """多选题选项充分统计量：每个选项一行，n(被选人数) + base(至少选一项) + base_sq"""
+
+    def __init__(self, qid, **kwargs):
+        super().__init__(**kwargs)
+        self.qid = qid
+        self.option_names = {}
+
+    def qids(self):
+        return [self.qid]
+
+    def _collect(self, survey):
+        options_cols, _, self.option_names, _ = preprocess_multi_choice(survey, self.qid)
+        selected = survey.df[options_cols].notna().to_numpy()
+        answered = selected.any(axis=1)
+        w = survey.weights
+        w = np.ones(len(selected)) if w is None else w.to_numpy()
+        table = pd.DataFrame({'n': w @ selected}, index=pd.Index(options_cols))
+        table['base'] = w[answered].sum()
+        table['base_sq'] = (w[answered] ** 2).sum()
+        return table
+
+    def result(self):
+        table = self.table
+        base = table['base'].iloc[0] if len(table) else 0
+        values = pd.DataFrame({'base': base, 'n': table['n']}, index=table.index)
+        if self.weighted:
+            values.insert(1, 'eff_base', _effective(table))
+        else:
+            values = values.astype({'base': np.int64, 'n': np.int64})
+        values['pct'] = table['n'] / base * 100 if base else 0.0
+        return ChoiceDetailResult(values, {'qid': self.qid, 'option_names': self.option_names})
+
+
+class CrossStats(SufficientStats):
+    """频数交叉表的充分统计量就是频数表本身（含Base行、Total列），各批次直接相加"""
+
+    def __init__(self, row_qid, col_qid, row_labels=None, col_labels=None, **kwargs):
+        super().__init__(**kwargs)
+        self.row_qid, self.col_qid = row_qid, col_qid
+        self.row_labels, self.col_labels = row_labels, col_labels
+
+    def qids(self):
+        return [self.row_qid, self.col_qid]
+
+    def _collect(self, survey):
+        return cross_analysis(survey, self.row_qid, self.col_qid,
+                              row_labels=self.row_labels, col_labels=self.col_labels)
+
+    def result(self):
+        table = self.table if self.weighted else _restore_int(self.table)
+        return CrossTabResult(table, {'row_qid': self.row_qid, 'col_qid': self.col_qid})
+
+
+class IncrementalSurvey:
+    """
+    增量分析：登记要跟踪的指标后，每次只读入新导出中的新ID，统计量加上这批新样本的增量即得更新后的结果
+    用法
+        def prepare(batch):                      # 对新增样本重新生成衍生列与权重
+            process_income_group(batch)
+            batch.set_weights(new_weights, name='w')
+        tracker = IncrementalSurvey(survey, prepare=prepare)
+        tracker.track('nps', NPSStats('S2', by='g1'))
+        tracker.append('SurveyResults_新导出.xlsx', valid_only=True)
+        tracker.result('nps').render()
+    说明
+        衍生列（导出中没有的列，如收入分组g1、wave）和权重列对新增样本为缺失，
+        由prepare(batch)在新增样本的SurveyData上重新生成并写回survey；
+        没有prepare而跟踪的统计量依赖衍生列或权重时，append报错（否则新增样本会被静默丢弃）
+    """
+
+    def __init__(self, survey, prepare=None):
+        self.survey = survey
+        self.prepare = prepare
+        self.stats = {}
+
+    def track(self, name, stats):
+        """登记统计量，并用当前全部样本初始化"""
+        self.stats[name] = stats.update(self.survey)
+        return self.stats[name]
+
+    def _dependent_columns(self, derived):
+        """跟踪的统计量用到的衍生列（含权重列）：{统计量名: [列名]}"""
+        derived = set(derived)
+        weight_col = self.survey.weight_col
+        dependent = {}
+        for name, stats in self.stats.items():
+            cols = [c for q in stats.qids() for c in self.survey.get_columns_by_original_qid(q) if c in derived]
+            if weight_col in derived:
+                cols.append(weight_col)
+            if cols:
+                dependent[name] = cols
+        return dependent
+
+    def _write_back(self, batch, cols):
+        """把prepare为新增样本生成的衍生列值写回survey.df（新增的衍生列一并登记）"""
+        df = self.survey.df
+        for col in cols:
+            values = batch.df[col]
+            if col not in df.columns:
+                entry = batch.qinfo[batch.qinfo['raw_col'] == col].iloc[0]
+                self.survey.add_derived_column(col, values.reindex(df.index), entry['original_qid'],
+                                               qtype=entry['qtype'], short_name=entry['short_name'])
+                continue
+            column = df[col].copy()
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                new = pd.Index(values.dropna().unique()).difference(column.cat.categories)
+                column = column.cat.add_categories(new)
+            elif column.dtype != values.dtype:
+                column = column.astype(object)
+            column.loc[batch.df.index] = values
+            df[col] = column
+        self.survey.weight_col = batch.weight_col
+
+    def append(self, source, valid_only=False):
+        """
+        追加新导出中的新样本（见SurveyData.append_responses），经prepare重新生成衍生列与权重后，
+        把增量累加到全部统计量
+        返回 新增样本DataFrame
+        """
+        new = source if isinstance(source, pd.DataFrame) else self.survey.read_excel(source)
+        derived = [c for c in self.survey.df.columns if c not in new.columns]
+        dependent = self._dependent_columns(derived)
+        if dependent and self.prepare is None:
+            detail = '；'.join(f"{name}: {cols}" for name, cols in dependent.items())
+            raise ValueError(f"跟踪的统计量依赖衍生列或权重列（{detail}），新增样本没有这些列的值，"
+                             f"请通过IncrementalSurvey(prepare=...)为新增样本重新生成。")
+
+        df, qinfo = self.survey.df, self.survey.qinfo
+        delta = self.survey.append_responses(new, valid_only=valid_only)
+        if len(delta):
+            batch = SurveyData.from_frames(delta.copy(), self.survey.qinfo.copy(), weight_col=self.survey.weight_col)
+            if self.prepare is not None:
+                self.prepare(batch)
+                missing = sorted({c for cols in dependent.values() for c in cols
+                                  if c not in batch.df.columns or batch.df[c].isna().all()})
+                if missing:
+                    # 恢复追加前的状态，统计量保持不变
+                    self.survey.df, self.survey.qinfo = df, qinfo
+                    raise ValueError(f"prepare没有为新增样本生成衍生列/权重列{missing}。")
+                self._write_back(batch, [c for c in batch.df.columns if c in derived or c not in delta.columns])
+            for stats in self.stats.values():
+                stats.update(batch)
+        return delta
+
+    def result(self, name):
+        return self.stats[name].result()
+
+    def results(self):
+        return {name: stats.result() for name, stats in self.stats.items()}
@@ -0,0 +1,376 @@
+import json
+import os
+import time
+import pandas as pd
+from ultis import drop_invalid_samples, map_income_group, process_income_group, save_multi_tables_to_excel, \
+    add_total_column_by_percent_sum
+from batch_runner import ANALYSIS_HANDLERS, run_jobs, merge_results
+from survey_waves import load_surveys, stack_surveys
+from tab_book import build_tab_book
+from weighting import rake_survey
+
+# 作业配置中的分析类型：ANALYSIS_HANDLERS中的类型由run_jobs在进程池中并行执行，其余在主进程中执行
+SPEC_ANALYSIS_TYPES = [*ANALYSIS_HANDLERS, 'tab_book', 'factor', 'key_drivers']
+# 各分析类型的必填字段
+SPEC_REQUIRED = {
+    'nps': ['qids'], 'nss': ['qids'], 'nss_detail': ['qids'], 'rank': ['qids'],
+    'cross': ['row_qid', 'col_qid'],
+    'tab_book': ['stub_qids', 'banner_qids'],
+    'factor': ['nps_qid', 'factor_qids'],
+    'key_drivers': ['nps_qid', 'factor_qids'],
+}
+# 筛选条件支持的运算
+FILTER_OPS = ['in', 'not_in', 'equals', 'min', 'max']
+# 衍生分组类型
+DERIVED_TYPES = ['income_group', 'map']
+# 因子分析可用名称引用的标签映射
+FACTOR_LABEL_MAPS = {'projector': 'PROJECTOR_LABELS', 'speaker': 'SPEAKER_LABELS'}
+
+
+def load_job_spec(path):
+    """
+    读取作业配置文件（.json，或.yaml/.yml，需要PyYAML）
+    配置中的相对路径（files、cache_dir、output_dir）按配置文件所在目录解析
+    """
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("读取YAML配置需要安装PyYAML（pip install pyyaml），或改用JSON配置。")
+        spec = yaml.safe_load(text)
+    else:
+        spec = json.loads(text)
+    if isinstance(spec, dict):
+        spec.setdefault('base_dir', os.path.dirname(os.path.abspath(path)))
+    return spec
+
+
+def _as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+def _resolve(spec, path):
+    """相对路径按配置文件目录解析"""
+    return path if os.path.isabs(path) else os.path.join(spec.get('base_dir') or '.', path)
+
+
+def dataset_files(spec, dataset):
+    """数据集的 (波次名list, 文件路径list)；files为dict时键为波次名，否则取文件名"""
+    files = dataset.get('files', dataset.get('file'))
+    if isinstance(files, dict):
+        waves, paths = list(files), list(files.values())
+    else:
+        paths = _as_list(files)
+        waves = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    return waves, [_resolve(spec, p) for p in paths]
+
+
+def _validate_dataset(spec, i, dataset, errors):
+    where = f"datasets[{i}]"
+    if not isinstance(dataset, dict):
+        errors.append(f"{where}: 应为字典")
+        return
+    if not isinstance(dataset.get('name'), str) or not dataset['name']:
+        errors.append(f"{where}: 缺少name")
+    files = dataset.get('files', dataset.get('file'))
+    if not files or not isinstance(files, (str, list, dict)):
+        errors.append(f"{where}: 缺少files（文件路径、路径list或{{波次名: 路径}}）")
+    else:
+        for path in dataset_files(spec, dataset)[1]:
+            if not os.path.isfile(path):
+                errors.append(f"{where}: 文件不存在: {path}")
+    for j, flt in enumerate(dataset.get('filters') or []):
+        if not isinstance(flt, dict) or not (flt.get('qid') or flt.get('column')):
+            errors.append(f"{where}.filters[{j}]: 需指定qid或column")
+        elif not any(op in flt for op in FILTER_OPS):
+            errors.append(f"{where}.filters[{j}]: 需指定条件（{'/'.join(FILTER_OPS)}）")
+    for j, derived in enumerate(dataset.get('derived') or []):
+        kind = derived.get('type') if isinstance(derived, dict) else None
+        if kind not in DERIVED_TYPES:
+            errors.append(f"{where}.derived[{j}]: type应为{'/'.join(DERIVED_TYPES)}，实际为{kind}")
+        elif kind == 'map' and not (derived.get('qid') and derived.get('name') and isinstance(derived.get('mapping'), dict)):
+            errors.append(f"{where}.derived[{j}]: map需要qid、name与mapping（{{新分组: [原选项...]}}）")
+    weights = dataset.get('weights')
+    if weights is not None and not (isinstance(weights, dict) and ('column' in weights or 'rake' in weights)):
+        errors.append(f"{where}.weights: 应为{{column: 权重列名}}或{{rake: {{targets: ...}}}}")
+
+
+def _validate_analysis(i, analysis, names, errors):
+    where = f"analyses[{i}]"
+    if not isinstance(analysis, dict):
+        errors.append(f"{where}: 应为字典")
+        return
+    kind = analysis.get('type')
+    if kind not in SPEC_ANALYSIS_TYPES:
+        errors.append(f"{where}: type应为{'/'.join(SPEC_ANALYSIS_TYPES)}，实际为{kind}")
+        return
+    for key in SPEC_REQUIRED[kind]:
+        if not analysis.get(key):
+            errors.append(f"{where}: {kind}分析缺少{key}")
+    for name in _as_list(analysis.get('datasets') or []):
+        if name not in names:
+            errors.append(f"{where}: 未定义的数据集{name}")
+    if analysis.get('percent') and (kind != 'cross' or analysis.get('is_nps')):
+        errors.append(f"{where}: percent只适用于频数交叉表（type为cross且is_nps不为true）")
+    label_map = analysis.get('label_map')
+    if isinstance(label_map, str) and label_map not in FACTOR_LABEL_MAPS:
+        errors.append(f"{where}: label_map应为{'/'.join(FACTOR_LABEL_MAPS)}或字典")
+
+
+def validate_job_spec(spec):
+    """
+    校验作业配置的结构与文件，发现的问题一次全部列出
+    配置结构
+        output_dir:  输出目录（默认当前目录）
+        max_workers: 进程数（默认CPU核数）
+        datasets:    [{name, files, valid_only, compact, cache_dir, filters, derived, weights}, ...]
+        analyses:    [{type, name, datasets, ...各类型参数}, ...]
+    异常
+        ValueError，消息中逐条列出问题
+    """
+    errors = []
+    if not isinstance(spec, dict):
+        raise ValueError("作业配置应为字典（JSON对象/YAML映射）。")
+    datasets = spec.get('datasets')
+    if not isinstance(datasets, list) or not datasets:
+        errors.append("datasets: 至少需要一个数据集")
+        datasets = []
+    for i, dataset in enumerate(datasets):
+        _validate_dataset(spec, i, dataset, errors)
+    names = [d.get('name') for d in datasets if isinstance(d, dict)]
+    duplicated = sorted({n for n in names if n and names.count(n) > 1})
+    if duplicated:
+        errors.append(f"datasets: 数据集名称重复: {duplicated}")
+    analyses = spec.get('analyses')
+    if not isinstance(analyses, list) or not analyses:
+        errors.append("analyses: 至少需要一项分析")
+        analyses = []
+    for i, analysis in enumerate(analyses):
+        _validate_analysis(i, analysis, names, errors)
+    max_workers = spec.get('max_workers')
+    if max_workers is not None and (not isinstance(max_workers, int) or max_workers < 1):
+        errors.append(f"max_workers: 应为正整数，实际为{max_workers}")
+    if errors:
+        raise ValueError("作业配置有误:\n" + '\n'.join(f"- {e}" for e in errors))
+    return spec
+
+
+def analysis_qids(analysis):
+    """分析用到的全部题号"""
+    kind = analysis['type']
+    if kind in ('nps', 'nss', 'nss_detail', 'rank'):
+        return _as_list(analysis['qids'])
+    if kind == 'cross':
+        return [analysis['row_qid'], analysis['col_qid']]
+    if kind == 'tab_book':
+        return _as_list(analysis['stub_qids']) + _as_list(analysis['banner_qids'])
+    qids = [analysis['nps_qid'], *_as_list(analysis['factor_qids'])]
+    return qids + ([analysis['by']] if analysis.get('by') else [])
+
+
+def analysis_name(analysis):
+    """分析的输出名（工作簿文件名的一部分），默认为 类型_题号"""
+    return analysis.get('name') or '_'.join([analysis['type'], *analysis_qids(analysis)])
+
+
+def analysis_datasets(spec, analysis):
+    """分析适用的数据集名，默认全部数据集"""
+    return _as_list(analysis.get('datasets') or [d['name'] for d in spec['datasets']])
+
+
+def load_datasets(spec, parallel='process'):
+    """
+    加载全部数据集：所有数据集的全部文件一次性分发到进程池并行解析，再按数据集拼接（多文件时带wave列）
+    返回 {数据集名: SurveyData}
+    """
+    by_kwargs = {}
+    for dataset in spec['datasets']:
+        kwargs = {}
+        if dataset.get('cache_dir'):
+            kwargs['cache_dir'] = _resolve(spec, dataset['cache_dir'])
+        key = tuple(sorted(kwargs.items()))
+        for wave, path in zip(*dataset_files(spec, dataset)):
+            by_kwargs.setdefault(key, []).append((dataset['name'], wave, path))
+
+    loaded = {}
+    for key, files in by_kwargs.items():
+        surveys = load_surveys([path for _, _, path in files], parallel=parallel if len(files) > 1 else None,
+                               max_workers=spec.get('max_workers'), **dict(key))
+        for (name, wave, _), survey in zip(files, surveys):
+            loaded.setdefault(name, []).append((wave, survey))
+
+    result = {}
+    for dataset in spec['datasets']:
+        waves, surveys = zip(*loaded[dataset['name']])
+        if dataset.get('valid_only', True):
+            for survey in surveys:
+                survey.df = drop_invalid_samples(survey.df)
+        survey = surveys[0] if len(surveys) == 1 else stack_surveys(surveys, waves, dataset.get('wave_col', 'wave'))
+        result[dataset['name']] = prepare_dataset(survey, dataset)
+    return result
+
+
+def _column(survey, flt):
+    if flt.get('column'):
+        return survey.df[flt['column']]
+    return survey.get_answers_by_qid(flt['qid']).iloc[:, 0]
+
+
+def apply_filters(survey, filters):
+    """按筛选条件保留样本：in / not_in / equals（取值），min / max（数值范围，含端点）"""
+    mask = pd.Series(True, index=survey.df.index)
+    for flt in filters or []:
+        values = _column(survey, flt)
+        if 'in' in flt:
+            mask &= values.isin(_as_list(flt['in']))
+        if 'not_in' in flt:
+            mask &= ~values.isin(_as_list(flt['not_in']))
+        if 'equals' in flt:
+            mask &= values == flt['equals']
+        if 'min' in flt or 'max' in flt:
+            numeric = pd.to_numeric(values, errors='coerce')
+            if 'min' in flt:
+                mask &= numeric >= flt['min']
+            if 'max' in flt:
+                mask &= numeric <= flt['max']
+    if not mask.all():
+        survey.df = survey.df[mask.to_numpy()]
+    return survey
+
+
+def add_derived(survey, derived):
+    """
+    衍生分组
+        {type: income_group, original_qid, group_col_name}: 收入分组（process_income_group，题号g1）
+        {type: map, qid, name, mapping: {新分组: [原选项...]}, original_qid}: 任意单选题重新分组，
+        新列登记为单选题（题号默认同name）
+    """
+    for item in derived or []:
+        if item['type'] == 'income_group':
+            process_income_group(survey, **{k: v for k, v in item.items() if k != 'type'})
+        else:
+            values = map_income_group(survey.get_answers_by_qid(item['qid']).iloc[:, 0], item['mapping'])
+            survey.add_derived_column(item['name'], values, original_qid=item.get('original_qid', item['name']),
+                                      qtype='S', short_name=item['name'])
+    return survey
+
+
+def prepare_dataset(survey, dataset):
+    """数据集加载后的处理：筛选 → 衍生分组 → 权重 → 紧凑存储"""
+    apply_filters(survey, dataset.get('filters'))
+    add_derived(survey, dataset.get('derived'))
+    weights = dataset.get('weights')
+    if weights and 'column' in weights:
+        survey.set_weights(weights['column'])
+    elif weights and 'rake' in weights:
+        rake = dict(weights['rake'])
+        if rake.get('trim') is not None:
+            rake['trim'] = tuple(rake['trim'])
+        rake_survey(survey, **rake)
+    if dataset.get('compact', True):
+        survey.compact()
+    return survey
+
+
+def check_qids(spec, surveys):
+    """加载后、运行前检查全部分析用到的题号在对应数据集中都存在，缺失的一次全部列出"""
+    errors = []
+    for i, analysis in enumerate(spec['analyses']):
+        for name in analysis_datasets(spec, analysis):
+            survey = surveys[name]
+            known = set(survey.qinfo['original_qid']) | set(survey.df.columns)
+            missing = [q for q in analysis_qids(analysis) if q not in known]
+            if missing:
+                errors.append(f"analyses[{i}]（{analysis_name(analysis)}）: 数据集{name}中没有题号{missing}")
+            elif analysis.get('percent') and survey.get_qtype(analysis['row_qid']) != 'S':
+                # 多选行的交叉表Base在列上、各行频数不互斥，按列百分比合计会改写Base、总计超过100%
+                errors.append(f"analyses[{i}]（{analysis_name(analysis)}）: percent只适用于单选题行，"
+                              f"{analysis['row_qid']}为{survey.get_qtype(analysis['row_qid'])}题")
+    if errors:
+        raise ValueError("题号检查未通过:\n" + '\n'.join(f"- {e}" for e in errors))
+
+
+def _batch_jobs(analysis):
+    """可由run_jobs并行执行的分析 → 任务list"""
+    kind = analysis['type']
+    if kind == 'cross':
+        cross_args = {k: analysis[k] for k in ('row_qid', 'col_qid', 'row_labels', 'is_nps') if k in analysis}
+        return [(kind, cross_args)]
+    options = {k: analysis[k] for k in ('max_rank', 'rank_weights') if kind == 'rank' and k in analysis}
+    return [(kind, qid, options) for qid in _as_list(analysis['qids'])]
+
+
+def _run_other(survey, analysis):
+    """主进程中执行的分析（表册、因子分析、关键驱动因子），返回 (表dict, 图片dict)"""
+    kind = analysis['type']
+    if kind == 'tab_book':
+        tables = build_tab_book(survey, _as_list(analysis['stub_qids']), _as_list(analysis['banner_qids']),
+                                nps_qids=_as_list(analysis.get('nps_qids') or []),
+                                include_total=analysis.get('include_total', True))
+        return tables, {}
+    import nps_factor
+    label_map = analysis.get('label_map')
+    if isinstance(label_map, str):
+        label_map = getattr(nps_factor, FACTOR_LABEL_MAPS[label_map])
+    common = dict(by=analysis.get('by'), label_map=label_map, exclude=analysis.get('exclude'), as_result=True)
+    factor_qids = _as_list(analysis['factor_qids'])
+    if kind == 'key_drivers':
+        from key_drivers import key_driver_analysis
+        options = {k: analysis[k] for k in ('missing', 'ridge_alpha', 'shapley', 'n_perm', 'seed') if k in analysis}
+        result = key_driver_analysis(survey, analysis['nps_qid'], factor_qids, **common, **options)
+        return {label: r.render() for label, r in result.items()}, {}
+    result = nps_factor.factor_analysis(survey, analysis['nps_qid'], factor_qids, split=analysis.get('split', 'median'),
+                                        **common)[analysis['nps_qid']]
+    images = {}
+    if analysis.get('charts'):
+        from quadrant_chart import render_quadrants
+        images = render_quadrants(result, parallel='process', font_path=analysis.get('font_path'))
+        images = {f"{group}_四象限": data for group, data in images.items()}
+    return {analysis['nps_qid']: result.render()}, images
+
+
+def run_job_spec(spec, show_print=True):
+    """
+    执行作业配置：校验 → 并行加载全部数据集 → 检查题号 → 运行分析 → 每个数据集每项分析写一个工作簿
+    返回
+        写出的工作簿路径list
+    说明
+        nps/nss/nss_detail/rank/cross分析按数据集合并为一批，经run_jobs在进程池中并行计算（数据只传一次）；
+        表册用一次矩阵乘法算完全部交叉表；因子四象限图用进程池批量渲染并插入工作簿
+    """
+    validate_job_spec(spec)
+    out_dir = _resolve(spec, spec.get('output_dir') or '.')
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.time()
+    surveys = load_datasets(spec)
+    check_qids(spec, surveys)
+    if show_print:
+        print(f"已加载{len(surveys)}个数据集，用时{time.time() - start:.1f}秒")
+
+    paths = []
+    for name, survey in surveys.items():
+        analyses = [a for a in spec['analyses'] if name in analysis_datasets(spec, a)]
+        batch = [a for a in analyses if a['type'] in ANALYSIS_HANDLERS]
+        jobs = [_batch_jobs(a) for a in batch]
+        flat = [job for entry in jobs for job in entry]
+        results = iter(run_jobs(survey, flat, max_workers=spec.get('max_workers')) if flat else [])
+        outputs = {}
+        for analysis, entry in zip(batch, jobs):
+            tables = merge_results(entry, [next(results) for _ in entry])
+            if analysis.get('percent'):
+                tables = {label: add_total_column_by_percent_sum(t) for label, t in tables.items()}
+            outputs[id(analysis)] = (tables, {})
+        for analysis in analyses:
+            if analysis['type'] not in ANALYSIS_HANDLERS:
+                outputs[id(analysis)] = _run_other(survey, analysis)
+        for analysis in analyses:
+            tables, images = outputs[id(analysis)]
+            paths.append(save_multi_tables_to_excel(tables, name, analysis_name(analysis), out_dir,
+                                                    show_print=False, images=images))
+            if show_print:
+                print(f"已保存: {paths[-1]}")
+    if show_print:
+        print(f"全部完成，共{len(paths)}个工作簿，用时{time.time() - start:.1f}秒")
+    return paths
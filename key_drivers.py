@@ -0,0 +1,318 @@
+from metrics_cal import *
+from metric_results import MetricResult
+from nps_factor import factor_columns, group_series
+
+# 因子数不超过该值时精确计算Shapley（枚举全部2^p个子集），否则用随机排列抽样
+SHAPLEY_EXACT_MAX = 14
+SHAPLEY_PERMUTATIONS = 2000
+# 岭回归默认惩罚系数（相关矩阵尺度）
+RIDGE_ALPHA = 0.1
+
+
+def driver_correlation(values, w=None, missing='listwise'):
+    """
+    由一个数值矩阵一次算出全部变量两两之间的相关矩阵
+    输入
+        values:  shape (样本数, 变量数) 的float矩阵，缺失为NaN（最后一列通常为NPS分数）
+        w:       可选，样本权重数组
+        missing: 'listwise'只用全部变量都有作答的样本；'pairwise'每对变量用两者都有作答的样本
+    返回
+        (corr, sd, n)：相关矩阵、各变量标准差、每对变量的样本数（不加权）
+    说明
+        每对变量的权重和、一阶矩、二阶矩与交叉积都由矩阵乘法得到，不按变量对循环
+    """
+    if missing not in ('listwise', 'pairwise'):
+        raise ValueError(f"missing应为'listwise'或'pairwise'，实际为{missing}。")
+    answered = ~np.isnan(values)
+    if missing == 'listwise':
+        answered = answered & answered.all(axis=1, keepdims=True)
+    w = np.ones(len(values)) if w is None else np.asarray(w, dtype=np.float64)
+    mask = answered.astype(np.float64)
+    filled = np.where(answered, values, 0.0)
+    wx = filled * w[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sums = (mask * w[:, None]).T @ mask                  # 每对变量的权重和
+        mean = (wx.T @ mask) / sums                          # mean[i, j]: 变量i在i、j都作答的样本中的均值
+        var = ((wx * filled).T @ mask) / sums - mean ** 2
+        cov = (wx.T @ filled) / sums - mean * mean.T
+        corr = cov / np.sqrt(var * var.T)
+    sd = np.sqrt(np.diag(var))
+    return corr, sd, (mask.T @ mask).astype(np.int64)
+
+
+def sweep(matrix, k, inverse=False):
+    """
+    对对称矩阵第k个主元做sweep（原地）：sweep一组变量后，因变量对角元即为1 - R²；inverse=True撤销一次sweep
+    """
+    pivot = matrix[k, k]
+    row = matrix[k].copy()
+    matrix -= np.outer(row, row) / pivot
+    matrix[k] = (-row if inverse else row) / pivot
+    matrix[:, k] = matrix[k]
+    matrix[k, k] = -1.0 / pivot
+
+
+def subset_r2_table(corr):
+    """
+    全部2^p个因子子集回归的R²（按位掩码索引）
+    输入
+        corr: (p+1)×(p+1) 相关矩阵，最后一行/列为因变量
+    说明
+        按Gray码顺序遍历子集，相邻子集只差一个因子，每个子集只做一次O(p²)的sweep/撤销，不重新拟合
+    """
+    p = len(corr) - 1
+    matrix = corr.copy()
+    table = np.zeros(1 << p)
+    gray = 0
+    for i in range(1, 1 << p):
+        k = (i & -i).bit_length() - 1
+        sweep(matrix, k, inverse=bool(gray >> k & 1))
+        gray ^= 1 << k
+        table[gray] = 1.0 - matrix[p, p]
+    return table
+
+
+def shapley_exact(corr):
+    """由子集R²表精确计算Shapley值：φ_j = Σ_S |S|!(p-|S|-1)!/p! × (R²(S∪j) - R²(S))"""
+    p = len(corr) - 1
+    table = subset_r2_table(corr)
+    masks = np.arange(1 << p)
+    sizes = np.zeros(1 << p, dtype=np.int64)
+    for k in range(p):
+        sizes += masks >> k & 1
+    factorial = np.cumprod(np.r_[1.0, np.arange(1, p + 1)])
+    coef = factorial[sizes] * factorial[np.clip(p - sizes - 1, 0, None)] / factorial[p]
+    shapley = np.zeros(p)
+    for k in range(p):
+        without = masks[(masks >> k & 1) == 0]
+        shapley[k] = (coef[without] * (table[without | 1 << k] - table[without])).sum()
+    return shapley
+
+
+def shapley_sampled(corr, n_perm=SHAPLEY_PERMUTATIONS, seed=None):
+    """
+    随机排列抽样估计Shapley值（因子多时），每个排列依次sweep加入因子，R²增量即边际贡献
+    每个排列与其逆序成对使用（对偶抽样），各因子贡献之和仍严格等于全模型R²
+    各子集的R²按位掩码缓存，跨排列复用：前缀子集已算过时只记下待加入的因子，
+    遇到未算过的子集才把它们一并sweep（sweep与顺序无关），全集与小子集不会重复计算
+    返回 (shapley, 标准误)
+    """
+    p = len(corr) - 1
+    rng = np.random.default_rng(seed)
+    n_pairs = max(n_perm // 2, 1)
+    draws = np.zeros((n_pairs, p))
+    cache = {0: 0.0}
+    for i in range(n_pairs):
+        order = rng.permutation(p)
+        for perm in (order, order[::-1]):
+            matrix = corr.copy()
+            mask, previous, pending = 0, 0.0, []
+            for k in perm:
+                mask |= 1 << int(k)
+                r2 = cache.get(mask)
+                if r2 is None:
+                    for j in pending:
+                        sweep(matrix, j)
+                    pending = []
+                    sweep(matrix, k)
+                    r2 = cache[mask] = 1.0 - matrix[p, p]
+                else:
+                    pending.append(k)
+                draws[i, k] += (r2 - previous) / 2
+                previous = r2
+    se = draws.std(axis=0, ddof=1) / np.sqrt(n_pairs) if n_pairs > 1 else np.full(p, np.nan)
+    return draws.mean(axis=0), se
+
+
+def relative_weights(corr):
+    """
+    Johnson相对权重：把因子正交化后分解R²，各因子权重之和等于全模型R²
+    """
+    rxx, rxy = corr[:-1, :-1], corr[:-1, -1]
+    eigval, eigvec = np.linalg.eigh(rxx)
+    lam = eigvec @ np.diag(np.sqrt(np.clip(eigval, 0, None))) @ eigvec.T
+    beta = np.linalg.solve(lam, rxy)
+    return (lam ** 2) @ (beta ** 2)
+
+
+def calc_driver_stats(factors, scores, weights=None, names=None, missing='listwise', ridge_alpha=RIDGE_ALPHA,
+                      shapley='auto', n_perm=SHAPLEY_PERMUTATIONS, seed=None):
+    """
+    单组关键驱动因子分析：各因子评分对NPS分数(0-10)的相关、回归与重要性分解
+    输入
+        factors: 因子评分DataFrame（每列一个因子）
+        scores:  NPS分数Series，索引与factors对齐
+        weights: 可选，样本权重
+        names:   可选，{列名: 因子名}
+        missing: 缺失处理，'listwise'或'pairwise'（见driver_correlation）
+        ridge_alpha: 岭回归惩罚系数（相关矩阵尺度）
+        shapley: 'auto'（因子数<=SHAPLEY_EXACT_MAX时精确，否则抽样）、'exact'、'sampled'或None（不计算）
+        n_perm/seed: 抽样Shapley的排列数与随机种子
+    返回
+        (values, info)
+        values: 每个因子一行：factor + name + n + corr + beta + coef + ridge_beta
+                + relative_weight + relative_weight_pct + shapley + shapley_pct（+ shapley_se，抽样时）
+        info:   {'r2', 'n', 'shapley_method'}
+    说明
+        所有回归都由一次算出的相关矩阵求得，不再回到样本数据：
+        标准化系数 R_xx⁻¹r_xy，岭回归 (R_xx + αI)⁻¹r_xy，子集R²由sweep得到；
+        *_pct为占全模型R²的百分比
+    """
+    y = nps_score_codes(scores.reindex(factors.index)).astype(np.float64)
+    y[(y < 0) | (y > 10)] = np.nan
+    values = np.column_stack([to_numeric_matrix(factors), y])
+    w = weight_series(weights, factors.index)
+    corr, sd, pair_n = driver_correlation(values, None if w is None else w.to_numpy(), missing)
+    p = factors.shape[1]
+    n = int(pair_n[:p, :p].min()) if missing == 'pairwise' else int(pair_n[p, p])
+    if n < p + 2 or not np.isfinite(corr).all():
+        raise ValueError(f"有效样本数({n})不足或存在无变化的因子，无法对{p}个因子做回归"
+                         f"（N/A较多的因子请用exclude去掉）。")
+    try:
+        np.linalg.cholesky(corr[:p, :p])
+    except np.linalg.LinAlgError:
+        raise ValueError("因子相关矩阵不正定（存在共线因子，或pairwise缺失处理所致），请去掉共线因子或改用missing='listwise'。")
+
+    rxx, rxy = corr[:p, :p], corr[:p, p]
+    beta = np.linalg.solve(rxx, rxy)
+    r2 = float(rxy @ beta)
+    names = names or {}
+    stats = pd.DataFrame({
+        'factor': list(factors.columns),
+        'name': [names.get(c, c) for c in factors.columns],
+        'n': pair_n[:p, p],
+        'corr': rxy,
+        'beta': beta,
+        'coef': beta * sd[p] / sd[:p],
+        'ridge_beta': np.linalg.solve(rxx + ridge_alpha * np.eye(p), rxy),
+    })
+    stats['relative_weight'] = relative_weights(corr)
+    stats['relative_weight_pct'] = stats['relative_weight'] / r2 * 100 if r2 > 0 else 0.0
+
+    if shapley == 'auto':
+        shapley = 'exact' if p <= SHAPLEY_EXACT_MAX else 'sampled'
+    if shapley == 'exact':
+        stats['shapley'] = shapley_exact(corr)
+    elif shapley == 'sampled':
+        stats['shapley'], stats['shapley_se'] = shapley_sampled(corr, n_perm, seed)
+    elif shapley is not None:
+        raise ValueError(f"shapley应为'auto'/'exact'/'sampled'/None，实际为{shapley}。")
+    if shapley is not None:
+        stats.insert(stats.columns.get_loc('shapley') + 1, 'shapley_pct',
+                     stats['shapley'] / r2 * 100 if r2 > 0 else 0.0)
+    return stats, {'r2': r2, 'n': n, 'shapley_method': shapley}
+
+
+def calc_key_drivers(factors, scores, by=None, weights=None, **kwargs):
+    """
+    关键驱动因子分析，可按分组（市场/波次/产品线）分别计算
+    输入
+        by: 可选，分组Series；其余参数同calc_driver_stats
+    返回
+        (values, model)
+        values: 每组每个因子一行，最前为group列（与calc_factor_means的因子表一致）
+        model:  DataFrame，每组一行：r2 + n + shapley_method + note
+    说明
+        某组样本不足或因子共线无法回归时跳过该组，原因记在model的note列（r2、n为缺失），其余组照常计算；
+        全部组都无法计算时报错
+    """
+    if by is None:
+        subsets = [('整体调研用户', factors.index)]
+    else:
+        codes, group_keys = group_codes(by, index=factors.index)
+        subsets = [(key, factors.index[codes == g]) for g, key in enumerate(group_keys.iloc[:, 0])]
+    w = weight_series(weights, factors.index)
+    frames, model = [], {}
+    for key, index in subsets:
+        try:
+            stats, info = calc_driver_stats(factors.loc[index], scores, weights=None if w is None else w.loc[index],
+                                            **kwargs)
+        except ValueError as e:
+            model[key] = {'r2': np.nan, 'n': np.nan, 'shapley_method': None, 'note': str(e)}
+            continue
+        stats.insert(0, 'group', key)
+        frames.append(stats)
+        model[key] = dict(info, note='')
+    if not frames:
+        raise ValueError('；'.join(f"{key}: {info['note']}" for key, info in model.items()))
+    model = pd.DataFrame.from_dict(model, orient='index')
+    model.index.name = 'group'
+    return pd.concat(frames, ignore_index=True), model
+
+
+def format_driver_table(values):
+    """
+    关键驱动因子表：因子 + 样本量 + 相关系数 + 标准化回归系数 + 岭回归系数 + 相对权重% + Shapley%
+    多组时在最前加分组列
+    """
+    table = pd.DataFrame({'因子': values['name'].to_numpy()}, index=values.index)
+    table['样本量'] = format_counts(values['n'])
+    table['相关系数'] = values['corr'].round(3)
+    table['标准化回归系数'] = values['beta'].round(3)
+    table['岭回归系数'] = values['ridge_beta'].round(3)
+    table['相对权重'] = format_percent(values['relative_weight_pct'])
+    if 'shapley_pct' in values.columns:
+        table['Shapley重要性'] = format_percent(values['shapley_pct'])
+    if values['group'].nunique() > 1:
+        table.insert(0, '分组', values['group'].to_numpy())
+    return table.reset_index(drop=True)
+
+
+class DriverResult(MetricResult):
+    """
+    关键驱动因子结果：values为calc_key_drivers的因子表（每组每个因子一行）
+    meta: nps_qid、factor_qids、group_by、model（每组的r2、n、shapley_method、note，跳过的组note为原因）
+    """
+
+    @classmethod
+    def from_frames(cls, factors, scores, by=None, weights=None, **kwargs):
+        meta = {k: kwargs.pop(k) for k in ('nps_qid', 'factor_qids', 'group_by') if k in kwargs}
+        values, model = calc_key_drivers(factors, scores, by=by, weights=weights, **kwargs)
+        return cls(values, dict(meta, model=model))
+
+    def groups(self):
+        """各组名，按首次出现顺序"""
+        return list(pd.unique(self.values['group']))
+
+    def group(self, name):
+        """单组的DriverResult，values的index从0开始"""
+        values = self.values[self.values['group'] == name].reset_index(drop=True)
+        return DriverResult(values, dict(self.meta, model=self.meta['model'].loc[[name]]))
+
+    def _render(self):
+        return format_driver_table(self.values)
+
+
+def key_driver_analysis(survey, nps_qid, factor_qids, by=None, label_map=None, exclude=None, as_result=False,
+                        **kwargs):
+    """
+    NPS关键驱动因子分析：因子评分（M10/M11等满意度矩阵题）对NPS分数的相关、回归与重要性分解
+    输入
+        survey:      SurveyData对象
+        nps_qid:     NPS题号，如'S2'
+        factor_qids: 因子题号或题号list
+        by:          可选，分组题号或列名（如'wave'）
+        label_map/exclude: 同nps_factor.factor_analysis
+        as_result:   为True时返回DriverResult数值结果，否则返回字符串表
+        kwargs:      传给calc_driver_stats（missing、ridge_alpha、shapley、n_perm、seed）
+    返回
+        table: {nps_qid: DriverResult或关键驱动因子表}
+    说明
+        回归需要全部因子都有评分的样本（pairwise时为每对因子），满意度矩阵题中N/A（未使用该功能）较多时，
+        把整道矩阵题都放进来会使有效样本所剩无几，需用exclude去掉这些因子；
+        样本不足的分组会被跳过并打印原因（见DriverResult.meta['model']的note列）
+    """
+    if isinstance(factor_qids, str):
+        factor_qids = [factor_qids]
+    factor_cols, names = factor_columns(survey, factor_qids, label_map, exclude)
+    scores = survey.get_answers_by_qid(nps_qid).iloc[:, 0]
+    result = DriverResult.from_frames(survey.df[factor_cols], scores, by=group_series(survey, by),
+                                      weights=survey.weights, names=names, nps_qid=nps_qid,
+                                      factor_qids=list(factor_qids), group_by=by, **kwargs)
+    for key, note in result.meta['model']['note'].items():
+        if note:
+            print(f'{nps_qid} 关键驱动因子：跳过分组{key}，{note}')
+    table = {}
+    table[nps_qid] = result if as_result else result.render()
+    print(f'{nps_qid} 关键驱动因子分析完成!')
+    return table
@@ -1,67 +1,37 @@
-from metrics_cal import *
-from Survey_Data import SurveyData
-from ultis import *
-from analysis import cross_analysis_handler, nps_analysis, nss_analysis, nss_detail_analysis, rank_analysis
+import argparse
+import os
+import sys
+from job_spec import load_job_spec, validate_job_spec, run_job_spec
 
 
-def batch_analysis_and_export(survey, qids, analysis_type,
-                              cross_args=None):
+def main(argv=None):
     """
-    批量分析与导出入口函数
-    输入
-        survey:      SurveyData对象
-        qids=[]:        单个题号（str）或题号list
-        analysis_type:  'nps', 'nss', 'nss_detail', 'rank', 'cross'
-        cross_args: dict，cross分析专用参数
+    命令行入口：python main.py job.yaml [--check] [--max-workers N] [--output-dir DIR]
+    返回退出码：0成功；2配置或题号有误（错误逐条输出到stderr）
     """
-    if analysis_type == 'cross':
-        return cross_analysis_handler(survey, cross_args)
-
-    if isinstance(qids, str):
-        qids = [qids]
-
-    # 只处理单个qid的情况，多个qid的循环调用逻辑可以在外部实现
-    if len(qids) > 1:
-        print("警告: 当前只处理单个qid的分析，将使用第一个qid")
-    qid = qids[0]
-
-    if analysis_type == 'nps':
-        return nps_analysis(survey, qid)
-    elif analysis_type == 'nss':
-        return nss_analysis(survey, qid)
-    elif analysis_type == 'nss_detail':
-        return nss_detail_analysis(survey, qid)
-    elif analysis_type == 'rank':
-        return rank_analysis(survey, qid)
-    else:
-        print(f'不支持的分析类型: {analysis_type}')
-        return {}
-
-
-survey = SurveyData("D:/3概念测试/0626/SurveyResults_2025-07-30-09-39-59.xlsx")
-survey.df = drop_invalid_samples(survey.df)  # 只保留有效样本
-# 使用工具函数处理收入分组
-#process_income_group(survey)
-
-
-
-cross_all_tab = batch_analysis_and_export(survey, 
-                          qids=[], 
-                          analysis_type='cross', 
-                          cross_args={
-                                "row_col": 'S19', 
-                                "col_col": 'S13',  
-                                "row_labels": {},  # 行标签映射字典
-                                "col_labels": {},  # 列标签映射字典
-                                "is_numeric": False  # S19是分类变量
-                            }
-                        )       
-
-
-# for label, cross_tab in cross_all_tab.items():
-#     cross_tab = add_total_column_by_percent_sum(cross_tab)
-#     cross_all_tab[label] = cross_tab
-# save_multi_tables_to_excel(cross_all_tab, 'M11_g1', 'cross', 'D:/1NPS_projector/survey_data/UK/nps_result')
-# print('cross分析结果已保存!')
-print(cross_all_tab)
-#save_multi_tables_to_excel(cross_all_tab, "S69_S70", 'cross', 'D:/1NPS_projector/survey_data/UK/nps_result')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='按作业配置（YAML/JSON）批量运行问卷分析并导出Excel')
+    parser.add_argument('spec', help='作业配置文件（.yaml/.yml/.json）')
+    parser.add_argument('--check', action='store_true', help='只校验配置，不加载数据、不运行分析')
+    parser.add_argument('--max-workers', type=int, default=None, help='进程数，覆盖配置中的max_workers')
+    parser.add_argument('--output-dir', default=None, help='输出目录，覆盖配置中的output_dir')
+    args = parser.parse_args(argv)
+
+    try:
+        spec = load_job_spec(args.spec)
+        if args.max_workers is not None:
+            spec['max_workers'] = args.max_workers
+        if args.output_dir is not None:
+            spec['output_dir'] = os.path.abspath(args.output_dir)
+        if args.check:
+            validate_job_spec(spec)
+            print(f"配置有效: {len(spec['datasets'])}个数据集，{len(spec['analyses'])}项分析")
+            return 0
+        run_job_spec(spec)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
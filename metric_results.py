@@ -0,0 +1,188 @@
+from abc import ABC, abstractmethod
+from metrics_cal import *
+from confidence import net_score_ci, weighted_net_score_ci
+from significance import column_proportion_tests, chi_square_test
+
+
+def _net_score_interval(values, top_pct, bottom_pct, method, confidence, n_boot, seed):
+    """由数值结果中的占比还原人数计算净值指标区间；含eff_base列（加权结果）时按有效样本量计算"""
+    base = values['base'].to_numpy()
+    top = top_pct.to_numpy() * base / 100
+    bottom = bottom_pct.to_numpy() * base / 100
+    if 'eff_base' in values.columns:
+        ci = weighted_net_score_ci(top, bottom, base, values['eff_base'].to_numpy(), method, confidence, n_boot, seed)
+    else:
+        ci = net_score_ci(np.rint(top), np.rint(bottom), base, method, confidence, n_boot, seed)
+    ci.index = values.index
+    return ci
+
+
+class MetricResult(ABC):
+    """
+    数值优先的分析结果
+    属性
+        values: 数值DataFrame（百分比为float，不含"xx.xx%"字符串）
+        meta:   元数据dict（题号、短名映射、参数等）
+    方法
+        render(): 按需生成与原分析函数相同格式的字符串表，结果缓存
+    汇总、加总计、显著性检验、重新导出等下游计算直接使用values，无需把字符串解析回数字
+    """
+
+    def __init__(self, values, meta=None):
+        self.values = values
+        self.meta = dict(meta or {})
+        self._table = None
+
+    def render(self):
+        """返回展示用的字符串表（副本，修改不影响缓存）"""
+        if self._table is None:
+            self._table = self._render()
+        return self._table.copy()
+
+    @abstractmethod
+    def _render(self):
+        """由values生成展示用的字符串表，子类实现"""
+
+    def __repr__(self):
+        return f"{type(self).__name__}(shape={self.values.shape}, meta={self.meta})"
+
+
+class NPSResult(MetricResult):
+    """
+    NPS结果：values每组一行，列为 base + 0..10(百分比) + pct_recommend + pct_passive + pct_detractor + nps
+    meta['grouped']为False时只有一行（整体），render为nps_table格式；
+    为True时index为分组键，render为按分组横向拼接的nps_cross_table格式（跳过没有任何作答的组）
+    指定weights时base为加权Base，并在base后加eff_base（有效样本量）
+    """
+
+    @classmethod
+    def from_series(cls, ser, weights=None, **meta):
+        stats = calc_nps_stats(ser, weights=weights)
+        return cls(stats.to_frame('整体调研用户').T, dict(meta, grouped=False))
+
+    @classmethod
+    def from_groups(cls, scores, by, weights=None, **meta):
+        group_keys, counts, totals, answered, eff_base = nps_counts_by_group(scores, by, weights)
+        stats = nps_from_counts(counts, totals)
+        if weights is not None:
+            stats.insert(0, 'eff_base', eff_base)
+        stats.insert(0, 'base', totals)
+        stats.index = pd.Index(group_keys.iloc[:, 0]) if group_keys.shape[1] == 1 else pd.MultiIndex.from_frame(group_keys)
+        return cls(stats, dict(meta, grouped=True, answered=answered))
+
+    @property
+    def nps(self):
+        return self.values['nps']
+
+    @property
+    def base(self):
+        return self.values['base']
+
+    def confidence_interval(self, method='analytic', confidence=0.95, n_boot=10000, seed=None):
+        """
+        每组NPS的置信区间（参数同confidence.nps_ci），直接由values中的推荐者/贬损者占比还原人数计算
+        返回 DataFrame，index与values相同：base + nps + se + lower + upper（加权结果base后加eff_base）
+        """
+        return _net_score_interval(self.values, self.values['pct_recommend'], self.values['pct_detractor'],
+                                   method, confidence, n_boot, seed).rename(columns={'score': 'nps'})
+
+    def _render(self):
+        if not self.meta.get('grouped'):
+            return nps_table_from_stats(self.values.iloc[0])
+        answered = self.meta.get('answered', np.ones(len(self.values)))
+        tables = []
+        for i, group_val in enumerate(self.values.index):
+            if answered[i] == 0:
+                continue
+            table = nps_table_from_stats(self.values.iloc[i])
+            # 添加分组名称前缀
+            table.columns = [f'{group_val}_{col}' for col in table.columns]
+            tables.append(table)
+        return pd.concat(tables, axis=1) if tables else pd.DataFrame()
+
+
+class NSSResult(MetricResult):
+    """
+    NSS结果：values为calc_nss_matrix的输出（每列一行：base + 1..5(百分比) + t2b + mean + nss）
+    """
+
+    @classmethod
+    def from_frame(cls, df_satisfaction, short_names=None, weights=None, **meta):
+        if isinstance(df_satisfaction, pd.Series):
+            df_satisfaction = df_satisfaction.to_frame()
+        return cls(calc_nss_matrix(df_satisfaction, weights=weights), dict(meta, short_names=short_names or {}))
+
+    def confidence_interval(self, method='analytic', confidence=0.95, n_boot=10000, seed=None):
+        """
+        每列NSS的置信区间（参数同confidence.nss_ci）
+        返回 DataFrame，index与values相同：base + nss + se + lower + upper（加权结果base后加eff_base）
+        """
+        return _net_score_interval(self.values, self.values['t2b'], self.values[[1, 2, 3]].sum(axis=1),
+                                   method, confidence, n_boot, seed).rename(columns={'score': 'nss'})
+
+    def _render(self):
+        return format_nss_table(self.values, self.meta.get('short_names'))
+
+
+class RankResult(MetricResult):
+    """
+    排序题结果：values为calc_rank_stats的输出（每个选项一行：n_selected + 1..max_rank(计数) + pct_selected + index）
+    """
+
+    @classmethod
+    def from_frame(cls, df_rank, max_rank, option_cols=None, short_names=None, rank_weights=None, weights=None, **meta):
+        stats = calc_rank_stats(df_rank, max_rank, option_cols, rank_weights=rank_weights, weights=weights)
+        max_rank = sum(isinstance(c, (int, np.integer)) for c in stats.columns)
+        return cls(stats, dict(meta, max_rank=max_rank, rank_weights=rank_weights, short_names=short_names or {}))
+
+    def _render(self):
+        return format_rank_table(self.values, self.meta.get('short_names'))
+
+
+class ChoiceDetailResult(MetricResult):
+    """
+    多选题选项结果：values为calc_choice_detail的输出（每个选项一行：base + n + pct）
+    """
+
+    @classmethod
+    def from_frame(cls, df, option_cols, option_names=None, weights=None, **meta):
+        return cls(calc_choice_detail(df, option_cols, weights=weights), dict(meta, option_names=option_names or {}))
+
+    @property
+    def base(self):
+        return format_base(self.values['base'].iloc[0]) if len(self.values) else 0
+
+    def _render(self):
+        return format_choice_detail(self.values, self.meta.get('option_names'))
+
+
+class CrossTabResult(MetricResult):
+    """
+    频数交叉表结果：values为频数表（可含Base行），render返回频数表本身
+    percentages()一次返回列/行/总百分比（数值），render_percent()按列百分比加总计列渲染，
+    significance()返回列比例z检验与卡方检验结果；加权表的meta['eff_bases']为各列有效样本量
+    """
+
+    def _render(self):
+        return self.values
+
+    def counts_with_base(self):
+        """带Base行的频数表；没有Base行时以各列合计作为Base"""
+        if 'Base' in self.values.index:
+            return self.values
+        base = pd.DataFrame([self.values.sum(axis=0)], index=['Base'])
+        return pd.concat([base, self.values])
+
+    def percentages(self, total_colname='总计', formatted=False):
+        """crosstab_percentages的结果：{'base', 'col_pct', 'row_pct', 'total_pct'}"""
+        return crosstab_percentages(self.values, total_colname=total_colname, formatted=formatted)
+
+    def significance(self, alpha=0.05, min_base=0):
+        """列比例z检验（p值矩阵与字母标记）及整表卡方检验，见significance模块"""
+        counts = self.counts_with_base()
+        tests = column_proportion_tests(counts, alpha=alpha, min_base=min_base, eff_bases=self.meta.get('eff_bases'))
+        tests['chi_square'] = chi_square_test(counts)
+        return tests
+
+    def render_percent(self, total_colname='总计'):
+        return add_total_column_by_percent_sum(self.counts_with_base().astype(object), total_colname=total_colname)
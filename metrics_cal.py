@@ -1,9 +1,9 @@
-
 from ultis import *
-def calc_nps_from_series(ser):
+def calc_nps_from_series(ser, weights=None):
     """
     输入
         ser: Series (必须为0-10分数，非数字或缺失会被自动忽略)
+        weights: 可选，样本权重（与ser索引对齐的Series或等长数组）
     返回
         (nps, score_pct, pct_recommend, pct_passive, pct_detractor)
         nps: NPS分数(float)
@@ -12,11 +12,17 @@ def calc_nps_from_series(ser):
         pct_passive: 中立者百分比
         pct_detractor: 贬损者百分比
     """
+    if weights is not None:
+        stats = calc_nps_stats(ser, weights=weights)
+        if stats['base'] == 0:
+            return 0, 0, 0, 0, 0
+        score_pct = stats[NPS_SCORES].astype(float)
+        return stats['nps'], score_pct, stats['pct_recommend'], stats['pct_passive'], stats['pct_detractor']
     # 增强数据清洗：处理带空格的字符串分数
     if ser.dtype == object:
         ser = ser.str.strip()  # 去除字符串前后空格
-    # 转换为整数类型确保索引匹配
-    ser = pd.to_numeric(ser, errors='coerce').fillna(-1).astype(int)
+    # 转换为整数类型确保索引匹配（紧凑存储的数值/category列不再逐个解析字符串）
+    ser = to_numeric_series(ser).fillna(-1).astype(int)
     ser = ser[ser != -1]  # 移除转换失败的数据
     total = ser.dropna().count()
     if total == 0:
@@ -32,39 +38,192 @@ def calc_nps_from_series(ser):
     nps = pct_recommend - pct_detractor
     return nps, score_pct, pct_recommend, pct_passive, pct_detractor
 
-def nps_table(ser):
+# NPS分数取值0~10，及推荐者/中立者/贬损者对应的分数
+NPS_SCORES = list(range(0, 11))
+NPS_PROMOTER_SCORES = [9, 10]
+NPS_PASSIVE_SCORES = [7, 8]
+NPS_DETRACTOR_SCORES = list(range(0, 7))
+
+
+def nps_score_codes(ser):
+    """
+    把分数Series清洗为整数数组（规则与calc_nps_from_series相同），无效分数记为-1
+    """
+    if ser.dtype == object:
+        ser = ser.str.strip()
+    values = to_numeric_series(ser).to_numpy(dtype=float, na_value=np.nan)
+    codes = np.full(len(values), -1, dtype=np.int64)
+    valid = ~np.isnan(values)
+    codes[valid] = values[valid].astype(np.int64)
+    return codes
+
+
+def group_codes(by, index=None):
+    """
+    把一个或多个分组Series编码为组号（按首次出现顺序，与Series.unique()一致），任一分组键缺失记为-1
+    返回 (codes数组, 分组键DataFrame：每组一行)
+    """
+    if isinstance(by, pd.Series):
+        by = [by]
+    keys = pd.concat(list(by), axis=1)
+    keys.columns = [k.name if k.name is not None else f'key_{i}' for i, k in enumerate(by)]
+    if index is not None:
+        keys = keys.reindex(index)
+    codes = keys.groupby(list(keys.columns), sort=False, dropna=True, observed=True).ngroup()
+    codes = codes.fillna(-1).to_numpy(dtype=np.int64)
+    first_rows = pd.Series(np.arange(len(codes)))[codes >= 0].groupby(codes[codes >= 0]).first()
+    group_keys = keys.iloc[first_rows.to_numpy()].reset_index(drop=True)
+    return codes, group_keys
+
+
+def grouped_effective_base(codes, w, n_groups):
+    """各组有效样本量 (Σw)² / Σw²，codes为组号（只传入参与计算的行）"""
+    sums = np.bincount(codes, weights=w, minlength=n_groups)
+    squares = np.bincount(codes, weights=w ** 2, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(squares > 0, sums ** 2 / np.where(squares > 0, squares, 1), 0.0)
+
+
+def nps_counts_by_group(scores, by, weights=None):
+    """
+    一次遍历统计各分组的0~10分频数
+    输入
+        scores: 分数Series（0-10）
+        by:     分组Series或Series列表，索引与scores对齐
+        weights: 可选，样本权重；指定时频数与Base为加权和
+    返回
+        (group_keys, counts, totals, answered, eff_base)
+        group_keys: 分组键DataFrame，按首次出现顺序
+        counts:     shape (组数, 11) 的各分数频数
+        totals:     各组有效数字分数的个数（Base）
+        answered:   各组非缺失作答数（含非数字作答，不加权）
+        eff_base:   各组有效样本量（不加权时等于totals）
+    """
+    codes, group_keys = group_codes(by, index=scores.index)
+    n_groups = len(group_keys)
+    score_codes = nps_score_codes(scores)
+    in_group = codes >= 0
+    valid = in_group & (score_codes != -1)
+    in_range = valid & (score_codes >= 0) & (score_codes <= 10)
+    w = weight_series(weights, scores.index)
+    if w is None:
+        counts = np.bincount(codes[in_range] * 11 + score_codes[in_range], minlength=n_groups * 11).reshape(n_groups, 11)
+        totals = np.bincount(codes[valid], minlength=n_groups)
+        eff_base = totals
+    else:
+        w = w.to_numpy()
+        counts = np.bincount(codes[in_range] * 11 + score_codes[in_range], weights=w[in_range],
+                             minlength=n_groups * 11).reshape(n_groups, 11)
+        totals = np.bincount(codes[valid], weights=w[valid], minlength=n_groups)
+        eff_base = grouped_effective_base(codes[valid], w[valid], n_groups)
+    answered = np.bincount(codes[in_group & scores.notna().to_numpy()], minlength=n_groups)
+    return group_keys, counts, totals, answered, eff_base
+
+
+def nps_from_counts(counts, totals=None):
+    """
+    由频数矩阵批量计算NPS指标
+    输入
+        counts: shape (组数, 11) 的0~10分频数
+        totals: 各组分母（默认为counts行和）
+    返回
+        DataFrame: 列为 0..10(百分比)、pct_recommend、pct_passive、pct_detractor、nps；分母为0的组全为0
+    """
+    counts = np.asarray(counts, dtype=float)
+    if totals is None:
+        totals = counts.sum(axis=1)
+    totals = np.asarray(totals, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score_pct = np.where(totals[:, None] > 0, counts / totals[:, None] * 100, 0.0)
+    result = pd.DataFrame(score_pct, columns=NPS_SCORES)
+    result['pct_recommend'] = score_pct[:, NPS_PROMOTER_SCORES].sum(axis=1)
+    result['pct_passive'] = score_pct[:, NPS_PASSIVE_SCORES].sum(axis=1)
+    result['pct_detractor'] = score_pct[:, NPS_DETRACTOR_SCORES].sum(axis=1)
+    result['nps'] = result['pct_recommend'] - result['pct_detractor']
+    return result
+
+
+def calc_nps_by_group(scores, by, weights=None):
+    """
+    分组NPS引擎：一次bincount计算所有分组的分数分布、推荐/中立/贬损占比和NPS
+    输入
+        scores: 分数Series（0-10，非数字或缺失自动忽略）
+        by:     分组Series或Series列表（与scores索引对齐），分组键缺失的行不参与计算
+        weights: 可选，样本权重
+    返回
+        tidy DataFrame，每组一行：分组键列 + base + 0..10(百分比) + pct_recommend + pct_passive + pct_detractor + nps
+        加权时base为加权Base，并在base后加eff_base（有效样本量）
+        结果与对每组分别调用nps_table一致
+    """
+    group_keys, counts, totals, _, eff_base = nps_counts_by_group(scores, by, weights)
+    stats = nps_from_counts(counts, totals)
+    if weights is not None:
+        stats.insert(0, 'eff_base', eff_base)
+    stats.insert(0, 'base', totals)
+    return pd.concat([group_keys, stats], axis=1)
+
+
+def calc_nps_stats(ser, weights=None):
+    """
+    单列NPS的数值结果
+    输入
+        ser: 分数Series或单列DataFrame（0-10，非数字或缺失自动忽略）
+        weights: 可选，样本权重
+    返回
+        Series：base + 0..10(百分比) + pct_recommend + pct_passive + pct_detractor + nps（与calc_nps_by_group的一行相同）
+        加权时base为加权Base，并在base后加eff_base（有效样本量）
+    """
+    if isinstance(ser, pd.DataFrame):
+        if ser.shape[1] != 1:
+            raise ValueError("calc_nps_stats只适用于单列数据。")
+        ser = ser.iloc[:, 0]
+    codes = nps_score_codes(ser)
+    valid = codes != -1
+    in_range = valid & (codes >= 0) & (codes <= 10)
+    w = weight_series(weights, ser.index)
+    if w is None:
+        counts = np.bincount(codes[in_range], minlength=11)
+        head = {'base': int(valid.sum())}
+    else:
+        w = w.to_numpy()
+        counts = np.bincount(codes[in_range], weights=w[in_range], minlength=11)
+        head = {'base': w[valid].sum(), 'eff_base': float(effective_base(w[valid]))}
+    stats = nps_from_counts(counts[None, :], [head['base']]).iloc[0]
+    return pd.concat([pd.Series(head), stats])
+
+
+def nps_table(ser, weights=None):
     """
     输入
         ser: 单选题分数Series
+        weights: 可选，样本权重
     
     返回
        NPS表(pd.DataFrame)
     """
+    return nps_table_from_stats(calc_nps_stats(ser, weights=weights))
 
-    # 只要有效数字分数
-    ser = to_numeric_series(ser)
 
-    # 计算NPS相关百分比
-    nps,score_pct, pct_recommend, pct_passive, pct_detractor = calc_nps_from_series(ser)
-
-    # 输出表构造 - 使用列表推导式简化代码
+def nps_table_from_stats(stats):
+    """
+    把calc_nps_by_group结果中的一行渲染成nps_table格式的表
+    """
     rows = [
-        ('Base: 实际样本', ser.count()),
-        *[(str(i), f"{score_pct.loc[i]:.2f}%") for i in range(0, 11)],
-        ("推荐者", f"{pct_recommend:.2f}%"),
-        ("中立者", f"{pct_passive:.2f}%"),
-        ("贬损者", f"{pct_detractor:.2f}%"),
-        ("NPS", f"{nps:.2f}%")
+        ('Base: 实际样本', format_base(stats['base'])),
+        *[(str(i), f"{stats[i]:.2f}%") for i in NPS_SCORES],
+        ("推荐者", f"{stats['pct_recommend']:.2f}%"),
+        ("中立者", f"{stats['pct_passive']:.2f}%"),
+        ("贬损者", f"{stats['pct_detractor']:.2f}%"),
+        ("NPS", f"{stats['nps']:.2f}%")
     ]
-
-    df_result = pd.DataFrame(rows, columns=[ '整体调研用户', '占比/百分比'])
-    return df_result
+    return pd.DataFrame(rows, columns=['整体调研用户', '占比/百分比'])
 
 
-def calc_nss_from_series(ser):
+def calc_nss_from_series(ser, weights=None):
     """
     输入
-        ser: Series (必须为1-5分数，非数字或缺失会被自动忽略)
+        ser: Series或单列DataFrame (必须为1-5分数，非数字或缺失会被自动忽略)
+        weights: 可选，样本权重（与ser索引对齐的Series或等长数组）
     返回
         (nss, score_pct, t2b, mean_v)
         nss: 净满意度分数(float)
@@ -72,6 +231,11 @@ def calc_nss_from_series(ser):
         t2b: T2B百分比(4/5分%)
         mean_v: 满意度平均分
     """
+    if weights is not None:
+        stats = calc_nss_matrix(to_numeric_series(ser).to_frame(), weights=weights).iloc[0]
+        if stats['base'] == 0:
+            return 0, pd.Series([0]*5, index=[1,2,3,4,5]), 0, 0
+        return stats['nss'], stats[NSS_SCORES].astype(float), stats['t2b'], stats['mean']
     # 转换为数字型Series并删除缺失值
     ser = to_numeric_series(ser).dropna()
     total = len(ser)
@@ -92,11 +256,144 @@ def calc_nss_from_series(ser):
 
     return nss, score_pct, t2b, mean_v
 
-def calc_nss_table(df_satisfaction, short_names=None):
+
+# 满意度分值1~5，及NSS表的列名
+NSS_SCORES = [1, 2, 3, 4, 5]
+NSS_COLUMNS = [
+    '题名', '样本量', '满意度1分','满意度2分','满意度3分','满意度4分','满意度5分',
+    'T2B (4/5分%)', '满意度平均分', '净满意度(%)'
+]
+
+
+def nss_counts_from_matrix(values, w=None):
+    """
+    输入
+        values: shape (样本数, 列数) 的float矩阵（to_numeric_matrix的结果）
+        w:      可选，长度为样本数的权重数组
+    返回
+        (counts, totals, eff_base)
+        counts: shape (列数, 5) 的1~5分频数，(列, 分数)编码后一次bincount
+        totals: 各列数字作答数（含1~5以外的数字）
+        eff_base: 各列有效样本量（不加权时等于totals）
+    """
+    answered = ~np.isnan(values)
+    n_cols = values.shape[1]
+    in_scale = answered & np.isin(values, NSS_SCORES)
+    col_idx = np.broadcast_to(np.arange(n_cols), values.shape)[in_scale]
+    codes = col_idx * len(NSS_SCORES) + values[in_scale].astype(np.int64) - NSS_SCORES[0]
+    if w is None:
+        counts = np.bincount(codes, minlength=n_cols * len(NSS_SCORES)).reshape(n_cols, len(NSS_SCORES))
+        totals = answered.sum(axis=0)
+        return counts, totals, totals
+    cell_w = np.broadcast_to(w[:, None], values.shape)[in_scale]
+    counts = np.bincount(codes, weights=cell_w, minlength=n_cols * len(NSS_SCORES)).reshape(n_cols, len(NSS_SCORES))
+    cell_weights = w[:, None] * answered
+    return counts, cell_weights.sum(axis=0), effective_base(cell_weights, axis=0)
+
+
+def calc_nss_matrix(df_satisfaction, weights=None):
+    """
+    NSS矩阵引擎：整个满意度矩阵题只转换一次为数值矩阵，所有列的分布/T2B/平均分/NSS由向量化运算得到
+    输入
+        df_satisfaction: DataFrame，每列为满意度分值（通常1~5，非数字或缺失自动忽略）
+        weights: 可选，样本权重；指定时分布、T2B、平均分均为加权值
+    返回
+        DataFrame，每列一行（index为列名）：base + 1..5(百分比) + t2b + mean + nss
+        分母为全部数字作答（含1~5以外的数字），与calc_nss_from_series一致；base为0的列全为0
+        加权时base为加权Base，并在base后加eff_base（有效样本量）
+    """
+    values = to_numeric_matrix(df_satisfaction)
+    answered = ~np.isnan(values)
+    w = weight_series(weights, df_satisfaction.index)
+    w = None if w is None else w.to_numpy()
+    counts, totals, eff_base = nss_counts_from_matrix(values, w)
+    filled = np.where(answered, values, 0.0)
+    sums = filled.sum(axis=0) if w is None else w @ filled
+    return nss_from_counts(counts, totals, sums, df_satisfaction.columns, eff_base if w is not None else None)
+
+
+def nss_from_counts(counts, totals, sums, index, eff_base=None):
+    """
+    由充分统计量计算NSS指标（频数可跨批次直接相加，见incremental模块）
+    输入
+        counts: shape (行数, 5) 的1~5分频数；totals: 各行分母；sums: 各行分数之和
+        index:  结果的index；eff_base: 可选，有效样本量（加权时给出）
+    返回
+        与calc_nss_matrix相同的DataFrame
+    """
+    counts, totals, sums = (np.asarray(x) for x in (counts, totals, sums))
+    has_base = totals > 0
+    denom = np.where(has_base, totals, 1)
+    score_pct = np.where(has_base[:, None], counts / denom[:, None] * 100, 0.0)
+
+    stats = pd.DataFrame(score_pct, index=index, columns=NSS_SCORES)
+    if eff_base is not None:
+        stats.insert(0, 'eff_base', eff_base)
+    stats.insert(0, 'base', totals)
+    stats['t2b'] = score_pct[:, 3] + score_pct[:, 4]
+    stats['mean'] = np.where(has_base, sums / denom, 0.0)
+    stats['nss'] = stats['t2b'] - score_pct[:, :3].sum(axis=1)
+    return stats
+
+
+def nss_counts_by_group(scores, by, weights=None):
+    """
+    一次遍历统计各分组的1~5分频数
+    输入
+        scores: 满意度分数Series（非数字或缺失自动忽略）
+        by:     分组Series或Series列表，索引与scores对齐
+        weights: 可选，样本权重
+    返回
+        (group_keys, counts, totals, eff_base)
+        counts: shape (组数, 5) 的1~5分频数
+        totals: 各组数字作答数（含1~5以外的数字，与calc_nss_from_series的分母一致）
+        eff_base: 各组有效样本量（不加权时等于totals）
+    """
+    codes, group_keys = group_codes(by, index=scores.index)
+    n_groups = len(group_keys)
+    values = to_numeric_series(scores).astype('float64').to_numpy()
+    valid = (codes >= 0) & ~np.isnan(values)
+    in_scale = valid & np.isin(values, NSS_SCORES)
+    score_idx = values[in_scale].astype(np.int64) - NSS_SCORES[0]
+    w = weight_series(weights, scores.index)
+    if w is None:
+        counts = np.bincount(codes[in_scale] * len(NSS_SCORES) + score_idx,
+                             minlength=n_groups * len(NSS_SCORES)).reshape(n_groups, len(NSS_SCORES))
+        totals = np.bincount(codes[valid], minlength=n_groups)
+        return group_keys, counts, totals, totals
+    w = w.to_numpy()
+    counts = np.bincount(codes[in_scale] * len(NSS_SCORES) + score_idx, weights=w[in_scale],
+                         minlength=n_groups * len(NSS_SCORES)).reshape(n_groups, len(NSS_SCORES))
+    totals = np.bincount(codes[valid], weights=w[valid], minlength=n_groups)
+    return group_keys, counts, totals, grouped_effective_base(codes[valid], w[valid], n_groups)
+
+
+def format_nss_table(stats, short_names=None):
+    """
+    展示层：把calc_nss_matrix的数值结果格式化为NSS表（百分比为"xx.xx%"字符串）
+    输入
+        stats: calc_nss_matrix返回的DataFrame
+        short_names: dict 可选，{列名: 短名}
+    """
+    short_names = short_names or {}
+    pct = lambda values: [f"{v:.2f}%" for v in values]
+    nss_df = pd.DataFrame({
+        NSS_COLUMNS[0]: [short_names.get(col, col) for col in stats.index],
+        NSS_COLUMNS[1]: format_counts(stats['base']),
+        **{name: pct(stats[score]) for name, score in zip(NSS_COLUMNS[2:7], NSS_SCORES)},
+        NSS_COLUMNS[7]: pct(stats['t2b']),
+        NSS_COLUMNS[8]: [f"{v:.2f}" for v in stats['mean']],
+        NSS_COLUMNS[9]: pct(stats['nss']),
+    })
+    return nss_df
+
+
+def calc_nss_table(df_satisfaction, short_names=None, weights=None):
     """
     输入
         df_satisfaction: DataFrame/Series，每列或唯一列为满意度分值（通常1~5）
         short_names: 可选，字典或列表，列名映射到题目短名（如果没有提供则使用列名）
+        weights: 可选，样本权重
     返回
         NSS表DataFrame
         
@@ -118,87 +415,183 @@ def calc_nss_table(df_satisfaction, short_names=None):
     elif isinstance(short_names, list):
         short_names = {col: short_names[i] for i, col in enumerate(cols)}
 
-    result = []
-    for col in cols:
-        # 使用calc_nss_from_series函数计算NSS相关值
-        ser = to_numeric_series(df[col])
-        nss, score_pct, t2b, mean_v = calc_nss_from_series(ser)
-        total = ser.dropna().count()
-        pct = [score_pct.loc[i] for i in [1,2,3,4,5]]
-        row = [short_names.get(col, col), total] + [f"{i:.2f}%" for i in pct] + [f"{t2b:.2f}%", f"{mean_v:.2f}", f"{nss:.2f}%"]
-        result.append(row)
-    
-    nss_df = pd.DataFrame(result, columns=[
-        '题名', '样本量', '满意度1分','满意度2分','满意度3分','满意度4分','满意度5分',
-        'T2B (4/5分%)', '满意度平均分', '净满意度(%)'
-    ])
-    return nss_df
+    stats = calc_nss_matrix(df[cols], weights=weights)
+    return format_nss_table(stats, short_names)
+
+
+def rank_weight_vector(max_rank, rank_weights=None):
+    """
+    排名权重：默认第1名max_rank分、第2名max_rank-1分……第max_rank名1分
+    输入
+        rank_weights: 可选，长度为max_rank的权重序列（依次为第1名、第2名……的权重）
+    返回
+        长度为max_rank的float ndarray
+    """
+    if rank_weights is None:
+        return np.arange(max_rank, 0, -1, dtype=np.float64)
+    weights = np.asarray(rank_weights, dtype=np.float64)
+    if weights.shape != (max_rank,):
+        raise ValueError(f"rank_weights长度应为{max_rank}，实际为{weights.size}。")
+    return weights
+
+def rank_counts_matrix(ranks, max_rank, w=None):
+    """
+    输入
+        ranks: shape (样本数, 选项数) 的float矩阵，值为排名，未选为NaN
+        max_rank: 统计的最大排名
+        w: 可选，长度为样本数的权重数组
+    返回
+        shape (选项数, max_rank) 的计数矩阵，[j, k]为选项j被排在第k+1名的人数（加权时为权重和）
+    说明
+        (选项, 排名)编码为 选项*max_rank+排名-1 后一次bincount，耗时与排名数无关
+    """
+    n_options = ranks.shape[1]
+    # 只统计1~max_rank的整数排名（与逐个 ser == i 比较一致）
+    valid = (ranks >= 1) & (ranks <= max_rank) & (ranks == np.floor(ranks))
+    option_idx = np.broadcast_to(np.arange(n_options), ranks.shape)[valid]
+    codes = option_idx * max_rank + ranks[valid].astype(np.int64) - 1
+    cell_w = None if w is None else np.broadcast_to(w[:, None], ranks.shape)[valid]
+    counts = np.bincount(codes, weights=cell_w, minlength=n_options * max_rank)
+    return counts.reshape(n_options, max_rank)
+
+def calc_rank_stats(df_rank, max_rank, option_cols=None, rank_weights=None, weights=None):
+    """
+    排序题的数值结果
+    输入
+        df_rank: DataFrame，columns为排序选项，每列为排名，未选为nan
+        max_rank: int 需要统计的最大排名数；为None时取数据中出现的最大排名
+        option_cols: 可选，参与统计的选项列
+        rank_weights: 可选，第1名~第max_rank名的权重，默认max_rank~1
+        weights: 可选，样本权重；指定时计数为加权计数，分母为权重和
+    返回
+        DataFrame，每个选项一行（index为列名）：n_selected + 1..max_rank(计数) + pct_selected + index
+    说明
+        整个排序题块只转换一次为数值矩阵，各排名计数由一次bincount得到
+    """
+    df_rank = df_rank[option_cols] if option_cols else df_rank
+    ranks = to_numeric_matrix(df_rank)
+    if max_rank is None:
+        max_rank = int(np.nanmax(ranks)) if np.isfinite(ranks).any() else 1
+    if max_rank < 1:
+        raise ValueError(f"max_rank应为正整数，实际为{max_rank}。")
+    rank_scores = rank_weight_vector(max_rank, rank_weights)
+
+    w = weight_series(weights, df_rank.index)
+    if w is None:
+        n = len(df_rank)
+        rank_counts = rank_counts_matrix(ranks, max_rank)
+        n_selected = (~np.isnan(ranks)).sum(axis=0)
+    else:
+        w = w.to_numpy()
+        n = w.sum()
+        rank_counts = rank_counts_matrix(ranks, max_rank, w)
+        n_selected = w @ ~np.isnan(ranks)
+    return rank_from_counts(rank_counts, n_selected, n, df_rank.columns, rank_scores)
 
 
-def rank_table(df_rank,max_rank, option_cols, short_names=None):
+def rank_from_counts(rank_counts, n_selected, n, index, rank_scores):
+    """
+    由充分统计量计算排序题指标（计数可跨批次直接相加，见incremental模块）
+    输入
+        rank_counts: shape (选项数, max_rank) 的各排名计数；n_selected: 各选项被排序数；n: 样本数（或权重和）
+        index: 选项列名；rank_scores: rank_weight_vector的结果
+    返回
+        与calc_rank_stats相同的DataFrame
+    """
+    stats = pd.DataFrame(rank_counts, index=index, columns=list(range(1, len(rank_scores) + 1)))
+    stats.insert(0, 'n_selected', n_selected)
+    stats['pct_selected'] = n_selected / n * 100 if n > 0 else 0.0
+    # 按权重加权后的重要性
+    stats['index'] = rank_counts @ rank_scores / n * 100 if n > 0 else 0.0
+    return stats
+
+
+def format_rank_table(stats, short_names=None):
+    """
+    展示层：把calc_rank_stats的数值结果格式化为排序题表
+    """
+    short_names = short_names or {}
+    ranks = [c for c in stats.columns if isinstance(c, (int, np.integer))]
+    max_rank = len(ranks)
+    result = pd.DataFrame({f"重要性排序第{i}/计数": format_counts(stats[i]) for i in ranks}, index=stats.index)
+    result.insert(0, f"计数样本(排序前{max_rank})", format_counts(stats['n_selected']))
+    result.insert(0, "Dimension/维度（主任务/子任务）", [short_names.get(col, col) for col in stats.index])
+    result["被选定影响决策的比例%"] = [f"{v:.2f}%" for v in stats['pct_selected']]
+    result["赋值后重要性index"] = [f"{v:.2f}%" for v in stats['index']]
+    return result.reset_index(drop=True)
+
+
+def rank_table(df_rank, max_rank, option_cols, short_names=None, rank_weights=None, weights=None):
     """
     输入
         df_rank: DataFrame，columns为排序选项，每列为排名，未选为nan
-        max_rank: int 需要统计的最大排名数，通常为5
+        max_rank: int 需要统计的最大排名数，通常为5；为None时取数据中出现的最大排名
         short_names: dict 可选，{原列名:短名}
+        rank_weights: 可选，第1名~第max_rank名的权重，默认max_rank~1
+        weights: 可选，样本权重
     返回按照指定表格格式统计的DataFrame
-    
     """
-    df_rank = df_rank[option_cols] if option_cols else df_rank
-    cols = df_rank.columns
-    # 最大排名
-    
-    max_rank = 5
-
-    result = []
-    for col in cols:
-        ser = to_numeric_series(df_rank[col])
-        # 每一名的计数, index从1累到max_rank
-        rank_counts = [(ser == i).sum() for i in range(1, max_rank + 1)]
-        n_selected = ser.notna().sum()
-        pct_selected = n_selected / len(df_rank) * 100 if len(df_rank) > 0 else 0
-        # 按权重5~1依次分配赋值后重要性
-        index_value = sum(c * (max_rank - i) for i, c in enumerate(rank_counts)) / len(df_rank) * 100 if len(df_rank) > 0 else 0
-        row = [
-            short_names[col] if short_names and col in short_names else col,
-            n_selected
-        ] + rank_counts + [
-            f"{pct_selected:.2f}%", f"{index_value:.2f}%"
-        ]
-        result.append(row)
-
-    columns = [
-        "Dimension/维度（主任务/子任务）", "计数样本(排序前5)"
-    ] + [f"重要性排序第{i}/计数" for i in range(1, max_rank+1)] \
-      + ["被选定影响决策的比例%", "赋值后重要性index"]
-
-    return pd.DataFrame(result, columns=columns)
-
-def calc_nss_detail(df, option_cols, option_names=None):
+    stats = calc_rank_stats(df_rank, max_rank, option_cols, rank_weights=rank_weights, weights=weights)
+    return format_rank_table(stats, short_names)
+
+
+def calc_choice_detail(df, option_cols, weights=None):
     """
+    多选题各选项选中情况的数值结果
     输入
         df: survey.df/切片
         option_cols: 可选项列名（不含填空）
-        option_names: {col: name}
+        weights: 可选，样本权重
     返回
-        DataFrame, 行为选项，列为Base/n/百分比
+        DataFrame，每个选项一行（index为列名）：base(至少勾选一项的人数) + n(被选人数) + pct(百分比)
+        加权时base、n为权重和，并加eff_base（有效样本量）
+    """
+    selected = df[option_cols].notna().to_numpy()
+    answered = selected.any(axis=1)
+    w = weight_series(weights, df.index)
+    if w is None:
+        # base为: 至少勾选了该题一道选项的受访者数
+        base = int(answered.sum())
+        n = selected.sum(axis=0)
+        stats = pd.DataFrame({'base': base, 'n': n}, index=pd.Index(option_cols))
+    else:
+        w = w.to_numpy()
+        base = w[answered].sum()
+        n = w @ selected
+        stats = pd.DataFrame({'base': base, 'eff_base': float(effective_base(w[answered])), 'n': n},
+                             index=pd.Index(option_cols))
+    stats['pct'] = n / base * 100 if base else 0.0
+    return stats
+
+
+def format_choice_detail(stats, option_names=None):
+    """
+    展示层：把calc_choice_detail的数值结果格式化为选项表（首行为Base）
     """
-    sub_df = df[option_cols]
-    # base为: 至少勾选了该题一道选项的受访者数
-    is_answered = sub_df.notna().any(axis=1)
-    base = is_answered.sum()
-    result = []
-    for col in option_cols:
-        n = df[col].notna().sum()  # 被选人数
-        pct = n/base*100 if base else 0
-        name = option_names[col] if option_names and col in option_names else col
-        result.append([name, n, f"{pct:.2f}%"])
-    # 按选中率排序
-    df_out = pd.DataFrame(result, columns=['选项','计数','百分比'])
+    option_names = option_names or {}
+    base = format_base(stats['base'].iloc[0]) if len(stats) else 0
+    df_out = pd.DataFrame({
+        '选项': [option_names.get(col, col) for col in stats.index],
+        '计数': format_counts(stats['n']),
+        '百分比': [f"{v:.2f}%" for v in stats['pct']],
+    })
     # 最前加一行 Base
     df_out = pd.concat([pd.DataFrame([['Base', base, '']], columns=df_out.columns), df_out], ignore_index=True)
     return df_out
 
+
+def calc_nss_detail(df, option_cols, option_names=None, weights=None):
+    """
+    输入
+        df: survey.df/切片
+        option_cols: 可选项列名（不含填空）
+        option_names: {col: name}
+        weights: 可选，样本权重
+    返回
+        DataFrame, 行为选项，列为Base/n/百分比
+    """
+    return format_choice_detail(calc_choice_detail(df, option_cols, weights=weights), option_names)
+
 def collect_openended_texts(df, txt_cols):
     """
     收集所有填空列的非空内容合并为一个list
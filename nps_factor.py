@@ -1,80 +1,28 @@
 from metrics_cal import *
-from Survey_Data import SurveyData
-from ultis import *
-
-#读入
-#音箱
-#survey = SurveyData('D:/1NPS_projector/survey_data/SurveyResults_2025-05-09-03-24-30.xlsx')
-#投影仪-英国
-survey = SurveyData('D:/1NPS_projector/survey_data/UK/UK_2425_2426.xlsx')
-#投影仪-美国
-#survey = SurveyData('D:/1NPS_projector/survey_data/US/2425_2426-US.xlsx')
-survey.df = drop_invalid_samples(survey.df)  # 只保留有效样本
-
-nss_qid1 = 'M10'  # nss题号
-nss_qid2 = 'M11'  # nss题号
-
-nps_qid = 'S2'  # nps题号
-nps_series = survey.get_answers_by_qid(nps_qid, return_qtype=False)
-nps_series = to_numeric_series(nps_series).dropna()
-# 推荐者切片（得分9或10）
-recommender_idx = nps_series[(nps_series >= 9) & (nps_series <= 10)].index
-recommender_df = survey.df.loc[recommender_idx]
-
-
-# 贬损者切片（得分0~6）
-detractor_idx = nps_series[(nps_series >= 0) & (nps_series <= 8)].index
-detractor_df = survey.df.loc[detractor_idx]
-
-
-option_cols, _, option_names, _ = preprocess_multi_choice(survey.qinfo, nss_qid1)
-option_cols2, _, option_names2, _ = preprocess_multi_choice(survey.qinfo, nss_qid2)
-# 合并两个nss题的选项列
-option_cols.extend(option_cols2)
-option_names.update(option_names2)
-
-results = []
-for col in option_cols:
-    # 推荐者
-    recommender_ser = to_numeric_series(recommender_df[col]).dropna()
-    recommender_mean = recommender_ser.mean() if len(recommender_ser) > 0 else 0
-    recommender_count = len(recommender_ser)
-    # 贬损者
-    detractor_ser = to_numeric_series(detractor_df[col]).dropna()
-    detractor_mean = detractor_ser.mean() if len(detractor_ser) > 0 else 0
-    detractor_count = len(detractor_ser)
-    
-    # 保存结果
-    results.append({
-        '因子': option_names[col],
-        '推荐者均分': recommender_mean,
-        '推荐者样本量': recommender_count,
-        '贬损者均分': detractor_mean,
-        '贬损者样本量': detractor_count,
-        '总样本量': recommender_count + detractor_count
-    })
-# 列表转DataFrame
-df = pd.DataFrame(results)
-
-# 可选：调整列顺序
-df = df[['因子', '推荐者均分', '贬损者均分','总样本量', '推荐者样本量', '贬损者样本量']]
-
-print(df)
-
-# 如果需要导出Excel
-#df.to_excel('因子均分表.xlsx', index=False)
+from metric_results import MetricResult
+
+# NPS分群：推荐者(9-10)、中立者(7-8)、贬损者(0-6)，顺序即分群代码0/1/2
+NPS_SEGMENTS = ['promoter', 'passive', 'detractor']
+NPS_SEGMENT_NAMES = {'promoter': '推荐者', 'passive': '中立者', 'detractor': '贬损者'}
+# 四象限：x轴为贬损者均分（激怒用户的可能性），y轴为推荐者均分（愉悦用户的可能性）
+FACTOR_QUADRANTS = {
+    '愉悦因子': 'gold',         # 左上：x < 分割线, y >= 分割线
+    '必备因子': 'red',          # 右上
+    '激怒因子': 'dodgerblue',   # 右下
+    '无差异因子': 'gray',       # 左下
+}
 
 #标签映射-投影仪
-label_map = {
+PROJECTOR_LABELS = {
     'Product packaging': '产品包装',
     'Unboxing': '开箱体验',
     'Product appearance': '投影仪的外观',
     'Product instructions': '产品使用指引',
     'Installation and screen angle adjustment': '安装与画面角度调节',
-    'Powering on the projector':'投影仪开机',
-    'Connection with other devices via Bluetooth':'通过蓝牙连接',
-    'Non-Bluetooth connection with other devices (cables, USB dri':'通过非蓝牙的方式连接',
-    'Remote control':'遥控器交互控制',
+    'Powering on the projector': '投影仪开机',
+    'Connection with other devices via Bluetooth': '通过蓝牙连接',
+    'Non-Bluetooth connection with other devices (cables, USB dri': '通过非蓝牙的方式连接',
+    'Remote control': '遥控器交互控制',
     'App controls and interactivity': 'App交互控制',
     'Screen brightness': '画面亮度',
     'Image quality': '画质',
@@ -86,175 +34,241 @@ label_map = {
     'Durability and ease of maintenance': '耐用性和保养/清洁',
     'Updating the projector': '投影仪的更新/升级',
     'Power efficiency and battery performance': '供电与续航',
-
 }
 
 #标签映射-音箱
-# label_map = {
-#     'Product packaging': '产品包装',
-#     'Unboxing': '开箱体验',
-#     'Appearance of the speaker': '音箱的外观',
-#     'Product instructions': '产品使用指引',
-#     'Powering on the speaker': '音箱开机',
-#     'Connection with other devices via Bluetooth': '通过蓝牙连接',
-#     'Connection with other soundcore speakers via PartyCast': '通过PatryCast连接',
-#     'Connection with other devices via cables': '通过数据传输线连接',
-#     'Button controls': '按键交互控制',
-#     'App controls and interactivity': 'App交互控制',
-#     'Sound quality and performance indoors (e.g. home, gym, etc.)': '室内场景音质与音效',
-#     'Sound quality and performance outdoors (e.g. backyard, park,': '户外场景音质与音效',
-#     'Sound quality and performance in vehicles (e.g. car, truck,': '交通场景音质与音效',
-#     'Sound quality and performance on water (e.g. boat, yacht, cr': '水上场景音质与音效',
-#     'BassUp technology': 'BassUp功能',
-#     'Light effects on both sides of the speaker': '音箱两侧的灯效',
-#     'Power supply and battery life': '供电与续航',
-#     'Carrying by the handle': '通过把手携带音箱',
-#     'Carrying by the shoulder strap': '通过肩带携带音箱',
-#     'Durability and ease of maintenance': '耐用性和保养/清洁',
-#     'Updating the speaker': '音箱的更新/升级'
-
-# }
-
-df['因子'] = df['因子'].map(label_map)
-# df = df[df['因子'] != '通过PatryCast连接'].reset_index(drop=True)
-# df = df[df['因子'] != '音箱两侧的灯效'].reset_index(drop=True)
-df = df[df['因子'] != '使用投影仪进行K歌'].reset_index(drop=True)
-print(df)
-
-#---------------------------------画图----------------------------------
-import matplotlib.pyplot as plt
-import textwrap
-from adjustText import adjust_text
-
-
-plt.rcParams['font.sans-serif'] = ['SimHei']     # 用黑体显示中文（Windows适用）
-plt.rcParams['axes.unicode_minus'] = False       # 解决负号'-'显示为方块的问题
-
-# 读取你刚刚组装好的DataFrame df
-
-# X轴是“贬损者均分” （激怒用户可能性）
-x = df['贬损者均分']
-# Y轴是“推荐者均分” （愉悦用户可能性）
-y = df['推荐者均分']
-# 气泡大小可随意，比如都设为300；或者用两个均分的标准差、样本数等（如需自定义请补充）
-sizes = df['总样本量'] * 50  # 缩放系数可自行调整
-
-
-#气泡颜色
-x_split = x.median()  # 或x.mean()
-y_split = y.median()  # 或y.mean()
-# 顺序依次为四个象限，从图上来看，左上（黄色），右上（红），右下（蓝），左下（灰）
-def get_quadrant_color(xi, yi, x_split, y_split):
-    if xi < x_split and yi >= y_split:
-        return 'gold'
-    elif xi >= x_split and yi >= y_split:
-        return 'red'
-    elif xi >= x_split and yi < y_split:
-        return 'dodgerblue'
-    else:
-        return 'gray'
-colors = [get_quadrant_color(xi, yi, x_split, y_split) for xi, yi in zip(x, y)]
-
-# 画布
-fig, ax = plt.subplots(figsize=(10,10))
-
-#错开重合气泡（美国）
-# x.iloc[4] += 0.02
-# y.iloc[12] -= 0.03
-# x.iloc[0] += 0.04
-# y.iloc[1] += 0.01
-# x.iloc[15] -= 0.04
-# y.iloc[15] -= 0.03
-
-#错开重合气泡（音箱）
-# y.iloc[14] += 0.02
-# y.iloc[8] -= 0.02
-# x.iloc[16] += 0.02
-# y.loc[6] += 0.25
-# x.iloc[6] += 0.2
-# x.iloc[15] += 0.2
-# y.iloc[15] += 0.2
-
-
-
-sc = ax.scatter(x, y, s=sizes, alpha=0.4, c=colors, edgecolors='w')
-
-
-
-# 象限分割线（可取均值，或指定某个阈值）
-
-ax.axhline(y=y_split, color='gray', linestyle='--')
-ax.axvline(x=x_split, color='gray', linestyle='--')
-
-# 标签和标题
-ax.set_xlabel('激怒用户的可能性')
-ax.set_ylabel('愉悦用户的可能性')
-ax.set_title('影响因子分析四象限')
-
-# 可选：微调坐标范围
-ax.set_xlim(x.min() - 0.05, x.max() + 0.1)
-ax.set_ylim(y.min() - 0.05, y.max() + 0.05)
-# 等画完scatter和分割线后
-xlim = ax.get_xlim()
-ylim = ax.get_ylim()
-ax.set_xticks([])   # x轴去掉刻度
-ax.set_yticks([])   # y轴去掉刻度
-
-offset_x = 0.03 * (xlim[1] - xlim[0])  # 距离边缘百分比，可调
-offset_y = 0.03 * (ylim[1] - ylim[0])
-# 获取边界
-xlim = ax.get_xlim()
-ylim = ax.get_ylim()
-offx = 0.03 * (xlim[1] - xlim[0])
-offy = 0.03 * (ylim[1] - ylim[0])
-
-# 愉悦因子（左上角）
-ax.text(xlim[0] + offx, ylim[1] - offy, '愉悦因子', 
-        color='gold', fontsize=18, fontweight='bold', ha='left', va='top')
-
-# 必备因子（右上角）
-ax.text(xlim[1] - offx, ylim[1] - offy, '必备因子', 
-        color='red', fontsize=18, fontweight='bold', ha='right', va='top')
-
-# 激怒因子（右下角）
-ax.text(xlim[1] - offx, ylim[0] + offy, '激怒因子', 
-        color='dodgerblue', fontsize=18, fontweight='bold', ha='right', va='bottom')
-
-
-# 坐标轴端点“强/弱”文字
-# Y轴 “强/弱”
-ax.text(xlim[0] - 0.03*(xlim[1] - xlim[0]), ylim[1], '强', fontsize=14, color='grey', va='bottom', ha='left', rotation=0)
-ax.text(xlim[0] - 0.03*(xlim[1] - xlim[0]), ylim[0], '弱', fontsize=14, color='grey', va='top', ha='left', rotation=0)
-
-# X轴 “强/弱”
-ax.text(xlim[1], ylim[0] - 0.04*(ylim[1] - ylim[0]), '强', fontsize=14, color='grey', va='top', ha='center', rotation=0)
-ax.text(xlim[0], ylim[0] - 0.04*(ylim[1] - ylim[0]), '弱', fontsize=14, color='grey', va='top', ha='center', rotation=0)
-
-# 调整文本位置以避免重叠
-# 因子名
-labels = df['因子']
-def wrap_label(label, width=5):
-    return '\n'.join(textwrap.wrap(label, width))
+SPEAKER_LABELS = {
+    'Product packaging': '产品包装',
+    'Unboxing': '开箱体验',
+    'Appearance of the speaker': '音箱的外观',
+    'Product instructions': '产品使用指引',
+    'Powering on the speaker': '音箱开机',
+    'Connection with other devices via Bluetooth': '通过蓝牙连接',
+    'Connection with other soundcore speakers via PartyCast': '通过PatryCast连接',
+    'Connection with other devices via cables': '通过数据传输线连接',
+    'Button controls': '按键交互控制',
+    'App controls and interactivity': 'App交互控制',
+    'Sound quality and performance indoors (e.g. home, gym, etc.)': '室内场景音质与音效',
+    'Sound quality and performance outdoors (e.g. backyard, park,': '户外场景音质与音效',
+    'Sound quality and performance in vehicles (e.g. car, truck,': '交通场景音质与音效',
+    'Sound quality and performance on water (e.g. boat, yacht, cr': '水上场景音质与音效',
+    'BassUp technology': 'BassUp功能',
+    'Light effects on both sides of the speaker': '音箱两侧的灯效',
+    'Power supply and battery life': '供电与续航',
+    'Carrying by the handle': '通过把手携带音箱',
+    'Carrying by the shoulder strap': '通过肩带携带音箱',
+    'Durability and ease of maintenance': '耐用性和保养/清洁',
+    'Updating the speaker': '音箱的更新/升级',
+}
 
-labels_wrapped = labels.apply(wrap_label)
-texts = []
 
-#字体大小自适应
-def get_fontsize(labels_wrapped):
-    length = len(labels_wrapped.replace('\n',''))
-    if length <= 4:
-        return 10
-    elif length <= 7:
-        return 9
-    elif length <= 10:
-        return 8
+def nps_segment_codes(scores):
+    """
+    把NPS分数Series编码为分群代码：0推荐者(9-10)、1中立者(7-8)、2贬损者(0-6)，无效/缺失为-1
+    """
+    codes = nps_score_codes(scores)
+    segments = np.full(len(codes), -1, dtype=np.int64)
+    segments[np.isin(codes, NPS_PROMOTER_SCORES)] = 0
+    segments[np.isin(codes, NPS_PASSIVE_SCORES)] = 1
+    segments[np.isin(codes, NPS_DETRACTOR_SCORES)] = 2
+    return segments
+
+
+def segment_means(values, codes, n_cells, w=None):
+    """
+    按单元格代码一次计算所有因子列的均值（one-hot矩阵乘法）
+    输入
+        values:  shape (样本数, 因子数) 的float矩阵，未作答为NaN
+        codes:   各样本的单元格代码（0..n_cells-1），-1不参与
+        n_cells: 单元格数
+        w:       可选，样本权重数组
+    返回
+        (means, counts)：shape均为 (n_cells, 因子数)；counts为各格作答人数（加权时为权重和），无作答的格均值为NaN
+    """
+    valid = codes >= 0
+    onehot = np.zeros((len(codes), n_cells))
+    onehot[np.flatnonzero(valid), codes[valid]] = 1.0 if w is None else w[valid]
+    answered = ~np.isnan(values)
+    sums = onehot.T @ np.where(answered, values, 0.0)
+    counts = onehot.T @ answered
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(counts > 0, sums / np.where(counts > 0, counts, 1), np.nan)
+    return means, counts
+
+
+def assign_quadrants(values, split='median'):
+    """
+    按推荐者均分(y)与贬损者均分(x)给因子分配象限，分割线在每组内按全部因子的中位数/均值计算
+    输入
+        values: calc_factor_means的输出
+        split:  'median'（默认）或 'mean'
+    返回
+        (quadrant Series, 分割线DataFrame：每组一行 x_split + y_split)
+    说明
+        均分缺失的因子不参与分割线计算，象限为空
+    """
+    if split not in ('median', 'mean'):
+        raise ValueError(f"split应为'median'或'mean'，实际为{split}。")
+    x, y = values['detractor_mean'], values['promoter_mean']
+    splits = values.groupby('group', sort=False)[['detractor_mean', 'promoter_mean']].agg(split)
+    splits.columns = ['x_split', 'y_split']
+    x_split = values['group'].map(splits['x_split'])
+    y_split = values['group'].map(splits['y_split'])
+    names = list(FACTOR_QUADRANTS)
+    quadrant = np.select([(x < x_split) & (y >= y_split), (x >= x_split) & (y >= y_split),
+                          (x >= x_split) & (y < y_split), (x < x_split) & (y < y_split)], names, default='')
+    return pd.Series(quadrant, index=values.index, name='quadrant'), splits
+
+
+def calc_factor_means(factors, scores, by=None, weights=None, names=None, split='median'):
+    """
+    一次计算所有因子列在推荐者/中立者/贬损者中的均分与样本量，并分配象限
+    输入
+        factors: 因子评分DataFrame（每列一个因子，如M10、M11满意度矩阵题的各列）
+        scores:  NPS分数Series，索引与factors对齐
+        by:      可选，分组Series（如市场、波次、产品线），各组分别计算与分配象限
+        weights: 可选，样本权重；指定时样本量为权重和、均分为加权均值
+        names:   可选，{列名: 因子名}，默认用列名
+        split:   象限分割线，'median'或'mean'
+    返回
+        DataFrame，每组每个因子一行：group + factor(列名) + name(因子名)
+        + promoter_mean + passive_mean + detractor_mean + promoter_n + passive_n + detractor_n + n + quadrant
+        无分组时group为'整体调研用户'；某分群无作答时该分群均分为NaN
+    """
+    segments = nps_segment_codes(scores.reindex(factors.index))
+    if by is None:
+        codes = np.zeros(len(factors), dtype=np.int64)
+        group_names = ['整体调研用户']
     else:
-        return 7
-
-for i, txt in enumerate(labels_wrapped):
-    texts.append(ax.annotate(txt, (x.iloc[i], y.iloc[i]), fontsize=get_fontsize(txt), ha='center', va='center'))
-
-
+        codes, group_keys = group_codes(by, index=factors.index)
+        group_names = list(group_keys.iloc[:, 0]) if group_keys.shape[1] == 1 else list(map(tuple, group_keys.values))
+    n_groups, n_seg = len(group_names), len(NPS_SEGMENTS)
+    cells = np.where((codes >= 0) & (segments >= 0), codes * n_seg + segments, -1)
+    w = weight_series(weights, factors.index)
+    means, counts = segment_means(to_numeric_matrix(factors), cells, n_groups * n_seg,
+                                  None if w is None else w.to_numpy())
+
+    n_factors = factors.shape[1]
+    # (组×分群, 因子) → (组×因子, 分群)
+    means = means.reshape(n_groups, n_seg, n_factors).transpose(0, 2, 1).reshape(-1, n_seg)
+    counts = counts.reshape(n_groups, n_seg, n_factors).transpose(0, 2, 1).reshape(-1, n_seg)
+    names = names or {}
+    values = pd.DataFrame({
+        'group': np.repeat(np.array(group_names, dtype=object), n_factors),
+        'factor': np.tile(np.array(factors.columns, dtype=object), n_groups),
+    })
+    values['name'] = [names.get(c, c) for c in values['factor']]
+    for j, seg in enumerate(NPS_SEGMENTS):
+        values[f'{seg}_mean'] = means[:, j]
+    for j, seg in enumerate(NPS_SEGMENTS):
+        values[f'{seg}_n'] = counts[:, j] if w is not None else counts[:, j].astype(np.int64)
+    values['n'] = values[[f'{seg}_n' for seg in NPS_SEGMENTS]].sum(axis=1)
+    values['quadrant'] = assign_quadrants(values, split)[0]
+    return values
+
+
+def format_factor_table(values):
+    """
+    因子均分表：因子 + 推荐者/中立者/贬损者均分 + 总样本量 + 各分群样本量 + 象限
+    多组时在最前加分组列
+    """
+    table = pd.DataFrame({'因子': values['name'].to_numpy()}, index=values.index)
+    for seg in NPS_SEGMENTS:
+        table[f'{NPS_SEGMENT_NAMES[seg]}均分'] = values[f'{seg}_mean'].round(2)
+    table['总样本量'] = format_counts(values['n'])
+    for seg in NPS_SEGMENTS:
+        table[f'{NPS_SEGMENT_NAMES[seg]}样本量'] = format_counts(values[f'{seg}_n'])
+    table['象限'] = values['quadrant'].to_numpy()
+    if values['group'].nunique() > 1:
+        table.insert(0, '分组', values['group'].to_numpy())
+    return table.reset_index(drop=True)
+
+
+class FactorResult(MetricResult):
+    """
+    NPS因子分析结果：values为calc_factor_means的输出（每组每个因子一行）
+    meta: nps_qid、factor_qids、group_by（分组题号）、split、splits（每组的象限分割线）
+    """
+
+    @classmethod
+    def from_frames(cls, factors, scores, by=None, weights=None, names=None, split='median', **meta):
+        values = calc_factor_means(factors, scores, by=by, weights=weights, names=names, split=split)
+        return cls(values, dict(meta, split=split, splits=assign_quadrants(values, split)[1]))
+
+    def groups(self):
+        """各组名，按首次出现顺序"""
+        return list(pd.unique(self.values['group']))
+
+    def group(self, name):
+        """单组（如某个市场/波次）的FactorResult，values的index从0开始"""
+        values = self.values[self.values['group'] == name].reset_index(drop=True)
+        return FactorResult(values, dict(self.meta, splits=self.meta['splits'].loc[[name]]))
+
+    def _render(self):
+        return format_factor_table(self.values)
+
+
+def factor_columns(survey, factor_qids, label_map=None, exclude=None):
+    """
+    取因子题（满意度矩阵题）的全部选项列与因子名
+    输入
+        survey:      SurveyData对象
+        factor_qids: 因子题号list，如['M10', 'M11']
+        label_map:   可选，{因子短名: 展示名}，未映射的沿用短名
+        exclude:     可选，要去掉的因子（短名或展示名）
+    返回
+        (列名list, {列名: 因子名})
+    """
+    factor_cols, names = [], {}
+    for qid in factor_qids:
+        option_cols, _, option_names, _ = preprocess_multi_choice(survey, qid)
+        factor_cols.extend(option_cols)
+        names.update(option_names)
+    if label_map:
+        names = {col: label_map.get(name, name) for col, name in names.items()}
+    if exclude:
+        exclude = set([exclude] if isinstance(exclude, str) else exclude)
+        factor_cols = [col for col in factor_cols
+                       if names.get(col, col) not in exclude and survey.short_names.get(col) not in exclude]
+    if not factor_cols:
+        raise ValueError(f"题号{factor_qids}中没有可分析的因子列。")
+    return factor_cols, names
+
+
+def group_series(survey, by):
+    """分组题号或列名 → 分组Series；by为None时返回None"""
+    if by is None:
+        return None
+    if by in survey.df.columns:
+        return survey.df[by]
+    return survey.get_answers_by_qid(by).iloc[:, 0]
+
+
+def factor_analysis(survey, nps_qid, factor_qids, by=None, label_map=None, exclude=None, split='median',
+                    as_result=False):
+    """
+    NPS因子分析：各因子在推荐者/中立者/贬损者中的均分与四象限
+    输入
+        survey:      SurveyData对象
+        nps_qid:     NPS题号，如'S2'
+        factor_qids: 因子题号或题号list（满意度矩阵题），如['M10', 'M11']
+        by:          可选，分组题号或列名（如load_waves生成的'wave'），一次算出各市场/波次/产品线
+        label_map:   可选，{因子短名: 展示名}（如PROJECTOR_LABELS），未映射的沿用短名
+        exclude:     可选，要去掉的因子（短名或展示名）
+        split:       象限分割线，'median'或'mean'
+        as_result:   为True时返回FactorResult数值结果，否则返回字符串表
+    返回
+        table: {nps_qid: FactorResult或因子均分表}
+    """
+    if isinstance(factor_qids, str):
+        factor_qids = [factor_qids]
+    factor_cols, names = factor_columns(survey, factor_qids, label_map, exclude)
+    scores = survey.get_answers_by_qid(nps_qid).iloc[:, 0]
+    groups = group_series(survey, by)
+    result = FactorResult.from_frames(survey.df[factor_cols], scores, by=groups, weights=survey.weights,
+                                      names=names, split=split, nps_qid=nps_qid, factor_qids=list(factor_qids), group_by=by)
+    table = {}
+    table[nps_qid] = result if as_result else result.render()
+    print(f'{nps_qid} 因子分析完成!')
+    return table
 
-plt.tight_layout()
-plt.show()
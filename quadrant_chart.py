@@ -0,0 +1,276 @@
+import io
+import os
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from nps_factor import FactorResult, FACTOR_QUADRANTS, assign_quadrants
+
+# 画布：固定英寸大小与坐标区位置（不用tight_layout），标签尺寸可由字号直接换算成坐标区比例
+FIGSIZE = (10, 10)
+DPI = 100
+AXES_RECT = (0.08, 0.08, 0.86, 0.86)
+# 依次尝试的中文字体（Windows/macOS/Linux），都没有时可用font_path指定字体文件
+CJK_FONTS = ['SimHei', 'Microsoft YaHei', 'PingFang SC', 'Noto Sans CJK SC', 'Source Han Sans SC',
+             'WenQuanYi Zen Hei', 'Arial Unicode MS']
+# 气泡面积范围（pt²），按样本量线性缩放
+BUBBLE_AREA = (300, 3000)
+# 标签避让：最大迭代轮数、标签间留白，以及标签离开气泡超过该距离（坐标区比例）时画引线
+LABEL_MAX_ITER = 300
+LABEL_GAP = 0.002
+LEADER_MIN_SHIFT = 0.02
+
+# 每个进程复用的画布（首次使用时创建并设置字体）
+_figure = None
+_fonts_ready = False
+
+
+def setup_fonts(font_path=None):
+    """
+    设置中文字体（每个进程只需一次）：可选注册字体文件，再把已安装的中文字体排在sans-serif最前
+    """
+    global _fonts_ready
+    if _fonts_ready and not font_path:
+        return
+    from matplotlib import font_manager, rcParams
+    families = []
+    if font_path:
+        font_manager.fontManager.addfont(font_path)
+        families.append(font_manager.FontProperties(fname=font_path).get_name())
+    installed = {f.name for f in font_manager.fontManager.ttflist}
+    families += [f for f in CJK_FONTS if f in installed]
+    rcParams['font.sans-serif'] = list(dict.fromkeys(families + list(rcParams['font.sans-serif'])))
+    rcParams['axes.unicode_minus'] = False
+    _fonts_ready = True
+
+
+def _get_figure():
+    """复用的Agg画布（不经过pyplot，不弹窗口，也不受全局backend影响），每次使用前清空"""
+    global _figure
+    if _figure is None:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        setup_fonts()
+        _figure = Figure(figsize=FIGSIZE, dpi=DPI)
+        FigureCanvasAgg(_figure)
+    _figure.clf()
+    return _figure
+
+
+def is_wide_char(ch):
+    """中日韩等全角字符"""
+    return ord(ch) >= 0x2E80
+
+
+def wrap_label(label, width=None):
+    """因子名换行：中文每行5个字，英文按单词每行约14个字符"""
+    label = str(label)
+    if width is None:
+        width = 5 if any(is_wide_char(ch) for ch in label) else 14
+    return '\n'.join(textwrap.wrap(label, width)) or label
+
+
+def label_fontsize(label):
+    """字体大小随标签长度自适应"""
+    length = len(label.replace('\n', ''))
+    if length <= 4:
+        return 10
+    elif length <= 7:
+        return 9
+    elif length <= 10:
+        return 8
+    return 7
+
+
+def text_extent(label, fontsize):
+    """
+    估算多行文本的宽高（pt）：全角字符宽1em，其余0.6em，行高1.2em
+    不依赖渲染器，同样的标签在任何机器上得到同样的尺寸，避让结果可复现
+    """
+    lines = label.split('\n')
+    width = max(sum(1.0 if is_wide_char(ch) else 0.6 for ch in line) for line in lines)
+    return width * fontsize, len(lines) * 1.2 * fontsize
+
+
+def resolve_label_positions(anchors, sizes, max_iter=LABEL_MAX_ITER, gap=LABEL_GAP):
+    """
+    确定性的标签避让：标签初始居中于气泡，两两重叠时沿重叠较小的方向各推开一半（再多留gap），
+    直到没有重叠；不重叠的标签保持在气泡上，且都不超出坐标区
+    输入
+        anchors: shape (k, 2) 的气泡位置（坐标区比例，0~1）
+        sizes:   shape (k, 2) 的标签宽高（坐标区比例）
+    返回
+        shape (k, 2) 的标签中心位置
+    说明
+        完全重合的标签按序号决定推开方向，不使用随机数，同样输入得到同样输出
+    """
+    pos = np.array(anchors, dtype=np.float64)
+    half = np.asarray(sizes, dtype=np.float64) / 2
+    k = len(pos)
+    order = np.sign(np.subtract.outer(np.arange(k), np.arange(k))).astype(np.float64)
+    off_diag = ~np.eye(k, dtype=bool)
+    for _ in range(max_iter):
+        dx = np.subtract.outer(pos[:, 0], pos[:, 0])
+        dy = np.subtract.outer(pos[:, 1], pos[:, 1])
+        ox = np.add.outer(half[:, 0], half[:, 0]) - np.abs(dx)
+        oy = np.add.outer(half[:, 1], half[:, 1]) - np.abs(dy)
+        overlap = (ox > 0) & (oy > 0) & off_diag
+        if not overlap.any():
+            break
+        along_x = ox < oy
+        sx = np.where(dx != 0, np.sign(dx), order)
+        sy = np.where(dy != 0, np.sign(dy), order)
+        pos[:, 0] += np.where(overlap & along_x, sx * (ox / 2 + gap), 0.0).sum(axis=1)
+        pos[:, 1] += np.where(overlap & ~along_x, sy * (oy / 2 + gap), 0.0).sum(axis=1)
+        pos = np.clip(pos, half, 1 - half)
+    return pos
+
+
+def axis_limits(values, pad=0.08, min_pad=0.05):
+    """坐标范围：数据范围两侧各留pad比例（至少min_pad）"""
+    values = np.asarray(values, dtype=np.float64)
+    lo, hi = values.min(), values.max()
+    margin = max((hi - lo) * pad, min_pad)
+    return lo - margin, hi + margin
+
+
+def _chart_data(result):
+    """FactorResult或因子表values → (values, x_split, y_split)，只保留推荐者与贬损者均分都有的因子"""
+    if isinstance(result, FactorResult):
+        values, splits = result.values, result.meta.get('splits')
+    else:
+        values, splits = result, None
+    if values['group'].nunique() > 1:
+        raise ValueError("一张四象限图只能画一个分组，请先用FactorResult.group()取单组。")
+    if splits is None:
+        splits = assign_quadrants(values)[1]
+    values = values.dropna(subset=['promoter_mean', 'detractor_mean']).reset_index(drop=True)
+    if values.empty:
+        raise ValueError("没有推荐者与贬损者均分都有值的因子，无法画图。")
+    x_split, y_split = splits.iloc[0]
+    return values, x_split, y_split
+
+
+def render_quadrant(result, fmt='png', title='影响因子分析四象限', dpi=DPI):
+    """
+    画一张影响因子四象限图并返回图片bytes（无界面，可直接写文件、st.image或插入Excel）
+    输入
+        result: 单组的FactorResult（如result.group('UK')），或calc_factor_means输出的单组因子表
+        fmt:    'png'或'svg'
+        title:  图标题
+    说明
+        x轴为贬损者均分（激怒用户的可能性），y轴为推荐者均分（愉悦用户的可能性），气泡大小为样本量，
+        颜色为象限；标签由resolve_label_positions避让，移开较远的标签画引线
+    """
+    values, x_split, y_split = _chart_data(result)
+    x, y = values['detractor_mean'].to_numpy(), values['promoter_mean'].to_numpy()
+    xlim, ylim = axis_limits(x), axis_limits(y)
+    n = values['n'].to_numpy(dtype=np.float64)
+    sizes = BUBBLE_AREA[0] + (BUBBLE_AREA[1] - BUBBLE_AREA[0]) * (n / n.max() if n.max() > 0 else n)
+    colors = values['quadrant'].map(FACTOR_QUADRANTS).fillna('gray')
+
+    fig = _get_figure()
+    ax = fig.add_axes(AXES_RECT)
+    ax.scatter(x, y, s=sizes, alpha=0.4, c=list(colors), edgecolors='w')
+    ax.axhline(y=y_split, color='gray', linestyle='--')
+    ax.axvline(x=x_split, color='gray', linestyle='--')
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
+    ax.set_xticks([])
+    ax.set_yticks([])
+    ax.set_xlabel('激怒用户的可能性')
+    ax.set_ylabel('愉悦用户的可能性')
+    ax.set_title(title)
+
+    # 象限名与坐标轴端点“强/弱”（坐标区比例定位）
+    for text, (tx, ty), ha, va in [('愉悦因子', (0.03, 0.97), 'left', 'top'),
+                                   ('必备因子', (0.97, 0.97), 'right', 'top'),
+                                   ('激怒因子', (0.97, 0.03), 'right', 'bottom')]:
+        ax.text(tx, ty, text, transform=ax.transAxes, color=FACTOR_QUADRANTS[text], fontsize=18,
+                fontweight='bold', ha=ha, va=va)
+    for text, (tx, ty), ha, va in [('强', (-0.03, 1.0), 'left', 'bottom'), ('弱', (-0.03, 0.0), 'left', 'top'),
+                                   ('强', (1.0, -0.04), 'center', 'top'), ('弱', (0.0, -0.04), 'center', 'top')]:
+        ax.text(tx, ty, text, transform=ax.transAxes, fontsize=14, color='grey', ha=ha, va=va)
+
+    # 标签避让在坐标区比例坐标中进行
+    axes_pt = np.array([FIGSIZE[0] * AXES_RECT[2], FIGSIZE[1] * AXES_RECT[3]]) * 72
+    labels = [wrap_label(name) for name in values['name']]
+    fontsizes = [label_fontsize(label) for label in labels]
+    extents = np.array([text_extent(label, size) for label, size in zip(labels, fontsizes)]) / axes_pt
+    anchors = np.column_stack([(x - xlim[0]) / (xlim[1] - xlim[0]), (y - ylim[0]) / (ylim[1] - ylim[0])])
+    positions = resolve_label_positions(anchors, extents)
+    for label, size, anchor, pos in zip(labels, fontsizes, anchors, positions):
+        shifted = np.hypot(*(pos - anchor)) > LEADER_MIN_SHIFT
+        ax.annotate(label, xy=tuple(anchor), xycoords='axes fraction', xytext=tuple(pos), textcoords='axes fraction',
+                    fontsize=size, ha='center', va='center',
+                    arrowprops={'arrowstyle': '-', 'color': 'grey', 'lw': 0.6} if shifted else None)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi)
+    return buffer.getvalue()
+
+
+def quadrant_jobs(results):
+    """
+    把要画的结果展开为 {图名: 单组结果}
+    输入
+        results: FactorResult（多组时每组一张图，图名为组名），或 {名称: FactorResult/因子表}（多组时图名为 名称_组名）
+    """
+    if not isinstance(results, dict):
+        return {group: results.group(group) for group in results.groups()}
+    jobs = {}
+    for name, result in results.items():
+        groups = result.groups() if isinstance(result, FactorResult) else list(pd.unique(result['group']))
+        if len(groups) == 1:
+            jobs[name] = result
+            continue
+        for group in groups:
+            jobs[f"{name}_{group}"] = (result.group(group) if isinstance(result, FactorResult)
+                                       else result[result['group'] == group].reset_index(drop=True))
+    return jobs
+
+
+def _render_job(args):
+    result, kwargs = args
+    return render_quadrant(result, **kwargs)
+
+
+def render_quadrants(results, fmt='png', parallel=None, max_workers=None, font_path=None, **kwargs):
+    """
+    批量画四象限图
+    输入
+        results:  见quadrant_jobs（一个多组FactorResult即可按市场/波次各出一张）
+        fmt:      'png'或'svg'
+        parallel: None在当前进程中复用同一画布依次画；'process'用进程池，每个子进程只设置一次字体与画布
+        max_workers: 进程数，默认min(图数, CPU核数)
+        font_path: 可选，中文字体文件路径（服务器没有中文字体时）
+        kwargs:   传给render_quadrant（title、dpi）
+    返回
+        {图名: 图片bytes}
+    """
+    if parallel not in (None, 'process'):
+        raise ValueError(f"不支持的并行方式: {parallel}，可选 process")
+    jobs = quadrant_jobs(results)
+    args = [(result, dict(kwargs, fmt=fmt)) for result in jobs.values()]
+    if parallel is None or len(jobs) <= 1:
+        setup_fonts(font_path)
+        images = [_render_job(a) for a in args]
+    else:
+        workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+        with ProcessPoolExecutor(max_workers=workers, initializer=setup_fonts, initargs=(font_path,)) as pool:
+            images = list(pool.map(_render_job, args))
+    return dict(zip(jobs, images))
+
+
+def save_quadrants(images, out_dir='.', show_print=True):
+    """把render_quadrants的结果写为图片文件（扩展名由图片内容判断），返回文件路径list"""
+    paths = []
+    for name, data in images.items():
+        ext = 'svg' if data.lstrip()[:5] in (b'<?xml', b'<svg ') else 'png'
+        path = os.path.join(out_dir, f"{name}_四象限.{ext}")
+        with open(path, 'wb') as f:
+            f.write(data)
+        paths.append(path)
+        if show_print:
+            print(f"已保存到: {path}")
+    return paths
@@ -0,0 +1,278 @@
+import math
+import string
+from metrics_cal import *
+from confidence import net_score_analytic
+
+# 计算列间检验时默认不参与比较的合计列
+TOTAL_COLUMNS = ('Total', '总计')
+
+
+def column_letters(n):
+    """banner列的字母标记：A, B, ..., Z, AA, AB, ..."""
+    letters = []
+    for i in range(n):
+        label = ''
+        i += 1
+        while i:
+            i, r = divmod(i - 1, 26)
+            label = string.ascii_uppercase[r] + label
+        letters.append(label)
+    return letters
+
+
+def erfc(x):
+    """
+    向量化互补误差函数（切比雪夫近似，相对误差 < 1.2e-7），用于整张表一次求p值
+    """
+    x = np.asarray(x, dtype=np.float64)
+    z = np.abs(x)
+    t = 1.0 / (1.0 + 0.5 * z)
+    poly = -z * z - 1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (-0.18628806
+           + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (-0.82215223 + t * 0.17087277))))))))
+    ans = t * np.exp(poly)
+    return np.where(x >= 0, ans, 2.0 - ans)
+
+
+def two_sided_p(z):
+    """标准正态双侧p值"""
+    return np.minimum(erfc(np.abs(z) / math.sqrt(2.0)), 1.0)
+
+
+def chi2_sf(stat, df, max_iter=300, eps=1e-12):
+    """
+    卡方分布右尾概率 = 正则化上不完全伽马函数 Q(df/2, stat/2)，对数组整体计算
+    x < a+1 用级数展开，其余用连分式（Lentz法）
+    """
+    stat = np.atleast_1d(np.asarray(stat, dtype=np.float64))
+    df = np.broadcast_to(np.asarray(df, dtype=np.float64), stat.shape)
+    a, x = df / 2.0, stat / 2.0
+    result = np.full(stat.shape, np.nan)
+    valid = (df > 0) & (stat >= 0) & np.isfinite(stat)
+    result[valid & (x == 0)] = 1.0
+    valid &= x > 0
+    lgam = np.array([math.lgamma(v) if v > 0 else np.nan for v in a.ravel()]).reshape(a.shape)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        log_prefix = -x + a * np.log(x) - lgam
+
+        # 级数：P(a, x)
+        series = valid & (x < a + 1)
+        ap, term = a.copy(), 1.0 / np.where(a > 0, a, 1.0)
+        total = term.copy()
+        for _ in range(max_iter):
+            ap = ap + 1
+            term = term * x / ap
+            total = total + term
+            if np.all(np.abs(term[series]) < np.abs(total[series]) * eps):
+                break
+        result[series] = 1.0 - total[series] * np.exp(log_prefix[series])
+
+        # 连分式：Q(a, x)
+        cf = valid & ~series
+        tiny = 1e-300
+        b = x + 1.0 - a
+        c = np.full(stat.shape, 1.0 / tiny)
+        d = 1.0 / np.where(b == 0, tiny, b)
+        h = d.copy()
+        for i in range(1, max_iter + 1):
+            an = -i * (i - a)
+            b = b + 2.0
+            d = an * d + b
+            d = np.where(np.abs(d) < tiny, tiny, d)
+            c = b + an / c
+            c = np.where(np.abs(c) < tiny, tiny, c)
+            d = 1.0 / d
+            delta = d * c
+            h = h * delta
+            if np.all(np.abs(delta[cf] - 1.0) < eps):
+                break
+        result[cf] = np.exp(log_prefix[cf]) * h[cf]
+    return np.clip(result, 0.0, 1.0)
+
+
+def _counts_and_bases(cross_tab, group_cols=None):
+    """拆出频数矩阵 (行数, 列数) 与各列Base；没有Base行时以列合计为Base"""
+    if group_cols is None:
+        group_cols = [c for c in cross_tab.columns if c not in TOTAL_COLUMNS]
+    group_cols = list(group_cols)
+    body = cross_tab.loc[cross_tab.index != 'Base', group_cols]
+    counts = body.to_numpy(dtype=np.float64)
+    if 'Base' in cross_tab.index:
+        bases = cross_tab.loc['Base', group_cols].to_numpy(dtype=np.float64)
+    else:
+        bases = np.nansum(counts, axis=0)
+    return body.index, group_cols, np.nan_to_num(counts), bases
+
+
+def letter_flags(higher, letters):
+    """
+    higher: shape (..., 列数, 列数) 的bool数组，[..., i, j]表示列i显著高于列j
+    返回 shape (..., 列数) 的字符串数组，每格为显著低于本列的各列字母
+    """
+    letters = np.asarray(letters, dtype=object)
+    flags = np.full(higher.shape[:-1], '', dtype=object)
+    for j, letter in enumerate(letters):
+        flags = flags + np.where(higher[..., j], letter, '')
+    return flags
+
+
+def column_proportion_tests(cross_tab, group_cols=None, alpha=0.05, min_base=0, eff_bases=None):
+    """
+    列比例z检验：交叉表每一行，任意两列的占比（频数/列Base）两两比较，整张表一次向量化计算
+    输入
+        cross_tab: 频数表，'Base'行为各列Base（没有时用列合计），'Total'/'总计'列默认不参与
+        group_cols: 参与比较的列，默认除合计列外全部
+        alpha: 显著性水平
+        min_base: Base小于该值的列不参与比较（p值为NaN）
+        eff_bases: 可选，加权表各列的有效样本量（dict/Series按列名，或数组）；
+                   指定时占比仍为加权频数/加权Base，标准误与min_base按有效样本量计算
+    返回
+        dict:
+            'letters':  {列名: 字母}
+            'p_values': DataFrame，index为(行, 列)，columns为比较的列，值为双侧p值
+            'z':        同上，值为z统计量（正值表示index列占比更高）
+            'flags':    DataFrame (行 × 列)，每格为显著低于本列的各列字母，如'BC'
+    说明
+        使用合并比例的两样本z检验；多选题各列样本可能重叠，结果仅供参考
+    """
+    rows, cols, counts, bases = _counts_and_bases(cross_tab, group_cols)
+    if eff_bases is not None:
+        if isinstance(eff_bases, (dict, pd.Series)):
+            eff_bases = [eff_bases[c] for c in cols]
+        eff_bases = np.asarray(eff_bases, dtype=np.float64)
+        # 按有效样本量折算频数，占比不变
+        with np.errstate(divide='ignore', invalid='ignore'):
+            counts = np.nan_to_num(counts / bases) * eff_bases
+        bases = eff_bases
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = counts / bases
+        # (行, 列i, 列j)
+        pooled = (counts[:, :, None] + counts[:, None, :]) / (bases[:, None] + bases[None, :])
+        se = np.sqrt(pooled * (1 - pooled) * (1 / bases[:, None] + 1 / bases[None, :]))
+        z = (p[:, :, None] - p[:, None, :]) / se
+    usable = (bases >= max(min_base, 1))
+    pair_ok = usable[:, None] & usable[None, :] & ~np.eye(len(cols), dtype=bool)
+    z = np.where(pair_ok & (se > 0), z, np.where(pair_ok, 0.0, np.nan))
+    p_values = np.where(np.isnan(z), np.nan, two_sided_p(np.nan_to_num(z)))
+    higher = (z > 0) & (p_values < alpha)
+
+    letters = column_letters(len(cols))
+    index = pd.MultiIndex.from_product([rows, cols])
+    return {
+        'letters': dict(zip(cols, letters)),
+        'p_values': pd.DataFrame(p_values.reshape(-1, len(cols)), index=index, columns=cols),
+        'z': pd.DataFrame(z.reshape(-1, len(cols)), index=index, columns=cols),
+        'flags': pd.DataFrame(letter_flags(higher, letters), index=rows, columns=cols),
+    }
+
+
+def chi_square_test(cross_tab, group_cols=None):
+    """
+    独立性卡方检验（Base行与合计列不参与，全0的行/列剔除）
+    返回 dict: statistic, df, p_value
+    """
+    _, _, counts, _ = _counts_and_bases(cross_tab, group_cols)
+    row = chi_square_many([counts]).iloc[0]
+    return {'statistic': float(row['statistic']), 'df': int(row['df']), 'p_value': float(row['p_value'])}
+
+
+def chi_square_many(tables):
+    """
+    批量卡方检验：每张表只做一次数组运算求统计量，所有表的p值一次向量化求出
+    输入
+        tables: 频数表list（DataFrame或ndarray，DataFrame时去掉Base行与合计列）
+    返回
+        DataFrame：每张表一行，statistic + df + p_value
+    """
+    stats, dfs = [], []
+    for table in tables:
+        if isinstance(table, pd.DataFrame):
+            _, _, table, _ = _counts_and_bases(table)
+        counts = np.nan_to_num(np.asarray(table, dtype=np.float64))
+        counts = counts[counts.sum(axis=1) > 0][:, counts.sum(axis=0) > 0]
+        if counts.ndim != 2 or min(counts.shape) < 2:
+            stats.append(np.nan)
+            dfs.append(0)
+            continue
+        expected = counts.sum(axis=1, keepdims=True) * counts.sum(axis=0, keepdims=True) / counts.sum()
+        stats.append(((counts - expected) ** 2 / expected).sum())
+        dfs.append((counts.shape[0] - 1) * (counts.shape[1] - 1))
+    stats, dfs = np.asarray(stats, dtype=np.float64), np.asarray(dfs, dtype=np.float64)
+    return pd.DataFrame({'statistic': stats, 'df': dfs.astype(int), 'p_value': chi2_sf(stats, dfs)})
+
+
+def nps_difference_tests(scores, by, alpha=0.05, min_base=0, weights=None):
+    """
+    NPS列间差异检验：各组NPS两两比较，方差用三项分布解析公式，z = (NPS_i - NPS_j) / sqrt(se_i² + se_j²)
+    输入
+        scores: 0~10分Series
+        by:     分组Series（banner列变量）
+        weights: 可选，样本权重；指定时NPS为加权值，se与min_base按有效样本量计算
+    返回
+        dict:
+            'stats':    各组 base + nps + se + 字母（加权时base后加eff_base）
+            'p_values': DataFrame (组 × 组) 双侧p值
+            'z':        DataFrame (组 × 组) z统计量
+            'flags':    Series，每组显著低于本组的各组字母
+    """
+    group_keys, counts, totals, _, eff_base = nps_counts_by_group(scores, by, weights)
+    top = counts[:, NPS_PROMOTER_SCORES].sum(axis=1)
+    bottom = counts[:, NPS_DETRACTOR_SCORES].sum(axis=1)
+    if weights is not None:
+        scale = np.divide(eff_base, totals, out=np.zeros(len(totals)), where=totals > 0)
+        top, bottom = top * scale, bottom * scale
+    nps, se, _, _ = net_score_analytic(top, bottom, eff_base)
+    groups = list(group_keys.iloc[:, 0])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (nps[:, None] - nps[None, :]) / np.sqrt(se[:, None] ** 2 + se[None, :] ** 2)
+    usable = eff_base >= max(min_base, 1)
+    pair_ok = usable[:, None] & usable[None, :] & ~np.eye(len(groups), dtype=bool)
+    z = np.where(pair_ok, np.where(np.isnan(z), 0.0, z), np.nan)
+    p_values = np.where(np.isnan(z), np.nan, two_sided_p(np.nan_to_num(z)))
+    higher = (z > 0) & (p_values < alpha)
+    letters = column_letters(len(groups))
+    stats = pd.DataFrame({'base': totals, 'nps': nps, 'se': se, 'letter': letters}, index=groups)
+    if weights is not None:
+        stats.insert(1, 'eff_base', eff_base)
+    return {
+        'stats': stats,
+        'p_values': pd.DataFrame(p_values, index=groups, columns=groups),
+        'z': pd.DataFrame(z, index=groups, columns=groups),
+        'flags': pd.Series(letter_flags(higher, letters), index=groups),
+    }
+
+
+def flag_percent_table(cross_tab, group_cols=None, alpha=0.05, min_base=0):
+    """
+    列百分比表，每格后附显著性字母（如'45.00% BC'），表头附列字母（如'Male (A)'）
+    """
+    tests = column_proportion_tests(cross_tab, group_cols, alpha, min_base)
+    cols = list(tests['letters'])
+    pct = crosstab_percentages(cross_tab, cols, formatted=True)['col_pct'][cols]
+    flags = tests['flags']
+    table = pct.where(flags == '', pct + ' ' + flags)
+    table.columns = [f"{col} ({letter})" for col, letter in tests['letters'].items()]
+    return table
+
+
+def tab_book_flags(tables, alpha=0.05, min_base=0, skip_rows=('推荐者', '中立者', '贬损者', 'NPS')):
+    """
+    表册显著性标记：build_tab_book结果中每张表、每个banner题内部的各列两两比较
+    输入
+        tables: build_tab_book返回的 {表名: DataFrame}（列为(banner题号, 选项)两级表头）
+        skip_rows: 不参与检验的汇总行（NPS stub的推荐者/中立者/贬损者/NPS）
+    返回
+        {表名: DataFrame}，行列与原表的频数部分相同（Total列除外），每格为显著低于本列的各列字母
+    """
+    flagged = {}
+    for label, table in tables.items():
+        body = table.loc[[idx for idx in table.index if idx not in skip_rows]]
+        parts = []
+        for qid in dict.fromkeys(body.columns.get_level_values(0)):
+            if qid in TOTAL_COLUMNS:
+                continue
+            block = body[qid]
+            flags = column_proportion_tests(block, list(block.columns), alpha, min_base)['flags']
+            flags.columns = pd.MultiIndex.from_product([[qid], flags.columns])
+            parts.append(flags)
+        flagged[label] = pd.concat(parts, axis=1) if parts else pd.DataFrame(index=body.index.drop('Base', errors='ignore'))
+    return flagged
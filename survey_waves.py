@@ -0,0 +1,191 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pandas as pd
+from Survey_Data import SurveyData
+from ultis import drop_invalid_samples
+
+# 列名开头的题号，如'S63What is your age?'中的'S63'
+QID_PREFIX = re.compile(r'^([A-Za-z]+)(\d+)')
+# 并行加载方式
+LOAD_EXECUTORS = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+
+
+def question_text_key(raw_col):
+    """
+    列的对齐键：去掉开头题号后的题目文本（含选项部分），空白归一
+    不同波次/市场的导出即使题号不同（S20 vs S22），同一道题的键相同
+    """
+    return ' '.join(QID_PREFIX.sub('', str(raw_col), count=1).split())
+
+
+def _column_keys(qinfo):
+    """每列的对齐键；同一文件内键重复时按出现次序区分"""
+    seen = {}
+    keys = []
+    for raw_col in qinfo['raw_col']:
+        key = question_text_key(raw_col)
+        seen[key] = seen.get(key, 0) + 1
+        keys.append((key, seen[key]))
+    return keys
+
+
+def _next_qid(qid, used_qids):
+    """题号冲突时分配同字母前缀的下一个空闲编号"""
+    letters = QID_PREFIX.match(qid).group(1)
+    numbers = [int(m.group(2)) for m in map(QID_PREFIX.match, used_qids) if m and m.group(1) == letters]
+    return f"{letters}{max(numbers, default=0) + 1}"
+
+
+def align_qinfo(qinfos):
+    """
+    按题目文本对齐多个qinfo，生成统一的题目结构
+    输入
+        qinfos: 各波次SurveyData的qinfo list（第一个为基准）
+    返回
+        (unified_qinfo, renames)
+        unified_qinfo: 统一的qinfo（列为基准波次中出现过的列 + 后续波次新增的列）
+        renames: 每个波次的 {原列名: 统一列名}
+    说明
+        - 题目文本相同的列合并为一列，沿用最先出现时的列名与题号
+        - 题目只要有一列已对齐，该题新增的选项列也归入同一统一题号
+        - 新题的题号与已有的不同题目冲突时，改为同字母前缀的下一个空闲编号
+    """
+    rows, renames = [], []
+    key_to_col, key_to_qid = {}, {}
+    used_qids, used_cols = set(), set()
+    for qinfo in qinfos:
+        records = qinfo.to_dict('records')
+        keys = _column_keys(qinfo)
+
+        # 1. 题号映射：每道题先看是否有列已对齐
+        qid_map = {}
+        for rec, key in zip(records, keys):
+            qid = rec['original_qid']
+            if not qid or qid in qid_map or key not in key_to_qid:
+                continue
+            qid_map[qid] = key_to_qid[key]
+        for rec in records:
+            qid = rec['original_qid']
+            if not qid or qid in qid_map:
+                continue
+            qid_map[qid] = qid if qid not in used_qids else _next_qid(qid, used_qids)
+            used_qids.add(qid_map[qid])
+        used_qids.update(qid_map.values())
+
+        # 2. 列映射
+        rename = {}
+        for rec, key in zip(records, keys):
+            raw_col = rec['raw_col']
+            if key in key_to_col:
+                rename[raw_col] = key_to_col[key]
+                continue
+            qid = rec['original_qid']
+            new_qid = qid_map.get(qid, qid)
+            new_col = raw_col if new_qid == qid else new_qid + raw_col[len(qid):]
+            n = 2
+            while new_col in used_cols:
+                new_col = f"{new_col}_{n}"
+                n += 1
+            m = re.match(r'[SMF]?(\d+)', new_col)
+            rows.append(dict(rec, raw_col=new_col, original_qid=new_qid, question_id=m.group(1) if m else ''))
+            key_to_col[key], key_to_qid[key] = new_col, new_qid
+            used_cols.add(new_col)
+            rename[raw_col] = new_col
+        renames.append(rename)
+    return pd.DataFrame(rows, columns=qinfos[0].columns if len(qinfos) else None), renames
+
+
+def stack_surveys(surveys, waves=None, wave_col='wave'):
+    """
+    把多个SurveyData（不同波次/市场）按统一题目结构纵向拼接
+    输入
+        surveys: SurveyData list
+        waves:   各数据集的波次/市场名，默认'wave1'、'wave2'...
+        wave_col: 波次列名，作为单选题（题号同列名）登记到qinfo，可直接用于交叉分析与分组计算
+    返回
+        SurveyData：行为全部样本（index为0..n-1），某波次没有的列为缺失
+    """
+    surveys = list(surveys)
+    if not surveys:
+        raise ValueError("至少需要一个数据集。")
+    waves = list(waves) if waves is not None else [f"wave{i + 1}" for i in range(len(surveys))]
+    if len(waves) != len(surveys):
+        raise ValueError(f"waves数量({len(waves)})与数据集数量({len(surveys)})不一致。")
+    unified, renames = align_qinfo([s.qinfo for s in surveys])
+    frames = [s.df.rename(columns=rename) for s, rename in zip(surveys, renames)]
+    # 统一为object列再拼接，避免不同波次category类别不同导致的类型不一致
+    frames = [f.astype({c: object for c in f.columns if isinstance(f[c].dtype, pd.CategoricalDtype)}) for f in frames]
+    df = pd.concat(frames, ignore_index=True, sort=False).reindex(columns=list(unified['raw_col']))
+    wave_values = pd.Categorical(
+        [wave for wave, s in zip(waves, surveys) for _ in range(len(s.df))], categories=list(dict.fromkeys(waves)))
+    survey = SurveyData.from_frames(df, unified)
+    survey.add_derived_column(wave_col, wave_values, original_qid=wave_col, qtype='S', short_name=wave_col)
+    return survey
+
+
+def _load_frames(source, kwargs):
+    """进程池任务：加载单个文件，只把df和qinfo传回主进程"""
+    survey = SurveyData(source, **kwargs)
+    return survey.df, survey.qinfo
+
+
+def load_surveys(sources, parallel=None, max_workers=None, valid_only=False, **survey_kwargs):
+    """
+    加载多个导出文件为SurveyData list（不拼接）
+    输入
+        sources:  文件路径list
+        parallel: None串行；'thread'线程池；'process'进程池（只适用于文件路径）
+        max_workers: 并行数，默认min(文件数, CPU核数)
+        valid_only: 为True时每个文件只保留样本状态为'有效'的样本
+        survey_kwargs: 传给SurveyData的其他参数（如cache_dir）
+    """
+    sources = list(sources)
+    if survey_kwargs.get('lazy'):
+        raise ValueError("多文件加载需要完整读入数据，不支持lazy模式。")
+    if parallel not in (None, *LOAD_EXECUTORS):
+        raise ValueError(f"不支持的并行方式: {parallel}，可选 {'/'.join(LOAD_EXECUTORS)}")
+
+    if parallel is None or len(sources) <= 1:
+        loaded = [_load_frames(source, survey_kwargs) for source in sources]
+    else:
+        workers = min(max_workers or os.cpu_count() or 1, len(sources))
+        with LOAD_EXECUTORS[parallel](max_workers=workers) as pool:
+            loaded = list(pool.map(_load_frames, sources, [survey_kwargs] * len(sources)))
+
+    surveys = []
+    for df, qinfo in loaded:
+        if valid_only:
+            df = drop_invalid_samples(df)
+        surveys.append(SurveyData.from_frames(df, qinfo))
+    return surveys
+
+
+def load_waves(sources, waves=None, wave_col='wave', parallel=None, max_workers=None, valid_only=False,
+               compact=False, **survey_kwargs):
+    """
+    加载多个波次/市场的导出文件并拼接为一个数据集
+    输入
+        sources:  文件路径list，或 {波次名: 文件路径}
+        waves:    各文件的波次/市场名（sources为dict时取其键），默认取文件名
+        wave_col: 波次列名
+        parallel: None串行；'thread'线程池；'process'进程池（只适用于文件路径）
+        max_workers: 并行数，默认min(文件数, CPU核数)
+        valid_only: 为True时每个文件只保留样本状态为'有效'的样本
+        compact:  拼接后转为紧凑存储（见SurveyData.compact）
+        survey_kwargs: 传给SurveyData的其他参数（如cache_dir）
+    返回
+        SurveyData，包含wave_col列；趋势NPS、市场对比直接按wave_col分组一次计算，如
+        calc_nps_by_group(scores, survey.df['wave'])、cross_analysis(survey, 'S20', 'wave', is_nps=True)
+    """
+    if isinstance(sources, dict):
+        waves, sources = list(sources), list(sources.values())
+    sources = list(sources)
+    if waves is None:
+        waves = [os.path.splitext(os.path.basename(str(s)))[0] for s in sources]
+    surveys = load_surveys(sources, parallel=parallel, max_workers=max_workers, valid_only=valid_only,
+                           **survey_kwargs)
+    survey = stack_surveys(surveys, waves, wave_col)
+    if compact:
+        survey.compact()
+    return survey
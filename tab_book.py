@@ -0,0 +1,121 @@
+from cross_analysis import *
+
+
+def encode_single_choice(ser, nps=False):
+    """
+    单选题one-hot编码
+    输入
+        ser: 单列答案Series
+        nps: 为True时按0~10分固定编码11列（非0~10的作答视为未作答）
+    返回
+        (选项名list, shape (样本数, 选项数) 的0/1矩阵)
+    """
+    n = len(ser)
+    if nps:
+        codes = nps_score_codes(ser)
+        codes = np.where((codes >= 0) & (codes <= 10), codes, -1)
+        names = [str(i) for i in NPS_SCORES]
+    else:
+        # 与pd.crosstab一致，选项按取值排序
+        codes, uniques = pd.factorize(ser, sort=True)
+        names = list(uniques)
+    mat = np.zeros((n, len(names)))
+    answered = codes >= 0
+    mat[np.flatnonzero(answered), codes[answered]] = 1.0
+    return names, mat
+
+
+def encode_question(survey, qid, nps=False):
+    """
+    把题号编码为若干个0/1矩阵块，单选题矩阵题（多列）每列一块，多选题为一块
+    返回 list[(块标签, 选项名list, 矩阵)]
+    """
+    qtype = survey.get_qtype(qid)
+    if qtype == 'M':
+        names, mat = multiple_choice_matrix(survey, qid)
+        return [(qid, names, mat)]
+    answers = survey.get_answers_by_qid(qid)
+    if answers.shape[1] == 1:
+        return [(qid, *encode_single_choice(answers.iloc[:, 0], nps=nps))]
+    blocks = []
+    for col in answers.columns:
+        label = f"{qid}_{survey.short_names.get(col, col)}"
+        blocks.append((label, *encode_single_choice(answers[col], nps=nps)))
+    return blocks
+
+
+def build_tab_book(survey, stub_qids, banner_qids, nps_qids=(), include_total=True):
+    """
+    表册(tab book)：所有stub题 × 一组banner题的交叉表一次算完
+    输入
+        survey:      SurveyData对象
+        stub_qids:   行题号list（单选/多选/单选矩阵题均可）
+        banner_qids: banner题号list（单选题或多选题，如S68、g1、地区）
+        nps_qids:    stub中按0~10分处理的题号，表末追加推荐者/中立者/贬损者/NPS行
+        include_total: 是否在banner最前加Total列（全部样本）
+    返回
+        dict {表名: DataFrame}，每个stub一张表：
+        行为Base + stub选项，列为(banner题号, banner选项)两级表头，值为频数
+    说明
+        banner与stub的虚拟变量矩阵各编码一次后横向拼接，全部交叉表由一次矩阵乘法Sᵀ·B得到，
+        耗时约等于扫描一遍数据，而不是每张表扫描一遍；
+        survey设置了样本权重时banner矩阵每行乘以权重，频数与Base即为加权值
+    """
+    nps_qids = set(nps_qids)
+    # 按需加载模式下一次扫描读入全部用到的题
+    survey.load_qids(*dict.fromkeys(list(stub_qids) + list(banner_qids)))
+
+    # 1. banner编码一次，所有stub共用
+    banner_cols, banner_mats = [], []
+    if include_total:
+        banner_cols.append(('Total', 'Total'))
+        banner_mats.append(np.ones((len(survey.df), 1)))
+    for qid in banner_qids:
+        for label, names, mat in encode_question(survey, qid):
+            if label != qid:
+                raise ValueError(f"banner题号'{qid}'包含多列，只支持单列单选题或多选题。")
+            banner_cols.extend((qid, name) for name in names)
+            banner_mats.append(mat)
+    banner = np.hstack(banner_mats)
+    weights = survey.weights
+    if weights is not None:
+        banner = banner * weights.to_numpy()[:, None]
+    columns = pd.MultiIndex.from_tuples(banner_cols)
+
+    # 2. stub编码，并记录每块的作答指示（至少选了一项）
+    blocks = []
+    for qid in stub_qids:
+        for label, names, mat in encode_question(survey, qid, nps=qid in nps_qids):
+            blocks.append((label, names, mat, qid in nps_qids))
+    if not blocks:
+        return {}
+    stub = np.hstack([mat for _, _, mat, _ in blocks])
+    answered = np.column_stack([mat.any(axis=1) for _, _, mat, _ in blocks]).astype(np.float64)
+
+    # 3. 一次矩阵乘法得到全部交叉频数与Base
+    counts = stub.T @ banner
+    bases = answered.T @ banner
+    if weights is None:
+        counts, bases = counts.astype(np.int64), bases.astype(np.int64)
+
+    tables = {}
+    offset = 0
+    for i, (label, names, mat, is_nps) in enumerate(blocks):
+        block_counts = counts[offset:offset + len(names)]
+        offset += len(names)
+        table = pd.DataFrame(np.vstack([bases[i], block_counts]), index=['Base'] + names, columns=columns)
+        if is_nps:
+            stats = nps_from_counts(block_counts.T, bases[i])
+            summary = stats[['pct_recommend', 'pct_passive', 'pct_detractor', 'nps']].T
+            summary.index = ['推荐者', '中立者', '贬损者', 'NPS']
+            summary.columns = columns
+            table = pd.concat([table.astype(float), summary.round(2)])
+        tables[label] = table
+    return tables
+
+
+def save_tab_book(tables, name, out_dir='.', show_print=True):
+    """
+    把build_tab_book的结果写入一个工作簿，每个stub一个sheet
+    """
+    save_multi_tables_to_excel(tables, name, 'tab_book', out_dir, show_print=show_print)
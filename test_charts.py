@@ -0,0 +1,43 @@
+import unittest
+from Survey_Data import SurveyData
+from analysis import nps_analysis, nss_analysis, nss_detail_analysis, rank_analysis, cross_analysis_handler
+from charts import result_figure
+from test_fixtures import make_export
+
+
+def all_results(survey):
+    results = {}
+    results.update(nps_analysis(survey, 'S2', as_result=True))
+    results.update(nss_analysis(survey, 'M10', as_result=True))
+    results.update(rank_analysis(survey, 'S67', max_rank=3, as_result=True))
+    results.update(nss_detail_analysis(survey, 'S6', as_result=True))
+    results['cross'] = cross_analysis_handler(survey, {'row_qid': 'S2', 'col_qid': 'S62'}, as_result=True)
+    results['nps_cross'] = cross_analysis_handler(survey, {'row_qid': 'S2', 'col_qid': 'S62', 'is_nps': True},
+                                                  as_result=True)
+    return {k: (list(v.values())[0] if isinstance(v, dict) else v) for k, v in results.items()}
+
+
+class TestCharts(unittest.TestCase):
+    def test_figures_from_results(self):
+        results = all_results(SurveyData.from_frames(make_export(500)))
+        self.assertIsNone(result_figure(results.pop('others')))
+        figures = {name: result_figure(result) for name, result in results.items()}
+        self.assertEqual(len(figures['S2'].data[0].y), 11)
+        self.assertAlmostEqual(sum(figures['S2'].data[0].y), 100, places=1)
+        self.assertEqual([t.name for t in figures['M10'].data], ['1分', '2分', '3分', '4分', '5分'])
+        self.assertEqual(len(figures['S67'].data[0].x), 2)
+        self.assertEqual(figures['cross'].data[0].type, 'heatmap')
+        self.assertEqual(len(figures['nps_cross'].data), 3)
+        self.assertEqual(len(figures['nps_cross'].data[0].y), 3)
+
+    def test_payload_independent_of_sample_size(self):
+        small = all_results(SurveyData.from_frames(make_export(300, 1)))
+        large = all_results(SurveyData.from_frames(make_export(30000, 1)))
+        for name in ('S2', 'M10', 'S67', 'S6', 'cross', 'nps_cross'):
+            size_small = len(result_figure(small[name]).to_json())
+            size_large = len(result_figure(large[name]).to_json())
+            self.assertLess(abs(size_large - size_small), 200, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
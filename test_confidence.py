@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+import pandas as pd
+from confidence import nps_ci, nss_ci, net_score_analytic, z_value
+from metric_results import NPSResult, NSSResult
+
+
+class TestConfidence(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.scores = pd.Series(rng.integers(0, 11, 600).astype(str))
+        self.groups = pd.Series(rng.choice(['low', 'mid', 'high'], 600))
+        self.grid = pd.DataFrame({'a': rng.integers(1, 6, 300), 'b': [None] * 300})
+
+    def test_analytic_trinomial_formula(self):
+        score, se, lower, upper = net_score_analytic([50], [20], [100])
+        self.assertAlmostEqual(score[0], 30.0)
+        expected_se = np.sqrt((0.5 + 0.2 - 0.3 ** 2) / 100) * 100
+        self.assertAlmostEqual(se[0], expected_se)
+        self.assertAlmostEqual(upper[0] - score[0], z_value(0.95) * expected_se)
+
+    def test_bootstrap_close_to_analytic(self):
+        analytic = nps_ci(self.scores, self.groups)
+        boot = nps_ci(self.scores, self.groups, method='bootstrap', n_boot=20000, seed=1)
+        self.assertEqual(analytic.iloc[:, 0].tolist(), boot.iloc[:, 0].tolist())
+        np.testing.assert_allclose(boot['se'], analytic['se'], rtol=0.05)
+        np.testing.assert_allclose(boot['nps'], analytic['nps'])
+        self.assertTrue((boot['lower'] < boot['nps']).all() and (boot['nps'] < boot['upper']).all())
+
+    def test_bootstrap_reproducible_with_seed(self):
+        first = nps_ci(self.scores, method='bootstrap', n_boot=500, seed=7)
+        second = nps_ci(self.scores, method='bootstrap', n_boot=500, seed=7)
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_empty_cell_and_grid(self):
+        ci = nss_ci(self.grid, method='bootstrap', n_boot=1000, seed=0)
+        self.assertEqual(ci['题目'].tolist(), ['a', 'b'])
+        self.assertEqual(ci.loc[1, 'base'], 0)
+        self.assertTrue(np.isnan(ci.loc[1, 'lower']))
+        with self.assertRaises(ValueError):
+            nss_ci(self.grid, by=self.groups)
+        with self.assertRaises(ValueError):
+            nps_ci(self.scores, method='jackknife')
+
+    def test_result_objects(self):
+        expected = nps_ci(self.scores, self.groups)
+        ci = NPSResult.from_groups(self.scores, self.groups).confidence_interval()
+        np.testing.assert_allclose(ci['se'], expected['se'])
+        ci = NSSResult.from_frame(self.grid).confidence_interval()
+        np.testing.assert_allclose(ci['se'], nss_ci(self.grid)['se'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from Survey_Data import SurveyData
+from cross_analysis import count_cross_analysis, count_cross_analysis_multiple, multiple_choice_dummy
+from tab_book import build_tab_book, save_tab_book
+from batch_runner import run_batch
+
+
+def write_multi_excel(path):
+    # 两道多选题 S6(3个选项+填空) 和 S7(2个选项)，外加单选题 S62
+    df = pd.DataFrame({
+        'ID': ['a1', 'a2', 'a3', 'a4', 'a5'],
+        '样本状态': ['有效'] * 5,
+        'S6Which apply? (Multiple choice)_A': ['A', None, 'A', 'A', None],
+        'S6Which apply? (Multiple choice)_B': [None, 'B', 'B', None, None],
+        'S6Which apply? (Multiple choice)_C': ['C', 'C', None, None, None],
+        'S6Which apply? (Multiple choice)_填空1': [None, 'txt', None, None, None],
+        'S7Used where? (Multiple choice)_Home': ['Home', 'Home', None, 'Home', 'Home'],
+        'S7Used where? (Multiple choice)_Car': [None, 'Car', 'Car', 'Car', None],
+        'S62Gender (Single choice)': ['Male', 'Female', 'Male', None, 'Female'],
+    })
+    df.to_excel(path, index=False)
+
+
+class TestMultipleCooccurrence(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(cls.tmp_dir, 'multi.xlsx')
+        write_multi_excel(path)
+        cls.survey = SurveyData(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def test_matches_pairwise_counts(self):
+        result = count_cross_analysis_multiple(self.survey, 'S6', 'S7')
+        row_dummy = multiple_choice_dummy(self.survey, 'S6')
+        col_dummy = multiple_choice_dummy(self.survey, 'S7')
+        self.assertEqual(list(result.columns), ['Total', 'A', 'B', 'C'])
+        self.assertEqual(list(result.index), ['Base', 'Home', 'Car'])
+        for r in row_dummy.columns:
+            self.assertEqual(result.loc['Base', r], row_dummy[r].sum())
+            for c in col_dummy.columns:
+                self.assertEqual(result.loc[c, r], (row_dummy[r] & col_dummy[c]).sum())
+        self.assertTrue(np.isnan(result.loc['Base', 'Total']))
+        self.assertEqual(result.loc['Home', 'Total'], 4)
+
+    def test_labels(self):
+        result = count_cross_analysis_multiple(self.survey, 'S6', 'S7', row_labels={'A': '选项A'}, col_labels={'Car': '车内'})
+        self.assertIn('选项A', result.columns)
+        self.assertIn('车内', result.index)
+
+
+class TestTabBook(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(cls.tmp_dir, 'multi.xlsx')
+        write_multi_excel(path)
+        cls.survey = SurveyData(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def test_single_stub_matches_crosstab(self):
+        tables = build_tab_book(self.survey, ['S62'], ['S7', 'S62'])
+        table = tables['S62']
+        self.assertEqual(table.columns[0], ('Total', 'Total'))
+        self.assertEqual(table.loc['Base', ('Total', 'Total')], 4)
+        expected = count_cross_analysis(self.survey.df['S62Gender (Single choice)'], self.survey.df['S62Gender (Single choice)'])
+        block = table['S62'].drop('Base')
+        self.assertTrue((block.loc[expected.index, expected.columns].to_numpy() == expected.to_numpy()).all())
+
+    def test_multiple_stub_against_banner(self):
+        tables = build_tab_book(self.survey, ['S6'], ['S7'])
+        table = tables['S6']
+        expected = count_cross_analysis_multiple(self.survey, 'S7', 'S6')
+        for opt in ['A', 'B', 'C']:
+            for banner_opt in ['Home', 'Car']:
+                self.assertEqual(table.loc[opt, ('S7', banner_opt)], expected.loc[opt, banner_opt])
+        # Base为至少选了一个S6选项的人数
+        self.assertEqual(table.loc['Base', ('Total', 'Total')], 4)
+
+    def test_export_workbook(self):
+        tables = build_tab_book(self.survey, ['S6', 'S62'], ['S7'])
+        save_tab_book(tables, 'book', self.tmp_dir, show_print=False)
+        sheets = pd.read_excel(os.path.join(self.tmp_dir, 'book_tab_book.xlsx'), sheet_name=None)
+        self.assertEqual(list(sheets), ['S6', 'S62'])
+
+    def test_export_grid_with_shared_prefix(self):
+        # 两个矩阵子题的表名前31个字符相同，sheet名截断后需去重
+        grid = 'M10How satisfied? (Single choice)_Connection with other devices via '
+        survey = SurveyData.from_frames(pd.DataFrame({
+            'ID': ['a1', 'a2', 'a3'],
+            grid + 'Bluetooth': ['5', '4', '3'],
+            grid + 'HDMI': ['1', '5', '5'],
+            'S62Gender (Single choice)': ['Male', 'Female', 'Male'],
+        }))
+        tables = build_tab_book(survey, ['M10'], ['S62'])
+        self.assertEqual(len(tables), 2)
+        save_tab_book(tables, 'grid', self.tmp_dir, show_print=False)
+        sheets = pd.read_excel(os.path.join(self.tmp_dir, 'grid_tab_book.xlsx'), sheet_name=None, header=[0, 1],
+                               index_col=0)
+        self.assertEqual(list(sheets), ['M10_Connection with other devic', 'M10_Connection with other dev~2'])
+        for sheet, table in zip(sheets.values(), tables.values()):
+            self.assertEqual(sheet.loc['Base', ('Total', 'Total')], table.loc['Base', ('Total', 'Total')])
+
+
+class TestBatchRunner(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(cls.tmp_dir, 'multi.xlsx')
+        write_multi_excel(path)
+        cls.survey = SurveyData(path)
+        cls.jobs = [
+            ('nss_detail', 'S6'),
+            ('nss_detail', 'S7'),
+            ('cross', {'row_qid': 'S62', 'col_qid': 'S6'}),
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def test_parallel_matches_serial(self):
+        serial = run_batch(self.survey, self.jobs, max_workers=1)
+        parallel = run_batch(self.survey, self.jobs, max_workers=2)
+        self.assertEqual(list(serial), list(parallel))
+        for label in serial:
+            pd.testing.assert_frame_equal(serial[label], parallel[label])
+        # 重名的others表加任务名区分
+        self.assertIn('others', serial)
+        self.assertIn('S7_others', serial)
+
+    def test_unknown_analysis_type(self):
+        with self.assertRaises(ValueError):
+            run_batch(self.survey, [('foo', 'S6')])
+
+
+if __name__ == '__main__':
+    unittest.main()
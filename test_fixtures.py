@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+
+def make_export(n, seed=0, invalid=0.0, id_prefix='id'):
+    """
+    构造一份模拟问卷导出（列名为原始表头）：元数据列 + NPS单选题 + 分组单选题 + 满意度矩阵题 + 多选题 + 排序题
+    n: 样本数；seed: 随机种子；invalid: 无效样本比例；id_prefix: ID前缀（多个文件拼接时用于区分ID）
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'ID': [f'{id_prefix}{i}' for i in range(n)],
+        '样本状态': rng.choice(['有效', '无效'], n, p=[1 - invalid, invalid]),
+        'S2How likely are you to recommend? (Single choice)': rng.choice([str(i) for i in range(11)] + [None], n),
+        'S3What is your age? (Single choice)': rng.choice(['18-24', '25-34', '35-44'], n),
+        'S9Which market? (Single choice)': rng.choice(['UK', 'US', 'DE'], n),
+        'S62Gender (Single choice)': rng.choice(['Male', 'Female', 'Other'], n),
+        'M10How satisfied are you? (Single choice)_Sound': rng.integers(1, 6, n).astype(str),
+        'M10How satisfied are you? (Single choice)_Battery': rng.choice(['1', '2', '3', '4', '5', None], n),
+        'M11How satisfied are you? (Single choice)_App': rng.choice(['1', '2', '3', '4', '5', None], n),
+        'S6Which apply? (Multiple choice)_A': rng.choice(['A', None], n),
+        'S6Which apply? (Multiple choice)_B': rng.choice(['B', None], n),
+        'S67Please rank the factors (rank)_Price': rng.choice(['1', '2', '3', None], n),
+        'S67Please rank the factors (rank)_Quality': rng.choice(['1', '2', '3', None], n),
+    })
@@ -0,0 +1,51 @@
+import contextlib
+import io
+import unittest
+import numpy as np
+import pandas as pd
+from metrics_cal import calc_nps_by_group, nps_table, nps_from_counts
+from cross_analysis import nps_cross_table
+
+
+class TestGroupedNps(unittest.TestCase):
+    def setUp(self):
+        self.scores = pd.Series(['10', '9', '8', '7', '6', '5', '10', ' 9', None, 'x', '3', '0'])
+        self.groups = pd.Series(['B', 'A', 'A', 'B', 'B', None, 'C', 'C', 'A', 'D', 'A', 'B'])
+
+    def test_matches_per_group_nps_table(self):
+        stats = calc_nps_by_group(self.scores, self.groups)
+        # 分组顺序与unique()一致，缺失分组键不参与
+        self.assertEqual(stats.iloc[:, 0].tolist(), ['B', 'A', 'C', 'D'])
+        for _, row in stats[stats['base'] > 0].iterrows():
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = nps_table(self.scores[self.groups == row.iloc[0]])
+            self.assertEqual(row['base'], expected.iloc[0, 1])
+            self.assertEqual(f"{row['nps']:.2f}%", expected.iloc[-1, 1])
+            self.assertEqual(f"{row[10]:.2f}%", expected.iloc[11, 1])
+
+    def test_multiple_keys(self):
+        wave = pd.Series(['w1'] * 6 + ['w2'] * 6)
+        stats = calc_nps_by_group(self.scores, [self.groups, wave])
+        self.assertEqual(stats.shape[0], len(pd.DataFrame({'g': self.groups, 'w': wave}).dropna().drop_duplicates()))
+        self.assertEqual(int(stats['base'].sum()), 9)
+
+    def test_nps_from_counts_zero_base(self):
+        counts = np.zeros((2, 11))
+        counts[0, 10] = 3
+        counts[0, 0] = 1
+        stats = nps_from_counts(counts)
+        self.assertAlmostEqual(stats.loc[0, 'nps'], 50.0)
+        self.assertEqual(stats.loc[1, 'nps'], 0.0)
+
+    def test_nps_cross_table_layout(self):
+        table = nps_cross_table(self.scores, self.groups)
+        self.assertEqual(table.shape, (16, 8))
+        self.assertEqual(table.columns[0], 'B_整体调研用户')
+        self.assertEqual(table.iloc[-1, 0], 'NPS')
+        # D组只有非数字作答：保留且Base为0
+        self.assertEqual(table['D_整体调研用户'].iloc[0], 'Base: 实际样本')
+        self.assertEqual(table['D_占比/百分比'].iloc[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
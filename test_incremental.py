@@ -0,0 +1,120 @@
+import unittest
+import numpy as np
+import pandas as pd
+from Survey_Data import SurveyData
+from metric_results import NPSResult, NSSResult, RankResult, ChoiceDetailResult
+from cross_analysis import cross_analysis
+from ultis import map_income_group
+from incremental import (IncrementalSurvey, NPSStats, NSSStats, RankStats, ChoiceDetailStats, CrossStats,
+                         SufficientStats, union_add)
+from test_fixtures import make_export
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        self.full = make_export(300, 0, invalid=0.1)
+        # 第一次导出只有前200个ID，之后的导出包含全部ID
+        self.survey = SurveyData.from_frames(self.full.iloc[:200].copy())
+        self.tracker = IncrementalSurvey(self.survey)
+        self.tracker.track('nps', NPSStats('S2'))
+        self.tracker.track('nps_gender', NPSStats('S2', by='S62'))
+        self.tracker.track('nss', NSSStats('M10'))
+        self.tracker.track('rank', RankStats('S67', max_rank=3))
+        self.tracker.track('detail', ChoiceDetailStats('S6'))
+        self.tracker.track('cross', CrossStats('S2', 'S62'))
+        self.tracker.track('cross_multi', CrossStats('S6', 'S62'))
+
+    def assert_matches_full(self, survey):
+        results = self.tracker.results()
+        scores = survey.get_answers_by_qid('S2')
+        gender = survey.get_answers_by_qid('S62').iloc[:, 0]
+        expected = {
+            'nps': NPSResult.from_series(scores),
+            'nps_gender': NPSResult.from_groups(scores.iloc[:, 0], gender),
+            'nss': NSSResult.from_frame(survey.get_answers_by_qid('M10')),
+            'rank': RankResult.from_frame(survey.get_answers_by_qid('S67'), 3),
+            'detail': ChoiceDetailResult.from_frame(survey.df, list(survey.get_answers_by_qid('S6').columns)),
+        }
+        for name, result in expected.items():
+            got = results[name].values
+            pd.testing.assert_frame_equal(got.loc[result.values.index], result.values, check_dtype=False,
+                                          check_names=False)
+        pd.testing.assert_frame_equal(results['nps_gender'].render(), expected['nps_gender'].render())
+        for name, (row, col) in {'cross': ('S2', 'S62'), 'cross_multi': ('S6', 'S62')}.items():
+            full = cross_analysis(survey, row, col)
+            got = results[name].values.loc[full.index, full.columns]
+            pd.testing.assert_frame_equal(got, full, check_dtype=False, check_names=False)
+
+    def test_append_only_new_ids(self):
+        delta = self.tracker.append(self.full)
+        self.assertEqual(len(delta), 100)
+        self.assertEqual(list(delta.index), list(range(200, 300)))
+        self.assertEqual(len(self.tracker.append(self.full)), 0)
+        self.assert_matches_full(SurveyData.from_frames(self.full))
+
+    def test_prepare_rebuilds_derived_and_weights(self):
+        mapping = {'M': ['Male'], 'F': ['Female', 'Other']}
+
+        def weights_for(df):
+            return pd.Series(np.where(df['S62Gender (Single choice)'] == 'Male', 0.5, 2.0), index=df.index)
+
+        def prepare(survey):
+            gender = survey.get_answers_by_qid('S62').iloc[:, 0]
+            survey.add_derived_column('g1', map_income_group(gender, mapping), 'g1')
+            survey.set_weights(weights_for(survey.df), name='w')
+
+        prepare(self.survey)
+        tracker = IncrementalSurvey(self.survey, prepare=prepare)
+        tracker.track('nps_g1', NPSStats('S2', by='g1'))
+        tracker.track('nss', NSSStats('M10'))
+        tracker.append(self.full, valid_only=True)
+        added = self.full.iloc[200:]
+        self.assertEqual(len(self.survey.df), 200 + (added['样本状态'] == '有效').sum())
+        self.assertFalse(self.survey.df['g1'].isna().any())
+
+        # 与对全部样本重新计算的结果一致
+        full = SurveyData.from_frames(self.survey.df[list(self.full.columns)].copy())
+        prepare(full)
+        expected = NPSResult.from_groups(full.get_answers_by_qid('S2').iloc[:, 0], full.df['g1'], weights=full.weights)
+        got = tracker.result('nps_g1').values.loc[expected.values.index]
+        pd.testing.assert_frame_equal(got, expected.values, check_dtype=False, check_names=False)
+        answered = full.get_answers_by_qid('S2').iloc[:, 0].notna().to_numpy()
+        self.assertAlmostEqual(got['base'].sum(), full.weights[answered].sum())
+        expected = NSSResult.from_frame(full.get_answers_by_qid('M10'), weights=full.weights)
+        pd.testing.assert_frame_equal(tracker.result('nss').values, expected.values, check_dtype=False)
+
+    def test_derived_dependency_without_prepare_raises(self):
+        self.survey.add_derived_column('g1', self.survey.df['S62Gender (Single choice)'], 'g1')
+        tracker = IncrementalSurvey(self.survey)
+        tracker.track('nps_g1', NPSStats('S2', by='g1'))
+        with self.assertRaises(ValueError):
+            tracker.append(self.full)
+        self.assertEqual(len(self.survey.df), 200)
+
+    def test_merge_stats(self):
+        first = NPSStats('S2', by='S62').update(SurveyData.from_frames(self.full.iloc[:120]))
+        second = NPSStats('S2', by='S62').update(SurveyData.from_frames(self.full.iloc[120:]))
+        merged = (first + second).result()
+        expected = NPSResult.from_groups(self.full['S2How likely are you to recommend? (Single choice)'],
+                                          self.full['S62Gender (Single choice)'])
+        pd.testing.assert_frame_equal(merged.values.loc[expected.values.index], expected.values,
+                                      check_dtype=False, check_names=False)
+
+    def test_stats_subclass_must_implement_collect_and_result(self):
+        class Incomplete(SufficientStats):
+            def qids(self):
+                return ['S2']
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_union_add_keeps_order(self):
+        left = pd.DataFrame({'a': [1, 2]}, index=['x', 'y'])
+        right = pd.DataFrame({'b': [3], 'a': [4]}, index=['z'])
+        total = union_add(left, right)
+        self.assertEqual(list(total.index), ['x', 'y', 'z'])
+        self.assertEqual(list(total.columns), ['a', 'b'])
+        self.assertEqual(total.loc['z', 'a'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from job_spec import validate_job_spec, load_job_spec, run_job_spec
+from main import main
+from test_fixtures import make_export
+
+
+class TestJobSpec(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.frames = []
+        for i in range(2):
+            frame = make_export(200, i, invalid=0.3, id_prefix=f'w{i}_')
+            frame.to_excel(os.path.join(self.tmp_dir, f'wave{i + 1}.xlsx'), index=False)
+            self.frames.append(frame)
+        self.spec = {
+            'output_dir': 'out',
+            'max_workers': 2,
+            'datasets': [{
+                'name': 'UK',
+                'files': {'W1': 'wave1.xlsx', 'W2': 'wave2.xlsx'},
+                'filters': [{'qid': 'S9', 'in': ['UK']}],
+                'derived': [{'type': 'map', 'qid': 'S3', 'name': 'age2',
+                             'mapping': {'young': ['18-24', '25-34'], 'old': ['35-44']}}],
+            }],
+            'analyses': [
+                {'type': 'nps', 'qids': ['S2']},
+                {'type': 'cross', 'row_qid': 'S2', 'col_qid': 'age2', 'is_nps': True, 'name': 'nps_by_age'},
+                {'type': 'tab_book', 'stub_qids': ['S3'], 'banner_qids': ['wave']},
+                {'type': 'factor', 'nps_qid': 'S2', 'factor_qids': ['M10']},
+            ],
+        }
+        self.spec_path = os.path.join(self.tmp_dir, 'job.json')
+        with open(self.spec_path, 'w', encoding='utf-8') as f:
+            json.dump(self.spec, f, ensure_ascii=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_validation_lists_all_errors(self):
+        spec = load_job_spec(self.spec_path)
+        spec['datasets'].append({'name': 'UK', 'files': 'missing.xlsx', 'filters': [{'qid': 'S9'}]})
+        spec['analyses'] += [{'type': 'cross', 'row_qid': 'S2'}, {'type': 'pie'}, {'type': 'nps', 'qids': ['S2'], 'datasets': ['DE']}]
+        with self.assertRaises(ValueError) as ctx:
+            validate_job_spec(spec)
+        message = str(ctx.exception)
+        for part in ['missing.xlsx', 'filters[0]', '名称重复', 'col_qid', 'pie', '未定义的数据集DE']:
+            self.assertIn(part, message)
+
+    def test_run_writes_workbooks(self):
+        paths = run_job_spec(load_job_spec(self.spec_path), show_print=False)
+        self.assertEqual([os.path.basename(p) for p in paths],
+                         ['UK_nps_S2.xlsx', 'UK_nps_by_age.xlsx', 'UK_tab_book_S3_wave.xlsx', 'UK_factor_S2_M10.xlsx'])
+        self.assertTrue(all(os.path.isfile(p) for p in paths))
+        # 只保留两个波次中的有效UK样本
+        valid = pd.concat(self.frames)
+        valid = valid[(valid['样本状态'] == '有效') & (valid['S9Which market? (Single choice)'] == 'UK')]
+        nps = pd.read_excel(paths[0], sheet_name=None)
+        scores = pd.to_numeric(valid['S2How likely are you to recommend? (Single choice)']).dropna()
+        expected = ((scores >= 9).mean() - (scores <= 6).mean()) * 100
+        self.assertIn(f'{expected:.2f}', nps[next(iter(nps))].to_string())
+        self.assertIn(str(len(scores)), nps[next(iter(nps))].to_string())
+
+    def test_percent_only_for_single_choice_rows(self):
+        spec = load_job_spec(self.spec_path)
+        spec['analyses'] = [{'type': 'cross', 'row_qid': 'S2', 'col_qid': 'S3', 'is_nps': True, 'percent': True}]
+        with self.assertRaisesRegex(ValueError, 'percent'):
+            validate_job_spec(spec)
+        spec['analyses'] = [{'type': 'cross', 'row_qid': 'S6', 'col_qid': 'S3', 'percent': True}]
+        with self.assertRaisesRegex(ValueError, 'S6为M题'):
+            run_job_spec(spec, show_print=False)
+        spec['analyses'] = [{'type': 'cross', 'row_qid': 'S3', 'col_qid': 'S6', 'percent': True}]
+        table = pd.read_excel(run_job_spec(spec, show_print=False)[0], index_col=0)
+        self.assertEqual(table.loc['Base', '总计'], table.loc['Base', ['A', 'B']].sum())
+        self.assertTrue(table.drop('Base')['总计'].str.endswith('%').all())
+
+    def test_cli_check_and_unknown_qid(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertEqual(main([self.spec_path, '--check']), 0)
+        self.assertIn('配置有效', out.getvalue())
+        self.spec['analyses'] = [{'type': 'nss', 'qids': ['M99']}]
+        with open(self.spec_path, 'w', encoding='utf-8') as f:
+            json.dump(self.spec, f, ensure_ascii=False)
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            self.assertEqual(main([self.spec_path]), 2)
+        self.assertIn('M99', err.getvalue())
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, 'out', 'UK_nss_M99.xlsx')))
+
+
+if __name__ == '__main__':
+    unittest.main()
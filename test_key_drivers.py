@@ -0,0 +1,117 @@
+import itertools
+import math
+import unittest
+import numpy as np
+import pandas as pd
+from Survey_Data import SurveyData
+from key_drivers import calc_driver_stats, calc_key_drivers, driver_correlation, key_driver_analysis, shapley_sampled, sweep
+
+
+def make_drivers(n, p, seed, missing=0.0):
+    rng = np.random.default_rng(seed)
+    x = 0.6 * rng.normal(size=(n, 1)) + rng.normal(size=(n, p))
+    y = x @ rng.uniform(0, 1, p) + rng.normal(size=n) * 2
+    scores = np.clip(np.rint((y - y.min()) / (y.max() - y.min()) * 10), 0, 10)
+    x = np.where(rng.random((n, p)) < missing, np.nan, x)
+    return pd.DataFrame(x, columns=[f'f{i}' for i in range(p)]), pd.Series(scores)
+
+
+def refit_r2(x, y, cols):
+    if not cols:
+        return 0.0
+    design = np.c_[np.ones(len(x)), x[:, cols]]
+    resid = y - design @ np.linalg.lstsq(design, y, rcond=None)[0]
+    return 1 - resid.var() / y.var()
+
+
+class TestKeyDrivers(unittest.TestCase):
+    def test_matches_refitted_regressions(self):
+        factors, scores = make_drivers(2000, 5, 0)
+        stats, info = calc_driver_stats(factors, scores)
+        x, y = factors.to_numpy(), scores.to_numpy()
+        self.assertAlmostEqual(info['r2'], refit_r2(x, y, list(range(5))))
+        z = (x - x.mean(axis=0)) / x.std(axis=0)
+        beta = np.linalg.lstsq(z, (y - y.mean()) / y.std(), rcond=None)[0]
+        np.testing.assert_allclose(stats['beta'], beta, atol=1e-10)
+        # 精确Shapley与逐个子集重新拟合的结果一致
+        p = 5
+        shapley = np.zeros(p)
+        for j in range(p):
+            others = [k for k in range(p) if k != j]
+            for r in range(p):
+                for subset in itertools.combinations(others, r):
+                    weight = math.factorial(r) * math.factorial(p - r - 1) / math.factorial(p)
+                    shapley[j] += weight * (refit_r2(x, y, [*subset, j]) - refit_r2(x, y, list(subset)))
+        np.testing.assert_allclose(stats['shapley'], shapley, atol=1e-10)
+        self.assertAlmostEqual(stats['relative_weight'].sum(), info['r2'])
+        self.assertAlmostEqual(stats['shapley_pct'].sum(), 100)
+
+    def test_sampled_shapley(self):
+        factors, scores = make_drivers(2000, 8, 1)
+        exact, info = calc_driver_stats(factors, scores, shapley='exact')
+        sampled, _ = calc_driver_stats(factors, scores, shapley='sampled', n_perm=2000, seed=0)
+        self.assertAlmostEqual(sampled['shapley'].sum(), info['r2'])
+        np.testing.assert_allclose(sampled['shapley'], exact['shapley'], atol=5 * sampled['shapley_se'].max())
+
+    def test_sampled_shapley_cache(self):
+        # 按子集缓存R²只省去重复sweep，结果与每个排列从头计算一致
+        factors, scores = make_drivers(500, 6, 2)
+        corr = np.corrcoef(np.c_[factors.to_numpy(), scores.to_numpy()], rowvar=False)
+        p = factors.shape[1]
+        order_rng = np.random.default_rng(4)
+        draws = []
+        for _ in range(50):
+            order = order_rng.permutation(p)
+            draw = np.zeros(p)
+            for perm in (order, order[::-1]):
+                matrix, previous = corr.copy(), 0.0
+                for k in perm:
+                    sweep(matrix, k)
+                    draw[k] += (1.0 - matrix[p, p] - previous) / 2
+                    previous = 1.0 - matrix[p, p]
+            draws.append(draw)
+        shapley, _ = shapley_sampled(corr, n_perm=100, seed=4)
+        np.testing.assert_allclose(shapley, np.mean(draws, axis=0))
+
+    def test_pairwise_correlation(self):
+        factors, _ = make_drivers(500, 3, 2, missing=0.2)
+        corr, _, n = driver_correlation(factors.to_numpy(), missing='pairwise')
+        expected = factors.corr()
+        np.testing.assert_allclose(corr, expected.to_numpy(), atol=1e-10)
+        self.assertEqual(n[0, 1], factors[['f0', 'f1']].dropna().shape[0])
+
+    def test_survey_by_group(self):
+        factors, scores = make_drivers(900, 3, 3)
+        rng = np.random.default_rng(3)
+        df = pd.DataFrame({
+            'ID': range(900), '样本状态': '有效',
+            'S2How likely are you to recommend? (Single choice)': scores.astype(int).astype(str),
+            'S9Which market? (Single choice)': rng.choice(['UK', 'US'], 900),
+        })
+        for i, name in enumerate(['Sound', 'Battery', 'App']):
+            df[f'M10How satisfied are you? (Single choice)_{name}'] = factors[f'f{i}']
+        survey = SurveyData.from_frames(df)
+        result = key_driver_analysis(survey, 'S2', 'M10', by='S9', as_result=True)['S2']
+        self.assertEqual(result.groups(), list(df['S9Which market? (Single choice)'].unique()))
+        uk = result.group('UK')
+        mask = (df['S9Which market? (Single choice)'] == 'UK').to_numpy()
+        expected, info = calc_driver_stats(factors[mask], scores[mask])
+        np.testing.assert_allclose(uk.values['shapley'], expected['shapley'])
+        self.assertAlmostEqual(uk.meta['model'].loc['UK', 'r2'], info['r2'])
+        self.assertEqual(list(uk.render()['因子']), ['Sound', 'Battery', 'App'])
+        self.assertIn('分组', result.render().columns)
+
+    def test_skip_small_group(self):
+        factors, scores = make_drivers(300, 3, 5)
+        by = pd.Series(['UK'] * 296 + ['DE'] * 4)
+        values, model = calc_key_drivers(factors, scores, by=by)
+        self.assertEqual(list(values['group'].unique()), ['UK'])
+        self.assertEqual(model.loc['UK', 'note'], '')
+        self.assertTrue(np.isnan(model.loc['DE', 'r2']))
+        self.assertIn('exclude', model.loc['DE', 'note'])
+        with self.assertRaisesRegex(ValueError, 'DE'):
+            calc_key_drivers(factors[-4:], scores[-4:], by=by[-4:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import contextlib
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from Survey_Data import SurveyData
+from metric_results import MetricResult, NPSResult, NSSResult, RankResult, ChoiceDetailResult, CrossTabResult
+from metrics_cal import calc_nss_table, rank_table, calc_nss_detail
+from cross_analysis import nps_cross_table
+import analysis
+from test_cross_tables import write_multi_excel
+
+
+class TestMetricResults(unittest.TestCase):
+    def setUp(self):
+        self.scores = pd.Series(['10', '9', '8', '7', '6', '5', '10', ' 9', None, 'x', '3', '0'])
+        self.groups = pd.Series(['B', 'A', 'A', 'B', 'B', None, 'C', 'C', 'A', 'D', 'A', 'B'])
+        self.grid = pd.DataFrame({'Q1': [5, 4, 3, 2, 1, 5], 'Q2': ['5', '5', '4', None, '3', 'x']})
+
+    def test_nps_values_are_numeric(self):
+        result = NPSResult.from_series(self.scores)
+        self.assertEqual(result.base.iloc[0], 10)
+        self.assertAlmostEqual(result.values['pct_recommend'].iloc[0], 40.0)
+        self.assertAlmostEqual(result.nps.iloc[0], 0.0)
+        table = result.render()
+        self.assertEqual(table.iloc[12, 1], '40.00%')
+        self.assertEqual(table.iloc[0, 1], 10)
+
+    def test_nps_empty_series(self):
+        table = NPSResult.from_series(pd.Series(['a', None])).render()
+        self.assertEqual(table.iloc[0, 1], 0)
+        self.assertEqual(table.iloc[-1, 1], '0.00%')
+
+    def test_grouped_nps_renders_cross_table(self):
+        result = NPSResult.from_groups(self.scores, self.groups)
+        self.assertEqual(list(result.values.index), ['B', 'A', 'C', 'D'])
+        pd.testing.assert_frame_equal(result.render(), nps_cross_table(self.scores, self.groups))
+
+    def test_render_is_cached_copy(self):
+        result = NSSResult.from_frame(self.grid)
+        table = result.render()
+        table.iloc[0, 0] = 'changed'
+        pd.testing.assert_frame_equal(result.render(), calc_nss_table(self.grid))
+
+    def test_subclass_without_render_fails_on_creation(self):
+        class Incomplete(MetricResult):
+            pass
+        with self.assertRaises(TypeError):
+            Incomplete(pd.DataFrame())
+
+    def test_rank_and_detail_render_like_tables(self):
+        pd.testing.assert_frame_equal(RankResult.from_frame(self.grid, 5).render(), rank_table(self.grid, 5, None))
+        self.assertEqual(RankResult.from_frame(self.grid, None).meta['max_rank'], 5)
+        detail = ChoiceDetailResult.from_frame(self.grid, ['Q1', 'Q2'], {'Q1': '问题1'})
+        self.assertEqual(detail.base, 6)
+        self.assertAlmostEqual(detail.values.loc['Q2', 'pct'], 5 / 6 * 100)
+        pd.testing.assert_frame_equal(detail.render(), calc_nss_detail(self.grid, ['Q1', 'Q2'], {'Q1': '问题1'}))
+
+    def test_crosstab_percent(self):
+        counts = pd.DataFrame({'A': [3, 1], 'B': [1, 1]}, index=['x', 'y'])
+        table = CrossTabResult(counts).render_percent()
+        self.assertEqual(table.loc['Base', '总计'], 6)
+        self.assertEqual(table.loc['x', 'A'], '75.00%')
+        self.assertEqual(table.loc['x', '总计'], '66.67%')
+        # values不受渲染影响
+        self.assertEqual(counts.loc['x', 'A'], 3)
+
+    def test_results_are_picklable(self):
+        result = NPSResult.from_groups(self.scores, self.groups)
+        restored = pickle.loads(pickle.dumps(result))
+        pd.testing.assert_frame_equal(restored.values, result.values)
+
+
+class TestAnalysisAsResult(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(cls.tmp_dir, 'multi.xlsx')
+        write_multi_excel(path)
+        cls.survey = SurveyData(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def test_handlers_return_results(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = analysis.nss_detail_analysis(self.survey, 'S6', as_result=True)['S6']
+            table = analysis.nss_detail_analysis(self.survey, 'S6')['S6']
+            cross = analysis.cross_analysis_handler(self.survey, {'row_qid': 'S62', 'col_qid': 'S6'}, as_result=True)
+        self.assertIsInstance(result, ChoiceDetailResult)
+        pd.testing.assert_frame_equal(result.render(), table)
+        cross = next(iter(cross.values()))
+        self.assertIsInstance(cross, CrossTabResult)
+        self.assertTrue(np.issubdtype(cross.values.to_numpy().dtype, np.number))
+
+
+if __name__ == '__main__':
+    unittest.main()
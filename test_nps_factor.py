@@ -0,0 +1,58 @@
+import unittest
+import numpy as np
+import pandas as pd
+from Survey_Data import SurveyData
+from nps_factor import factor_analysis, calc_factor_means, nps_segment_codes, FactorResult
+from test_fixtures import make_export
+
+
+class TestNPSFactor(unittest.TestCase):
+    def setUp(self):
+        self.df = make_export(600, 0)
+        self.survey = SurveyData.from_frames(self.df.copy())
+        self.scores = pd.to_numeric(self.df['S2How likely are you to recommend? (Single choice)'])
+        self.market = self.df['S9Which market? (Single choice)']
+
+    def test_segment_codes(self):
+        codes = nps_segment_codes(pd.Series(['10', '9', '8', '7', '6', '0', None, 'x']))
+        self.assertEqual(list(codes), [0, 0, 1, 1, 2, 2, -1, -1])
+
+    def test_means_match_slices_per_market(self):
+        result = factor_analysis(self.survey, 'S2', ['M10', 'M11'], by='S9', as_result=True)['S2']
+        self.assertEqual(result.groups(), list(self.market.unique()))
+        segments = {'promoter': self.scores >= 9, 'passive': self.scores.between(7, 8), 'detractor': self.scores <= 6}
+        for row in result.values.itertuples():
+            ratings = pd.to_numeric(self.df[row.factor])
+            for seg, mask in segments.items():
+                part = ratings[mask & (self.market == row.group)].dropna()
+                self.assertAlmostEqual(getattr(row, f'{seg}_mean'), part.mean())
+                self.assertEqual(getattr(row, f'{seg}_n'), len(part))
+        # 每个市场内按中位数分割，象限都有值
+        self.assertTrue((result.values['quadrant'] != '').all())
+        self.assertEqual(len(result.meta['splits']), 3)
+        self.assertIn('分组', result.render().columns)
+        uk = result.group('UK')
+        self.assertEqual(len(uk.values), 3)
+        self.assertNotIn('分组', uk.render().columns)
+
+    def test_quadrants_and_labels(self):
+        factors = pd.DataFrame({'a': [5, 5, 1, 1], 'b': [1, 1, 5, 5], 'c': [5, 5, 5, 5], 'd': [1, 1, 1, 1]})
+        scores = pd.Series([10, 9, 0, 3])
+        values = calc_factor_means(factors, scores, names={'a': '因子A'})
+        self.assertEqual(list(values['quadrant']), ['愉悦因子', '激怒因子', '必备因子', '无差异因子'])
+        self.assertEqual(values['name'].iloc[0], '因子A')
+        table = factor_analysis(self.survey, 'S2', 'M10', label_map={'Sound': '音质'}, exclude=['Battery'])['S2']
+        self.assertEqual(list(table['因子']), ['音质'])
+
+    def test_weighted(self):
+        weights = np.random.default_rng(1).uniform(0.5, 2, len(self.df))
+        result = FactorResult.from_frames(self.survey.get_answers_by_qid('M10'), self.scores, weights=weights)
+        ratings = pd.to_numeric(self.df['M10How satisfied are you? (Single choice)_Sound'])
+        mask = (self.scores >= 9) & ratings.notna()
+        expected = np.average(ratings[mask], weights=weights[mask.to_numpy()])
+        self.assertAlmostEqual(result.values['promoter_mean'].iloc[0], expected)
+        self.assertAlmostEqual(result.values['promoter_n'].iloc[0], weights[mask.to_numpy()].sum())
+
+
+if __name__ == '__main__':
+    unittest.main()
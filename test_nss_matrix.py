@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+import pandas as pd
+from metrics_cal import calc_nss_from_series, calc_nss_matrix, calc_nss_table, format_nss_table
+
+
+class TestNssMatrix(unittest.TestCase):
+    def setUp(self):
+        self.grid = pd.DataFrame({
+            'M10_a': ['5', '4', '3', None, '1', 'x'],
+            'M10_b': [5, 5, 4, 2, np.nan, 6],
+            'M10_c': [None] * 6,
+        })
+
+    def test_matches_per_column_calc(self):
+        stats = calc_nss_matrix(self.grid)
+        self.assertEqual(list(stats.index), list(self.grid.columns))
+        for col in ['M10_a', 'M10_b']:
+            nss, score_pct, t2b, mean_v = calc_nss_from_series(self.grid[col])
+            self.assertAlmostEqual(stats.loc[col, 'nss'], nss)
+            self.assertAlmostEqual(stats.loc[col, 't2b'], t2b)
+            self.assertAlmostEqual(stats.loc[col, 'mean'], mean_v)
+            for score in [1, 2, 3, 4, 5]:
+                self.assertAlmostEqual(stats.loc[col, score], score_pct.loc[score])
+        # 6分计入分母但不属于任何1~5档
+        self.assertEqual(stats.loc['M10_b', 'base'], 5)
+
+    def test_weighted_accepts_single_column_frame(self):
+        weights = np.array([1, 2, 1, 1, 3, 1])
+        from_series = calc_nss_from_series(self.grid['M10_a'], weights=weights)
+        from_frame = calc_nss_from_series(self.grid[['M10_a']], weights=weights)
+        self.assertAlmostEqual(from_series[0], from_frame[0])
+        self.assertAlmostEqual(from_frame[3], np.average([5, 4, 3, 1], weights=[1, 2, 1, 3]))
+        self.assertEqual(calc_nss_from_series(self.grid[['M10_a']], weights=np.ones(6))[0],
+                         calc_nss_from_series(self.grid[['M10_a']])[0])
+
+    def test_empty_column_is_zero(self):
+        stats = calc_nss_matrix(self.grid)
+        self.assertEqual(stats.loc['M10_c', 'base'], 0)
+        self.assertTrue((stats.loc['M10_c'] == 0).all())
+
+    def test_table_formatting(self):
+        table = calc_nss_table(self.grid, short_names={'M10_a': '外观'})
+        self.assertEqual(table.shape, (3, 10))
+        self.assertEqual(table.iloc[0, 0], '外观')
+        self.assertEqual(table.iloc[0, 1], 4)
+        self.assertEqual(table.loc[0, 'T2B (4/5分%)'], '50.00%')
+        self.assertEqual(table.loc[0, '满意度平均分'], '3.25')
+        pd.testing.assert_frame_equal(format_nss_table(calc_nss_matrix(self.grid)), calc_nss_table(self.grid))
+
+
+if __name__ == '__main__':
+    unittest.main()
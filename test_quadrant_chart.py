@@ -0,0 +1,76 @@
+import importlib.util
+import io
+import unittest
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from PIL import Image
+from nps_factor import FactorResult
+from quadrant_chart import quadrant_jobs, render_quadrant, render_quadrants, resolve_label_positions
+from ultis import tables_to_excel_bytes
+
+HAS_MATPLOTLIB = importlib.util.find_spec('matplotlib') is not None
+
+
+def overlaps(pos, sizes):
+    dx = np.abs(np.subtract.outer(pos[:, 0], pos[:, 0]))
+    dy = np.abs(np.subtract.outer(pos[:, 1], pos[:, 1]))
+    w = np.add.outer(sizes[:, 0], sizes[:, 0]) / 2
+    h = np.add.outer(sizes[:, 1], sizes[:, 1]) / 2
+    return ((dx < w - 1e-12) & (dy < h - 1e-12) & ~np.eye(len(pos), dtype=bool)).sum()
+
+
+def make_result(seed=0):
+    rng = np.random.default_rng(seed)
+    factors = pd.DataFrame(rng.integers(1, 6, (400, 6)).astype(float), columns=[f'因子{i}' for i in range(6)])
+    scores = pd.Series(rng.integers(0, 11, 400))
+    market = pd.Series(rng.choice(['UK', 'US'], 400))
+    return FactorResult.from_frames(factors, scores, by=market)
+
+
+class TestQuadrantChart(unittest.TestCase):
+    def test_label_solver(self):
+        rng = np.random.default_rng(0)
+        anchors = rng.uniform(0.3, 0.7, (30, 2))
+        anchors[1] = anchors[0]
+        sizes = np.tile([0.08, 0.04], (30, 1))
+        pos = resolve_label_positions(anchors, sizes)
+        self.assertEqual(overlaps(pos, sizes), 0)
+        self.assertTrue(((pos >= sizes / 2 - 1e-12) & (pos <= 1 - sizes / 2 + 1e-12)).all())
+        np.testing.assert_array_equal(pos, resolve_label_positions(anchors, sizes))
+        # 不重叠的标签保持在气泡上
+        apart = np.array([[0.2, 0.2], [0.8, 0.8]])
+        np.testing.assert_array_equal(resolve_label_positions(apart, sizes[:2]), apart)
+
+    def test_jobs_per_group(self):
+        result = make_result()
+        self.assertEqual(list(quadrant_jobs(result)), result.groups())
+        jobs = quadrant_jobs({'投影仪': result, '音箱': result.group('UK')})
+        self.assertEqual(sorted(jobs), ['投影仪_UK', '投影仪_US', '音箱'])
+        self.assertEqual(jobs['投影仪_UK'].values['group'].unique().tolist(), ['UK'])
+
+    def test_excel_images(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, format='PNG')
+        tables = {'因子均分': pd.DataFrame({'a': [1, 2]})}
+        for engine in ('xlsxwriter', 'openpyxl'):
+            data = tables_to_excel_bytes(tables, engine=engine, images={'UK四象限': buffer.getvalue()})
+            book = load_workbook(io.BytesIO(data))
+            self.assertEqual(book.sheetnames, ['因子均分', 'UK四象限'])
+            self.assertEqual(len(book['UK四象限']._images), 1)
+
+    @unittest.skipUnless(HAS_MATPLOTLIB, 'matplotlib未安装')
+    def test_render(self):
+        result = make_result()
+        png = render_quadrant(result.group('UK'))
+        self.assertTrue(png.startswith(b'\x89PNG'))
+        self.assertEqual(png, render_quadrant(result.group('UK')))
+        svgs = render_quadrants(result, fmt='svg')
+        self.assertEqual(set(svgs), set(result.groups()))
+        self.assertIn(b'<svg', svgs['UK'])
+        with self.assertRaises(ValueError):
+            render_quadrant(result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+import pandas as pd
+from metrics_cal import rank_table, rank_counts_matrix
+from ultis import to_numeric_matrix
+
+
+class TestRankTable(unittest.TestCase):
+    def setUp(self):
+        self.rank_df = pd.DataFrame({
+            'Option1': ['1', '2', '6', None, '1', 'x'],
+            'Option2': ['2', '1', '1', '2', None, '7'],
+            'Option3': [3, 3, 2, 1, 2, 2.5],
+        })
+
+    def test_counts_match_per_rank_comparison(self):
+        ranks = to_numeric_matrix(self.rank_df)
+        counts = rank_counts_matrix(ranks, 7)
+        for j, col in enumerate(self.rank_df.columns):
+            ser = pd.to_numeric(self.rank_df[col], errors='coerce')
+            self.assertEqual(counts[j].tolist(), [(ser == i).sum() for i in range(1, 8)])
+
+    def test_max_rank_is_honoured(self):
+        table = rank_table(self.rank_df, 7, list(self.rank_df.columns))
+        self.assertEqual(table.shape, (3, 2 + 7 + 2))
+        self.assertEqual(table.columns[1], '计数样本(排序前7)')
+        self.assertEqual(table.loc[0, '重要性排序第6/计数'], 1)
+        # 非数字作答不计入计数样本
+        self.assertEqual(table.loc[0, '计数样本(排序前7)'], 4)
+
+    def test_default_and_custom_weights(self):
+        table = rank_table(self.rank_df, 3, None)
+        # Option1: 第1名2次、第2名1次 -> (2*3 + 1*2) / 6
+        self.assertEqual(table.loc[0, '赋值后重要性index'], f"{8 / 6 * 100:.2f}%")
+        table = rank_table(self.rank_df, 3, None, rank_weights=[1, 0, 0])
+        self.assertEqual(table.loc[0, '赋值后重要性index'], f"{2 / 6 * 100:.2f}%")
+        with self.assertRaises(ValueError):
+            rank_table(self.rank_df, 3, None, rank_weights=[1, 0])
+
+    def test_infer_max_rank(self):
+        table = rank_table(self.rank_df, None, None)
+        self.assertEqual(table.columns[1], '计数样本(排序前7)')
+
+    def test_categorical_columns(self):
+        cat_df = self.rank_df.astype(str).replace('None', np.nan).astype('category')
+        pd.testing.assert_frame_equal(rank_table(cat_df, 5, None), rank_table(self.rank_df, 5, None), check_dtype=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import math
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import numpy as np
+import pandas as pd
+from Survey_Data import SurveyData
+from significance import (chi2_sf, chi_square_many, chi_square_test, column_letters, column_proportion_tests,
+                          flag_percent_table, nps_difference_tests, tab_book_flags, two_sided_p)
+from metric_results import CrossTabResult
+from tab_book import build_tab_book
+from test_cross_tables import write_multi_excel
+
+
+class TestSignificance(unittest.TestCase):
+    def setUp(self):
+        self.cross_tab = pd.DataFrame({'M': [100, 60, 40], 'F': [100, 40, 60], 'Total': [200, 100, 100]},
+                                      index=['Base', 'yes', 'no'])
+
+    def test_distribution_functions(self):
+        self.assertAlmostEqual(float(two_sided_p(1.959963984540054)), 0.05, places=6)
+        x = np.array([0.1, 2.0, 9.0, 30.0])
+        np.testing.assert_allclose(chi2_sf(x, 1), [math.erfc(math.sqrt(v / 2)) for v in x], rtol=1e-9)
+        np.testing.assert_allclose(chi2_sf(x, 2), np.exp(-x / 2), rtol=1e-9)
+        self.assertAlmostEqual(float(chi2_sf(10, 4)[0]), 0.0404276819945128, places=9)
+
+    def test_column_proportion_flags(self):
+        tests = column_proportion_tests(self.cross_tab)
+        self.assertEqual(tests['letters'], {'M': 'A', 'F': 'B'})
+        self.assertEqual(tests['flags'].loc['yes', 'M'], 'B')
+        self.assertEqual(tests['flags'].loc['yes', 'F'], '')
+        self.assertAlmostEqual(tests['p_values'].loc[('yes', 'M'), 'F'], 0.0046777, places=5)
+        self.assertTrue(np.isnan(tests['p_values'].loc[('yes', 'M'), 'M']))
+        # Base不足的列不参与比较
+        tests = column_proportion_tests(self.cross_tab, min_base=150)
+        self.assertEqual(tests['flags'].loc['yes', 'M'], '')
+
+    def test_chi_square_matches_z_for_2x2(self):
+        result = chi_square_test(self.cross_tab)
+        self.assertEqual(result['df'], 1)
+        self.assertAlmostEqual(result['statistic'], 8.0)
+        self.assertAlmostEqual(result['p_value'], 0.0046777, places=5)
+
+    def test_chi_square_many_is_fast(self):
+        rng = np.random.default_rng(0)
+        tables = [rng.integers(0, 50, (6, 5)) for _ in range(2000)]
+        start = time.time()
+        result = chi_square_many(tables)
+        self.assertEqual(len(result), 2000)
+        self.assertLess(time.time() - start, 5)
+        self.assertTrue(result['p_value'].between(0, 1).all())
+
+    def test_nps_difference(self):
+        scores = pd.Series(['10'] * 50 + ['0'] * 50 + ['10'] * 80 + ['0'] * 20)
+        groups = pd.Series(['a'] * 100 + ['b'] * 100)
+        tests = nps_difference_tests(scores, groups)
+        self.assertEqual(tests['flags'].tolist(), ['', 'A'])
+        self.assertLess(tests['p_values'].loc['b', 'a'], 0.05)
+
+    def test_flag_percent_table_and_result(self):
+        table = flag_percent_table(self.cross_tab)
+        self.assertEqual(table.loc['yes', 'M (A)'], '60.00% B')
+        self.assertEqual(table.loc['yes', 'F (B)'], '40.00%')
+        tests = CrossTabResult(self.cross_tab).significance()
+        self.assertEqual(tests['chi_square']['df'], 1)
+
+    def test_letters(self):
+        self.assertEqual(column_letters(28)[-3:], ['Z', 'AA', 'AB'])
+
+
+class TestTabBookFlags(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(cls.tmp_dir, 'multi.xlsx')
+        write_multi_excel(path)
+        cls.survey = SurveyData(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def test_flags_per_banner(self):
+        tables = build_tab_book(self.survey, ['S6'], ['S7', 'S62'])
+        flags = tab_book_flags(tables)['S6']
+        self.assertEqual(list(flags.columns.get_level_values(0).unique()), ['S7', 'S62'])
+        self.assertEqual(list(flags.index), ['A', 'B', 'C'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+import pandas as pd
+import Survey_Data
+from Survey_Data import SurveyData, get_cache_stats, reset_cache_stats
+
+
+def write_test_excel(path):
+    # 构造一个小问卷：元数据列 + NPS单选题 + 多选题(含填空) + 排序题
+    df = pd.DataFrame({
+        'ID': ['a1', 'a2', 'a3', 'a4'],
+        '样本状态': ['有效', '有效', '无效', '有效'],
+        'S2How likely are you to recommend? (Single choice)': ['10', '9', '3', '6'],
+        'S6Which of the following? (Multiple choice)_Option A': ['Option A', None, 'Option A', None],
+        'S6Which of the following? (Multiple choice)_Option B': [None, 'Option B', 'Option B', None],
+        'S6Which of the following? (Multiple choice)_填空1': [None, None, 'some text', None],
+        'S67Please rank the factors (rank)_Price': ['1', '2', None, '1'],
+        'S67Please rank the factors (rank)_Quality': ['2', '1', '1', None],
+    })
+    df.to_excel(path, index=False)
+    return df
+
+
+class TestSurveyDataCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.xlsx = os.path.join(self.tmp_dir, 'survey.xlsx')
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        write_test_excel(self.xlsx)
+        reset_cache_stats()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_second_load_hits_cache(self):
+        first = SurveyData(self.xlsx, cache_dir=self.cache_dir)
+        self.assertFalse(first.cache_hit)
+        second = SurveyData(self.xlsx, cache_dir=self.cache_dir)
+        self.assertTrue(second.cache_hit)
+        self.assertEqual(first.source_hash, second.source_hash)
+        pd.testing.assert_frame_equal(first.df, second.df)
+        pd.testing.assert_frame_equal(first.qinfo, second.qinfo)
+        stats = get_cache_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertAlmostEqual(stats['hit_rate'], 0.5)
+
+    def test_cache_matches_plain_load(self):
+        plain = SurveyData(self.xlsx)
+        SurveyData(self.xlsx, cache_dir=self.cache_dir)
+        cached = SurveyData(self.xlsx, cache_dir=self.cache_dir)
+        pd.testing.assert_frame_equal(plain.df, cached.df)
+
+    def test_cache_skips_excel_parsing_on_hit(self):
+        SurveyData(self.xlsx, cache_dir=self.cache_dir)
+        with mock.patch.object(SurveyData, 'read_excel', side_effect=AssertionError("命中缓存时不应解析Excel")):
+            cached = SurveyData(self.xlsx, cache_dir=self.cache_dir)
+        self.assertTrue(cached.cache_hit)
+
+    def test_modified_file_invalidates_cache(self):
+        SurveyData(self.xlsx, cache_dir=self.cache_dir)
+        df = pd.read_excel(self.xlsx, dtype=str)
+        df.loc[0, 'ID'] = 'changed'
+        time.sleep(0.01)
+        df.to_excel(self.xlsx, index=False)
+        reloaded = SurveyData(self.xlsx, cache_dir=self.cache_dir)
+        self.assertFalse(reloaded.cache_hit)
+        self.assertEqual(reloaded.df.loc[0, 'ID'], 'changed')
+
+    def test_file_like_source(self):
+        with open(self.xlsx, 'rb') as f:
+            SurveyData(f, cache_dir=self.cache_dir)
+        with open(self.xlsx, 'rb') as f:
+            cached = SurveyData(f, cache_dir=self.cache_dir)
+        self.assertTrue(cached.cache_hit)
+        self.assertEqual(cached.source_hash, Survey_Data.file_content_hash(self.xlsx))
+
+
+class TestSurveyDataLazy(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.xlsx = os.path.join(self.tmp_dir, 'survey.xlsx')
+        write_test_excel(self.xlsx)
+        self.full = SurveyData(self.xlsx)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_lazy_only_loads_core_columns(self):
+        lazy = SurveyData(self.xlsx, lazy=True)
+        self.assertEqual(list(lazy.df.columns), ['ID', '样本状态'])
+        pd.testing.assert_frame_equal(lazy.qinfo, self.full.qinfo)
+
+    def test_lazy_answers_match_full_load(self):
+        lazy = SurveyData(self.xlsx, lazy=True)
+        answers = lazy.get_answers_by_qid('S6')
+        pd.testing.assert_frame_equal(answers, self.full.get_answers_by_qid('S6'))
+        # 只多读入了S6的列
+        self.assertEqual(lazy.df.shape[1], 2 + answers.shape[1])
+
+    def test_lazy_load_after_filtering_rows(self):
+        from ultis import drop_invalid_samples
+        lazy = SurveyData(self.xlsx, lazy=True)
+        lazy.df = drop_invalid_samples(lazy.df)
+        answers = lazy.get_answers_by_qid('S2')
+        expected = drop_invalid_samples(self.full.df)[answers.columns]
+        pd.testing.assert_frame_equal(answers, expected)
+
+    def test_lazy_and_cache_are_exclusive(self):
+        with self.assertRaises(ValueError):
+            SurveyData(self.xlsx, cache_dir=self.tmp_dir, lazy=True)
+
+
+class TestSurveyDataCompact(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.xlsx = os.path.join(self.tmp_dir, 'survey.xlsx')
+        write_test_excel(self.xlsx)
+        self.full = SurveyData(self.xlsx)
+        self.compact = SurveyData(self.xlsx, compact=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_compact_dtypes(self):
+        df = self.compact.df
+        # 单选题保留原字符串取值（重复值多时为category），只有排名列转为整数
+        pd.testing.assert_series_equal(df['S2How likely are you to recommend? (Single choice)'].astype(object),
+                                       self.full.df['S2How likely are you to recommend? (Single choice)'])
+        self.assertEqual(str(df['S6Which of the following? (Multiple choice)_Option A'].dtype), 'boolean')
+        # 填空列保留文本
+        self.assertEqual(df['S6Which of the following? (Multiple choice)_填空1'].dtype, object)
+        self.assertEqual(str(df['S67Please rank the factors (rank)_Price'].dtype), 'Int8')
+
+    def test_compact_keeps_ids_and_codes(self):
+        df = pd.DataFrame({
+            'ID': ['110', '0111', '112'],
+            'S3Region code (Single choice)': ['01', '02', '01'],
+            'S2How likely are you to recommend? (Single choice)': ['10', '9', '3'],
+        })
+        survey = SurveyData.from_frames(df.copy())
+        survey.compact()
+        self.assertEqual(survey.df['ID'].dtype, object)
+        self.assertEqual(survey.get_answer('110')['ID'], '110')
+        self.assertEqual(survey.get_answer('0111')['ID'], '0111')
+        self.assertEqual(list(survey.get_answers_by_qid('S3').iloc[:, 0].astype(str)), ['01', '02', '01'])
+
+    def test_compact_crosstab_labels_match_full(self):
+        from analysis import cross_analysis_handler
+        from tab_book import build_tab_book
+        from test_fixtures import make_export
+        df = make_export(300, 0)
+        full = SurveyData.from_frames(df.copy())
+        compact = SurveyData.from_frames(df.copy())
+        compact.compact()
+        self.assertIsInstance(compact.df['S2How likely are you to recommend? (Single choice)'].dtype,
+                              pd.CategoricalDtype)
+        for args in [{'row_qid': 'S2', 'col_qid': 'S62'}, {'row_qid': 'S62', 'col_qid': 'S2'},
+                     {'row_qid': 'S2', 'col_qid': 'S62', 'is_nps': True}]:
+            expected = cross_analysis_handler(full, args)
+            got = cross_analysis_handler(compact, args)
+            self.assertEqual(list(got), list(expected))
+            for label in expected:
+                self.assertEqual(list(got[label].index), list(expected[label].index))
+                self.assertEqual(list(got[label].columns), list(expected[label].columns))
+        pd.testing.assert_frame_equal(build_tab_book(compact, ['S2'], ['S62'])['S2'],
+                                      build_tab_book(full, ['S2'], ['S62'])['S2'])
+
+    def test_memory_report(self):
+        report = self.compact.memory_report
+        self.assertIn('合计', report.index)
+        self.assertEqual(report.loc['合计', '列数'], self.full.df.shape[1])
+        self.assertLess(report.loc['合计', '压缩后(MB)'], report.loc['合计', '压缩前(MB)'])
+
+    def test_metrics_on_compact_data(self):
+        from metrics_cal import calc_nps_from_series, nps_table
+        from cross_analysis import multiple_choice_dummy
+        from ultis import to_numeric_series
+        full_s2 = self.full.get_answers_by_qid('S2')
+        compact_s2 = self.compact.get_answers_by_qid('S2')
+        self.assertEqual(calc_nps_from_series(full_s2.iloc[:, 0])[0], calc_nps_from_series(compact_s2.iloc[:, 0])[0])
+        pd.testing.assert_frame_equal(nps_table(full_s2), nps_table(compact_s2))
+        pd.testing.assert_frame_equal(multiple_choice_dummy(self.full, 'S6'), multiple_choice_dummy(self.compact, 'S6'))
+        status = self.compact.df['样本状态']
+        self.assertIsInstance(status.dtype, pd.CategoricalDtype)
+        self.assertTrue(to_numeric_series(status).isna().all())
+
+
+class TestSurveyDataIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.xlsx = os.path.join(self.tmp_dir, 'survey.xlsx')
+        write_test_excel(self.xlsx)
+        self.survey = SurveyData(self.xlsx)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_multi_choice_info_matches_qinfo_scan(self):
+        from ultis import preprocess_multi_choice
+        for qid in self.survey.qinfo['original_qid'].unique():
+            self.assertEqual(preprocess_multi_choice(self.survey, qid),
+                             preprocess_multi_choice(self.survey.qinfo, qid))
+        option_cols, txt_cols, _, _ = preprocess_multi_choice(self.survey, 'S6')
+        self.assertEqual(len(option_cols), 2)
+        self.assertEqual(len(txt_cols), 1)
+        # 返回副本，修改不影响索引
+        option_cols.append('x')
+        self.assertEqual(len(preprocess_multi_choice(self.survey, 'S6')[0]), 2)
+
+    def test_get_answer_follows_filtered_df(self):
+        from ultis import drop_invalid_samples
+        self.assertEqual(self.survey.get_answer('a3')['样本状态'], '无效')
+        self.survey.df = drop_invalid_samples(self.survey.df)
+        self.assertEqual(self.survey.get_answer('a3'), {})
+        self.assertEqual(self.survey.get_answer('a4')['ID'], 'a4')
+
+    def test_derived_column_updates_index(self):
+        values = self.survey.df['样本状态'].map({'有效': 'v', '无效': 'i'})
+        self.survey.add_derived_column('g1 status group', values, original_qid='g1', short_name='status group')
+        answers, qtype = self.survey.get_answers_by_qid('g1', return_qtype=True)
+        self.assertEqual(qtype, 'S')
+        self.assertEqual(answers.iloc[:, 0].tolist(), ['v', 'v', 'i', 'v'])
+        self.assertEqual(self.survey.get_question_info('g1 status group')['short_name'], 'status group')
+        self.assertIn('g1 status group', self.survey.get_columns_by_type('S'))
+
+    def test_unknown_qid_raises(self):
+        with self.assertRaises(ValueError):
+            self.survey.get_answers_by_qid('X99')
+        with self.assertRaises(ValueError):
+            self.survey.get_qtype('X99')
+        with self.assertRaises(ValueError):
+            self.survey.get_qid_label('X99')
+
+
+if __name__ == '__main__':
+    unittest.main()
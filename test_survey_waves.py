@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from survey_waves import align_qinfo, load_waves, question_text_key, stack_surveys
+from Survey_Data import SurveyData
+from metrics_cal import calc_nps_by_group
+from cross_analysis import cross_analysis
+
+
+NPS_TEXT = 'How likely are you to recommend? (Single choice)'
+
+
+def wave_frames():
+    # 第二波次题号整体后移（S2 -> S3），新增一道题S2，并多出一个多选选项
+    first = pd.DataFrame({
+        'ID': ['a1', 'a2', 'a3'],
+        '样本状态': ['有效', '有效', '无效'],
+        'S2' + NPS_TEXT: ['10', '6', '9'],
+        'S6Which apply? (Multiple choice)_A': ['A', None, 'A'],
+    })
+    second = pd.DataFrame({
+        'ID': ['b1', 'b2'],
+        '样本状态': ['有效', '有效'],
+        'S2What is your age? (Single choice)': ['18-24', '25-34'],
+        'S3' + NPS_TEXT: ['9', '10'],
+        'S7Which apply? (Multiple choice)_A': [None, 'A'],
+        'S7Which apply? (Multiple choice)_B': ['B', None],
+    })
+    return first, second
+
+
+class TestSurveyWaves(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.paths = []
+        for i, frame in enumerate(wave_frames()):
+            path = os.path.join(self.tmp_dir, f'wave{i + 1}.xlsx')
+            frame.to_excel(path, index=False)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_question_text_key(self):
+        self.assertEqual(question_text_key('S63What  is your age?'), 'What is your age?')
+        self.assertEqual(question_text_key('样本状态'), '样本状态')
+
+    def test_align_by_question_text(self):
+        surveys = [SurveyData.from_frames(f) for f in wave_frames()]
+        unified, renames = align_qinfo([s.qinfo for s in surveys])
+        self.assertEqual(renames[1]['S3' + NPS_TEXT], 'S2' + NPS_TEXT)
+        self.assertEqual(renames[1]['S7Which apply? (Multiple choice)_A'], 'S6Which apply? (Multiple choice)_A')
+        # 新增选项归入已对齐的题号；与已有题号冲突的新题改用下一个空闲编号
+        self.assertEqual(renames[1]['S7Which apply? (Multiple choice)_B'], 'S6Which apply? (Multiple choice)_B')
+        new_qid = unified.set_index('raw_col').loc[renames[1]['S2What is your age? (Single choice)'], 'original_qid']
+        self.assertEqual(new_qid, 'S7')
+        self.assertEqual(len(unified), 6)
+
+    def test_load_and_group_by_wave(self):
+        for parallel in (None, 'thread'):
+            survey = load_waves({'2425': self.paths[0], '2526': self.paths[1]}, parallel=parallel, valid_only=True)
+            self.assertEqual(len(survey.df), 4)
+            self.assertEqual(survey.get_qtype('wave'), 'S')
+            self.assertEqual(survey.df['wave'].tolist(), ['2425', '2425', '2526', '2526'])
+            scores = survey.get_answers_by_qid('S2').iloc[:, 0]
+            stats = calc_nps_by_group(scores, survey.df['wave'])
+            self.assertEqual(stats['nps'].tolist(), [0.0, 100.0])
+            self.assertEqual(survey.get_multi_choice_info('S6')[0][-1], 'S6Which apply? (Multiple choice)_B')
+            cross = cross_analysis(survey, 'S2', 'wave', is_nps=True)
+            self.assertEqual(list(cross.columns[:2]), ['2425_整体调研用户', '2425_占比/百分比'])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            load_waves(self.paths, parallel='gpu')
+        with self.assertRaises(ValueError):
+            stack_surveys([SurveyData.from_frames(wave_frames()[0])], waves=['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import io
+import unittest
+import numpy as np
+import pandas as pd
+from ultis import save_multi_tables_to_excel, tables_to_excel_bytes, crosstab_percentages, add_total_column_by_percent_sum
+
+
+class TestExcelExport(unittest.TestCase):
+    def setUp(self):
+        self.tables = {
+            'S2': pd.DataFrame({'计数': [10, np.nan, 3], '占比': ['100.00%', None, '30.00%']}, index=['Base', '0', '1']),
+            'others': pd.DataFrame({'others补充': ['a', 'b']}),
+        }
+
+    def read_back(self, data):
+        return pd.read_excel(io.BytesIO(data), sheet_name=None, index_col=0)
+
+    def test_bytes_roundtrip(self):
+        sheets = self.read_back(tables_to_excel_bytes(self.tables))
+        self.assertEqual(list(sheets), ['S2', 'others'])
+        self.assertEqual(sheets['S2'].loc['Base', '计数'], 10)
+        self.assertEqual(sheets['S2'].loc['1', '占比'], '30.00%')
+
+    def test_constant_memory_matches_default(self):
+        default = self.read_back(tables_to_excel_bytes(self.tables))
+        streamed = self.read_back(tables_to_excel_bytes(self.tables, constant_memory=True))
+        for label in default:
+            pd.testing.assert_frame_equal(default[label], streamed[label])
+
+    def test_buffer_mode_returns_buffer(self):
+        buffer = io.BytesIO()
+        out = save_multi_tables_to_excel(self.tables, 'S2', 'nps', buffer=buffer, show_print=False)
+        self.assertIs(out, buffer)
+        self.assertGreater(len(buffer.getvalue()), 0)
+
+
+class TestCrosstabPercentages(unittest.TestCase):
+    def setUp(self):
+        self.cross_tab = pd.DataFrame({'A': [4, 3, 1], 'B': [5, 0, 5], 'C': [0, 0, 0]}, index=['Base', 'x', 'y'])
+
+    def test_all_percentages(self):
+        pct = crosstab_percentages(self.cross_tab)
+        self.assertEqual(pct['base'].tolist(), [4, 5, 0, 9])
+        self.assertAlmostEqual(pct['col_pct'].loc['x', 'A'], 75.0)
+        self.assertEqual(pct['col_pct'].loc['x', 'C'], 0.0)
+        self.assertAlmostEqual(pct['col_pct'].loc['y', '总计'], 6 / 9 * 100)
+        self.assertAlmostEqual(pct['row_pct'].loc['y', 'B'], 5 / 6 * 100)
+        self.assertEqual(pct['row_pct'].loc['x', '总计'], 100.0)
+        self.assertAlmostEqual(pct['total_pct'].loc['y', 'B'], 5 / 9 * 100)
+
+    def test_formatted_and_no_base(self):
+        pct = crosstab_percentages(self.cross_tab.drop('Base'), formatted=True)
+        self.assertEqual(pct['col_pct'].loc['x', 'A'], '75.00%')
+        self.assertEqual(pct['col_pct'].loc['x', 'B'], '0.00%')
+        self.assertEqual(pct['base']['总计'], 9)
+
+    def test_add_total_column(self):
+        table = add_total_column_by_percent_sum(self.cross_tab)
+        self.assertEqual(list(table.columns), ['A', 'B', 'C', '总计'])
+        self.assertEqual(table.loc['Base', '总计'], 9)
+        self.assertEqual(table.loc['Base', 'A'], 4)
+        self.assertEqual(table.loc['x', 'A'], '75.00%')
+        self.assertEqual(table.loc['y', '总计'], '66.67%')
+        # 输入不被修改
+        self.assertEqual(self.cross_tab.loc['x', 'A'], 3)
+
+    def test_add_total_column_weighted(self):
+        weighted = pd.DataFrame({'A': [120.456, 80.2], 'B': [225.434, 100.0]}, index=['Base', 'x'])
+        table = add_total_column_by_percent_sum(weighted)
+        self.assertEqual(table.loc['Base', '总计'], 345.89)
+        self.assertEqual(table.loc['Base', 'A'], 120.46)
+        self.assertEqual(table.loc['Base', 'B'], 225.43)
+        self.assertEqual(table.loc['x', '总计'], f'{180.2 / 345.89 * 100:.2f}%')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import numpy as np
+import pandas as pd
+from Survey_Data import SurveyData
+from weighting import rake, rake_survey, encode_margin
+
+
+class TestRaking(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        n = 5000
+        self.df = pd.DataFrame({
+            'inc': rng.choice(['a', 'b', 'c'], n, p=[.5, .3, .2]),
+            'age': rng.choice(['y', 'm', 'o'], n, p=[.2, .3, .5]),
+            'reg': rng.choice(['N', 'S', None], n, p=[.6, .35, .05]),
+        })
+        self.targets = {
+            'inc': {'a': 1, 'b': 1, 'c': 1},
+            'age': {'y': .3, 'm': .4, 'o': .3},
+            'reg': {'N': .5, 'S': .5},
+        }
+
+    def test_margins_match_targets(self):
+        result = rake(self.df, self.targets)
+        self.assertTrue(result.converged)
+        w = result.weights
+        self.assertAlmostEqual(w.mean(), 1.0)
+        for col, margin in self.targets.items():
+            share = w.groupby(self.df[col]).sum() / w[self.df[col].notna()].sum()
+            props = pd.Series(margin, dtype=float) / sum(margin.values())
+            np.testing.assert_allclose(share.reindex(props.index), props, atol=1e-6)
+        report = result.margins.set_index(['margin', 'category'])
+        self.assertAlmostEqual(report.loc[('age', 'y'), 'target'], 30.0)
+        self.assertLess(result.efficiency, 100)
+        self.assertAlmostEqual(result.design_effect, 100 / result.efficiency)
+
+    def test_single_margin_is_post_stratification(self):
+        df = pd.DataFrame({'g': ['a', 'a', 'a', 'b']})
+        result = rake(df, {'g': {'a': .5, 'b': .5}}, total=100)
+        np.testing.assert_allclose(result.weights, [50 / 3] * 3 + [50])
+        self.assertEqual(result.iterations, 1)
+
+    def test_trim_bounds(self):
+        plain = rake(self.df, self.targets)
+        result = rake(self.df, self.targets, trim=(0.5, 1.5))
+        self.assertGreater(result.trim_rounds, 0)
+        self.assertGreater(result.n_trimmed, 0)
+        self.assertLess(result.weights.max(), plain.weights.max())
+        self.assertIsNotNone(result.summary()['within_trim'])
+
+    def test_invalid_targets(self):
+        with self.assertRaises(ValueError):
+            encode_margin(pd.Series(['a', 'x']), {'a': 1}, name='g')
+        with self.assertRaises(ValueError):
+            rake(self.df, {'inc': {'a': 1, 'b': 1, 'c': 1, 'z': 1}})
+        with self.assertRaises(ValueError):
+            rake(self.df, self.targets, trim=(2, 3))
+
+    def test_rake_survey_sets_weights(self):
+        survey = SurveyData.from_frames(self.df.rename(columns={'inc': 'S1.收入'}))
+        targets = {'S1': self.targets['inc'], 'age': self.targets['age']}
+        result = rake_survey(survey, targets, name='rk')
+        self.assertEqual(survey.weight_col, 'rk')
+        pd.testing.assert_series_equal(survey.weights, result.weights, check_names=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import numpy as np
+import pandas as pd
+from Survey_Data import SurveyData
+from ultis import weight_series, effective_base
+from metrics_cal import calc_nps_by_group, calc_nps_stats, calc_nss_matrix, calc_rank_stats, calc_choice_detail
+from cross_analysis import count_cross_analysis, nps_cross_table
+from confidence import nps_ci, nss_ci
+from significance import nps_difference_tests, column_proportion_tests
+
+
+class TestWeights(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        n = 40
+        self.df = pd.DataFrame({
+            'nps': rng.integers(0, 11, n).astype(str),
+            'sat': rng.integers(1, 6, n),
+            'rank': rng.choice([1, 2, 3, np.nan], n),
+            'grp': rng.choice(['A', 'B'], n),
+            'opt': rng.choice(['x', None], n),
+        })
+        self.df.loc[[2, 5], 'nps'] = None
+        self.w = pd.Series(rng.integers(1, 4, n).astype(float))
+        # 整数权重等价于把样本复制w次
+        self.dup = self.df.loc[self.df.index.repeat(self.w.astype(int))].reset_index(drop=True)
+
+    def test_uniform_weights_match_unweighted(self):
+        ones = np.ones(len(self.df))
+        weighted = calc_nps_by_group(self.df['nps'], self.df['grp'], weights=ones)
+        plain = calc_nps_by_group(self.df['nps'], self.df['grp'])
+        pd.testing.assert_frame_equal(weighted.drop(columns='eff_base'), plain, check_dtype=False)
+        np.testing.assert_allclose(weighted['eff_base'], plain['base'])
+        pd.testing.assert_frame_equal(nps_cross_table(self.df['nps'], self.df['grp'], weights=ones),
+                                      nps_cross_table(self.df['nps'], self.df['grp']))
+
+    def test_integer_weights_match_duplicated_rows(self):
+        w, dup = self.w, self.dup
+        pd.testing.assert_frame_equal(calc_nps_stats(self.df['nps'], w).drop('eff_base').to_frame(),
+                                      calc_nps_stats(dup['nps']).to_frame(), check_dtype=False)
+        pd.testing.assert_frame_equal(calc_nss_matrix(self.df[['sat']], w).drop(columns='eff_base'),
+                                      calc_nss_matrix(dup[['sat']]), check_dtype=False)
+        pd.testing.assert_frame_equal(calc_rank_stats(self.df[['rank']], 3, weights=w),
+                                      calc_rank_stats(dup[['rank']], 3), check_dtype=False)
+        pd.testing.assert_frame_equal(calc_choice_detail(self.df, ['opt'], weights=w).drop(columns='eff_base'),
+                                      calc_choice_detail(dup, ['opt']), check_dtype=False)
+        pd.testing.assert_frame_equal(count_cross_analysis(self.df['sat'], self.df['grp'], weights=w),
+                                      count_cross_analysis(dup['sat'], dup['grp']), check_dtype=False)
+
+    def test_effective_base_drives_intervals(self):
+        w = self.w
+        ci = nps_ci(self.df['nps'], weights=w)
+        answered = self.df['nps'].notna()
+        self.assertAlmostEqual(ci.loc[0, 'base'], w[answered].sum())
+        self.assertAlmostEqual(ci.loc[0, 'eff_base'], float(effective_base(w[answered])))
+        # 有效样本量小于复制样本数，区间比复制数据更宽
+        self.assertGreater(ci.loc[0, 'se'], nps_ci(self.dup['nps']).loc[0, 'se'])
+        self.assertIn('eff_base', nss_ci(self.df[['sat']], weights=w).columns)
+        tests = nps_difference_tests(self.df['nps'], self.df['grp'], weights=w)
+        self.assertEqual(list(tests['stats'].columns[:2]), ['base', 'eff_base'])
+
+    def test_eff_bases_in_column_tests(self):
+        table = pd.DataFrame({'A': [100.0, 60.0], 'B': [100.0, 40.0]}, index=['Base', 'x'])
+        loose = column_proportion_tests(table, eff_bases={'A': 20, 'B': 20})
+        strict = column_proportion_tests(table)
+        self.assertGreater(loose['p_values'].loc[('x', 'A'), 'B'], strict['p_values'].loc[('x', 'A'), 'B'])
+        same = column_proportion_tests(table, eff_bases=[100, 100])
+        pd.testing.assert_frame_equal(same['p_values'], strict['p_values'])
+
+    def test_weight_validation(self):
+        with self.assertRaises(ValueError):
+            weight_series([1, -1], pd.RangeIndex(2))
+        with self.assertRaises(ValueError):
+            weight_series([1, 2, 3], pd.RangeIndex(2))
+        np.testing.assert_array_equal(weight_series(pd.Series([2.0], index=[1]), pd.RangeIndex(2)), [0.0, 2.0])
+
+    def test_survey_set_weights(self):
+        df = pd.DataFrame({'ID': ['1', '2', '3'], 'S1.你推荐吗': ['10', '0', '9']})
+        survey = SurveyData.from_frames(df)
+        self.assertIsNone(survey.weights)
+        survey.set_weights([1.0, 3.0, 0.5], name='w')
+        self.assertEqual(survey.weight_col, 'w')
+        self.assertEqual(survey.get_qtype('w'), 'META')
+        self.assertAlmostEqual(calc_nps_stats(survey.df['S1.你推荐吗'], survey.weights)['base'], 4.5)
+        survey.set_weights(None)
+        self.assertIsNone(survey.weights)
+        with self.assertRaises(ValueError):
+            survey.set_weights('missing')
+
+
+if __name__ == '__main__':
+    unittest.main()
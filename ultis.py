@@ -1,3 +1,5 @@
+import io
+import numpy as np
 import pandas as pd
 import re
 def drop_invalid_samples(df, status_col='样本状态', valid_value='有效'):
@@ -41,6 +43,7 @@ def check_question_type(qtype, expected_types, qid=None):
 def to_numeric_series(answers_df):
     """
     将单列DataFrame或Series转换成数字型Series，自动剔除非数字（转为NaN）
+    紧凑存储的列：数值型直接返回；category只解析各类别一次，再按编码取值
     """
     if isinstance(answers_df, pd.DataFrame):
         if answers_df.shape[1] != 1:
@@ -48,16 +51,78 @@ def to_numeric_series(answers_df):
         ser = answers_df.iloc[:, 0]
     else:
         ser = answers_df
+    if isinstance(ser.dtype, pd.CategoricalDtype):
+        cat_values = pd.to_numeric(pd.Series(ser.cat.categories), errors='coerce').to_numpy(dtype=float)
+        codes = ser.cat.codes.to_numpy()
+        values = np.where(codes >= 0, cat_values[codes], np.nan) if len(cat_values) else np.full(len(ser), np.nan)
+        return pd.Series(values, index=ser.index, name=ser.name)
     return pd.to_numeric(ser, errors='coerce')
 
+def to_numeric_matrix(df):
+    """
+    将多列DataFrame一次转换成float矩阵，非数字/缺失为NaN
+    数值型与category列走to_numeric_series快速路径，其余文本列拼成一列只调用一次pd.to_numeric
+    返回
+        shape (行数, 列数) 的float64 ndarray
+    """
+    out = np.full(df.shape, np.nan)
+    text_pos = []
+    for j, (_, ser) in enumerate(df.items()):
+        if isinstance(ser.dtype, pd.CategoricalDtype) or pd.api.types.is_numeric_dtype(ser.dtype):
+            out[:, j] = to_numeric_series(ser).astype('float64').to_numpy()
+        else:
+            text_pos.append(j)
+    if text_pos:
+        flat = df.iloc[:, text_pos].to_numpy(dtype=object).ravel(order='F')
+        values = pd.to_numeric(pd.Series(flat), errors='coerce').astype('float64').to_numpy()
+        out[:, text_pos] = values.reshape((len(df), len(text_pos)), order='F')
+    return out
+
+def weight_series(weights, index):
+    """
+    把样本权重对齐到数据行
+    输入
+        weights: None、与index对齐的Series，或与index等长的数组（按位置对应）
+        index:   数据的行索引
+    返回
+        float Series（缺失权重记为0，即不计入），weights为None时返回None
+    """
+    if weights is None:
+        return None
+    if isinstance(weights, pd.Series):
+        ser = weights.reindex(index)
+    else:
+        values = np.asarray(weights, dtype=np.float64)
+        if values.shape != (len(index),):
+            raise ValueError(f"权重长度应为{len(index)}，实际为{values.size}。")
+        ser = pd.Series(values, index=index)
+    ser = pd.to_numeric(ser, errors='coerce').astype('float64').fillna(0.0)
+    if (ser < 0).any():
+        raise ValueError("样本权重不能为负数。")
+    return ser
+
+
+def effective_base(weights, axis=None):
+    """
+    有效样本量 (Σw)² / Σw²（Kish），权重全相等时等于样本数；Σw²为0时为0
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    total = weights.sum(axis=axis)
+    squares = (weights ** 2).sum(axis=axis)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(squares > 0, total ** 2 / np.where(squares > 0, squares, 1), 0.0)
+
+
 def preprocess_multi_choice(qinfo, original_qid):
     """
     输入
-        qinfo:   survey.qinfo
+        qinfo:   SurveyData对象（走题号索引，推荐），或survey.qinfo
         original_qid: 例如'S27'
     返回
         tuple (选择项列名list, 填空型列名list, 选项短名dict)
     """
+    if hasattr(qinfo, 'get_multi_choice_info'):
+        return qinfo.get_multi_choice_info(original_qid)
     # 拿到所有相关列
     mask = (qinfo['original_qid'] == original_qid)
     rows = qinfo[mask]
@@ -87,27 +152,107 @@ def preprocess_multi_choice(qinfo, original_qid):
 #     df.to_excel(file_path, index=True)
 #     print(f"已保存到: {file_path}")
 
-def save_multi_tables_to_excel(tables: dict, original_qid, analysis_name, out_dir='.', show_print=True):
+def sheet_name(label, used=None):
+    """
+    Excel sheet名：去掉不允许的字符[]:*?/\\（替换为_），不大于31字符
+    used: 可选，已用的sheet名集合（小写）；截断后重名时加~2、~3...后缀，并把结果加入集合
+    """
+    name = base = re.sub(r'[\[\]:*?/\\]', '_', str(label))[:31]
+    if used is not None:
+        n = 2
+        # Excel的sheet名不区分大小写
+        while name.lower() in used:
+            suffix = f"~{n}"
+            name = base[:31 - len(suffix)] + suffix
+            n += 1
+        used.add(name.lower())
+    return name
+
+
+def save_multi_tables_to_excel(tables: dict, original_qid, analysis_name, out_dir='.', show_print=True,
+                               buffer=None, engine=None, constant_memory=False, images=None):
     """
     输入：
         tables: dict {sheet名: DataFrame}，每个表保存为一个sheet
         original_qid: 题号（S27、M10等）
         analysis_name: 分析名称（如'NSS分析','多选题统计','排序题统计'等，不要带.）
         out_dir:     输出目录，默认当前目录
+        buffer:      可选，BytesIO等可写对象；指定时直接写入buffer，不落盘（out_dir被忽略）
+        engine:      Excel写入引擎，'xlsxwriter'或'openpyxl'，默认由pandas选择（装了xlsxwriter时优先用它）
+        constant_memory: 使用xlsxwriter的constant_memory模式逐行写出，大表册内存占用不随行数增长
+        images:      可选，dict {sheet名: PNG图片bytes}（如quadrant_chart.render_quadrants的结果），每张图单独一个sheet
+    返回：
+        写入的文件路径，或buffer
     """
-    # 构造文件名
-    file_name = f"{original_qid}_{analysis_name}.xlsx"
-    file_path = f"{out_dir}/{file_name}".replace('//','/')
+    if buffer is not None:
+        target = buffer
+    else:
+        # 构造文件名
+        file_name = f"{original_qid}_{analysis_name}.xlsx"
+        target = f"{out_dir}/{file_name}".replace('//','/')
 
-    with pd.ExcelWriter(file_path) as ew:
+    if constant_memory:
+        engine = 'xlsxwriter'
+    engine_kwargs = {'options': {'constant_memory': True}} if constant_memory else None
+    with pd.ExcelWriter(target, engine=engine, engine_kwargs=engine_kwargs) as ew:
+        used = set()
         for label, table in tables.items():
-            # Excel sheet名不能大于31字符
-            sheetn = str(label)[:31]
-            table.to_excel(ew, sheet_name=sheetn)
+            sheetn = sheet_name(label, used)
+            if constant_memory:
+                # constant_memory模式只能按行顺序写，pandas的to_excel按列写，需逐行写出
+                _write_table_rows(ew.book.add_worksheet(sheetn), table)
+            else:
+                table.to_excel(ew, sheet_name=sheetn)
             if show_print:
                 print(f"已写入: {sheetn}")
-    if show_print:
-        print(f"全部结果已保存到: {file_path}")
+        for label, data in (images or {}).items():
+            sheetn = sheet_name(label, used)
+            _insert_image(ew, sheetn, data)
+            if show_print:
+                print(f"已写入图片: {sheetn}")
+    if show_print and buffer is None:
+        print(f"全部结果已保存到: {target}")
+    return target
+
+
+def tables_to_excel_bytes(tables: dict, engine=None, constant_memory=False, images=None):
+    """
+    把 {sheet名: DataFrame} 写成xlsx并返回bytes（全程在内存中完成，可直接用于下载）
+    images: 可选，{sheet名: PNG图片bytes}，每张图单独一个sheet
+    """
+    buffer = io.BytesIO()
+    save_multi_tables_to_excel(tables, None, None, buffer=buffer, engine=engine,
+                               constant_memory=constant_memory, show_print=False, images=images)
+    return buffer.getvalue()
+
+
+def _insert_image(ew, sheetn, data):
+    """新建sheet并在A1插入PNG图片（bytes）"""
+    if ew.engine == 'xlsxwriter':
+        ew.book.add_worksheet(sheetn).insert_image('A1', f'{sheetn}.png', {'image_data': io.BytesIO(data)})
+    else:
+        from openpyxl.drawing.image import Image
+        ew.book.create_sheet(sheetn).add_image(Image(io.BytesIO(data)), 'A1')
+
+
+def _excel_value(value):
+    """把单元格值转为xlsxwriter可写的类型，缺失值写为空白"""
+    if isinstance(value, tuple):
+        return ' / '.join(str(v) for v in value)
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _write_table_rows(worksheet, table):
+    """逐行写出DataFrame（首列为索引，首行为列名），供constant_memory模式使用"""
+    header = [_excel_value(table.index.name) or ''] + [_excel_value(c) for c in table.columns]
+    worksheet.write_row(0, 0, header)
+    for r, (idx, values) in enumerate(zip(table.index, table.itertuples(index=False, name=None)), start=1):
+        worksheet.write_row(r, 0, [_excel_value(idx)] + [_excel_value(v) for v in values])
+
 
 def map_income_group(series, mapping, unknown_val=pd.NA):
     """
@@ -140,27 +285,18 @@ def process_income_group(survey, original_qid='S68', group_col_name='g1 income g
         'dPrefer not to say': ['Prefer not to say']
     }
     
-    # 获取收入列
-    income_col = survey.qinfo[survey.qinfo['original_qid'] == original_qid]['raw_col'].iloc[0]
-    
-    # 应用分组映射
-    survey.df[group_col_name] = map_income_group(survey.df[income_col], income_group_mapping)
-    
-    # 更新qinfo
-    if group_col_name not in survey.qinfo['raw_col'].values:
-        survey.qinfo = pd.concat([
-            survey.qinfo,
-            pd.DataFrame([{
-                'raw_col': group_col_name,
-                'original_qid': 'g1',
-                'question_id': 'g1',
-                'qtype': 'S',
-                'short_name': 'income group'
-            }])
-        ], ignore_index=True)
-    
+    # 获取收入列（按需加载模式下会在此时读入该列）
+    income_s = survey.get_answers_by_qid(original_qid).iloc[:, 0]
+
+    # 应用分组映射，并登记到qinfo（同时更新题号索引）
+    survey.add_derived_column(
+        group_col_name, map_income_group(income_s, income_group_mapping),
+        original_qid='g1', qtype='S', short_name='income group'
+    )
+
     # 设置g1列
     survey.qinfo.loc[survey.qinfo['original_qid'] == original_qid, 'g1'] = '收入分组'
+    survey.refresh_index()
 
 def merge_others(series, keywords=('other', '其他')):
     """
@@ -180,32 +316,98 @@ def merge_others(series, keywords=('other', '其他')):
         return x
     return series.map(map_func)
 
+def format_base(value):
+    """Base/计数的展示值：整数原样取整，加权后的非整数保留2位小数"""
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 2)
+
+
+def format_counts(values):
+    """计数列的展示值：全为整数时转为int，否则（加权）保留2位小数"""
+    values = np.asarray(values, dtype=np.float64)
+    if np.all(values == np.round(values)):
+        return values.astype(np.int64)
+    return np.round(values, 2)
+
+
+def format_percent(values):
+    """
+    把百分比数值数组整体格式化为"xx.xx%"字符串（与f"{v:.2f}%"相同），返回同形状的object数组
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return np.char.add(np.char.mod('%.2f', values), '%').astype(object)
+
+
+def crosstab_percentages(cross_tab, group_cols=None, total_colname='总计', formatted=False):
+    """
+    交叉表百分比引擎：列百分比、行百分比、总百分比及总计列由整块数组运算一次得到
+    输入
+        cross_tab: 频数表，'Base'行为各列Base（没有Base行时以各列合计作为Base）
+        group_cols: 参与计算的分组列list，默认全部非总计非Base列
+        total_colname: 总计列名
+        formatted: 为True时百分比格式化为"xx.xx%"字符串
+    返回
+        dict:
+            'base':      Series，各分组列Base + 总计列(Base合计)
+            'col_pct':   列百分比，频数/该列Base；总计列为行合计/Base合计
+            'row_pct':   行百分比，频数/行合计；总计列为100（行合计为0时为0）
+            'total_pct': 总百分比，频数/Base合计；总计列为行合计/Base合计
+        百分比表的行为除Base外的各行，列为 group_cols + [total_colname]；分母为0时百分比为0
+    """
+    if group_cols is None:
+        group_cols = [c for c in cross_tab.columns if c != total_colname]
+    group_cols = list(group_cols)
+    body = cross_tab.loc[cross_tab.index != 'Base', group_cols]
+    counts = body.to_numpy(dtype=np.float64)
+    if 'Base' in cross_tab.index:
+        base = cross_tab.loc['Base', group_cols].to_numpy(dtype=np.float64)
+    else:
+        base = np.nansum(counts, axis=0)
+    # 与Series.sum一致，缺失值不参与合计
+    base_sum = np.nansum(base)
+    row_sum = np.nansum(counts, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        col_pct = np.where(base != 0, counts / base * 100, 0.0)
+        row_pct = np.where(row_sum[:, None] != 0, counts / row_sum[:, None] * 100, 0.0)
+        total_pct = counts / base_sum * 100 if base_sum else np.zeros_like(counts)
+        total_col = row_sum / base_sum * 100 if base_sum else np.zeros_like(row_sum)
+    row_total = np.where(row_sum != 0, 100.0, 0.0)
+
+    columns = group_cols + [total_colname]
+    tables = {}
+    for name, pct, total in [('col_pct', col_pct, total_col), ('row_pct', row_pct, row_total),
+                             ('total_pct', total_pct, total_col)]:
+        values = np.column_stack([pct, total])
+        if formatted:
+            values = format_percent(values)
+        tables[name] = pd.DataFrame(values, index=body.index, columns=columns)
+    tables['base'] = pd.Series(np.append(base, base_sum), index=columns)
+    return tables
+
+
 def add_total_column_by_percent_sum(cross_tab, group_cols=None, total_colname='总计'):
     """
     输入
         cross_tab: crosstab结果，频数表（Base第一行，其余行为分数频次）
         group_cols: 用于求总计列的分组列list，默认全非总计非Base列
         total_colname: 新增列名
+    返回
+        新表（不修改cross_tab）：Base行为各组Base，总计列为Base合计（加权时保留2位小数）；
+        其余行为列百分比字符串，总计列为行合计/Base合计
+    说明
+        百分比由crosstab_percentages整块计算后一次写回，不再逐行.loc赋值
     """
-    # 如果没指定group_cols，自动检测
-    if group_cols is None:
-        group_cols = [c for c in cross_tab.columns if c != total_colname]
-    # 1. 先取分组Base
-    base_row = cross_tab.loc['Base', group_cols].astype(float)
-    base_sum = base_row.sum()
-    # 2. 其它行转百分比并算总计
-    for idx in cross_tab.index:
-        if idx == 'Base':
-            cross_tab.loc[idx, total_colname] = int(base_sum)
-        else:
-            # 各组分数人数
-            scale = cross_tab.loc[idx, group_cols].astype(float)
-            # 列内百分比
-            cross_tab.loc[idx, group_cols] = [
-                f"{(scale[c]/base_row[c]*100 if base_row[c] else 0):.2f}%" for c in group_cols
-            ]
-            # 行总计 — 当前分数的所有分组计数之和 / base_sum
-            cnt_sum = scale.sum()
-            pct = cnt_sum / base_sum * 100 if base_sum else 0
-            cross_tab.loc[idx, total_colname] = f"{pct:.2f}%"
-    return cross_tab
\ No newline at end of file
+    pct = crosstab_percentages(cross_tab, group_cols, total_colname, formatted=True)['col_pct']
+    result = cross_tab.astype(object)
+    if total_colname not in result.columns:
+        result[total_colname] = None
+    # Base行：总计列为各组Base之和；加权后的非整数Base与各组Base一样保留2位小数
+    if 'Base' in result.index:
+        group_cols = list(pct.columns[:-1])
+        bases = cross_tab.loc['Base', group_cols].astype(float)
+        result.loc['Base', group_cols] = [format_base(b) for b in bases]
+        result.loc['Base', total_colname] = format_base(bases.sum())
+    # 其余行：列百分比与总计一次写回
+    result.loc[result.index != 'Base', list(pct.columns)] = pct.to_numpy()
+    return result
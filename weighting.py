@@ -0,0 +1,240 @@
+from ultis import *
+
+# raking默认最大迭代轮数与收敛阈值（各边际加权占比与目标占比的最大绝对差）
+RAKING_MAX_ITER = 100
+RAKING_TOL = 1e-6
+# 截尾后重新raking的最多轮数
+TRIM_MAX_ROUNDS = 20
+
+
+class RakingResult:
+    """
+    raking结果
+    属性
+        weights:      与数据行对齐的权重Series（均值为1；指定total时合计为total）
+        iterations:   最后一次raking的迭代轮数
+        converged:    是否收敛到tol以内
+        max_error:    各边际加权占比与目标占比的最大绝对差（百分点/100）
+        efficiency:   权重效率% = 有效样本量 / 样本数 × 100
+        eff_base:     有效样本量 (Σw)²/Σw²
+        design_effect: 权重设计效应 = 样本数 / 有效样本量
+        trim_rounds:  截尾-再raking的轮数（未截尾为0）
+        n_trimmed:    被截尾过的样本数
+        within_trim:  最终权重是否都在截尾范围内（目标分布与截尾范围冲突时为False，未截尾为None）
+        margins:      DataFrame：margin + category + target + unweighted + weighted（占比%）
+    """
+
+    def __init__(self, weights, iterations, converged, max_error, trim_rounds, n_trimmed, margins, trim=None):
+        self.weights = weights
+        self.iterations = iterations
+        self.converged = converged
+        self.max_error = max_error
+        self.trim_rounds = trim_rounds
+        self.n_trimmed = n_trimmed
+        self.margins = margins
+        self.trim = trim
+        valid = weights.to_numpy()[weights.to_numpy() > 0]
+        self.eff_base = float(effective_base(valid))
+        self.efficiency = self.eff_base / len(valid) * 100 if len(valid) else 0.0
+        self.design_effect = len(valid) / self.eff_base if self.eff_base else np.nan
+        self.within_trim = None
+        if trim is not None:
+            relative = valid / valid.mean() if len(valid) else valid
+            self.within_trim = bool(((relative >= trim[0] - 1e-6) & (relative <= trim[1] + 1e-6)).all())
+
+    def summary(self):
+        """一行汇总：迭代轮数、是否收敛、权重效率、设计效应、截尾情况、权重范围"""
+        w = self.weights
+        return pd.Series({
+            'iterations': self.iterations,
+            'converged': self.converged,
+            'max_error': self.max_error,
+            'efficiency': self.efficiency,
+            'eff_base': self.eff_base,
+            'design_effect': self.design_effect,
+            'trim_rounds': self.trim_rounds,
+            'n_trimmed': self.n_trimmed,
+            'within_trim': self.within_trim,
+            'min_weight': w[w > 0].min() if (w > 0).any() else 0.0,
+            'max_weight': w.max(),
+        })
+
+    def __repr__(self):
+        return (f"RakingResult(iterations={self.iterations}, converged={self.converged}, "
+                f"efficiency={self.efficiency:.2f}%, n_trimmed={self.n_trimmed})")
+
+
+def encode_margin(values, targets, name=None):
+    """
+    把一个边际变量编码为类别号
+    输入
+        values:  Series（如收入分组、年龄段、地区）
+        targets: {类别: 目标占比或人数}，会归一化为占比
+    返回
+        (codes, target_props)：codes为int数组（缺失为-1），target_props与targets顺序一致
+    """
+    categories = list(targets)
+    props = np.asarray([targets[c] for c in categories], dtype=np.float64)
+    if (props < 0).any() or props.sum() <= 0:
+        raise ValueError(f"边际{name}的目标值应为非负数且合计大于0。")
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+    codes = pd.Categorical(values, categories=categories).codes.astype(np.int64)
+    unknown = (codes == -1) & values.notna().to_numpy()
+    if unknown.any():
+        extra = list(pd.unique(values[unknown]))[:5]
+        raise ValueError(f"边际{name}中存在没有目标值的类别: {extra}")
+    return codes, props / props.sum()
+
+
+def _collapse_cells(codes_list, base):
+    """
+    按各边际类别组合把样本折叠成单元格：raking只需在单元格上迭代，每轮耗时与样本量无关
+    返回 (每个边际的单元格类别号list, 单元格基础权重, 样本所在单元格号)
+    """
+    composite = np.zeros(len(base), dtype=np.int64)
+    radices = []
+    for codes in codes_list:
+        radix = int(codes.max()) + 2 if len(codes) else 1
+        composite = composite * radix + (codes + 1)
+        radices.append(radix)
+    cells, inverse = np.unique(composite, return_inverse=True)
+    cell_codes = []
+    for radix in reversed(radices):
+        cells, digit = np.divmod(cells, radix)
+        cell_codes.append(digit - 1)
+    cell_codes.reverse()
+    return cell_codes, np.bincount(inverse, weights=base), inverse
+
+
+def _rake_cells(cell_codes, cell_base, targets, max_iter, tol):
+    """
+    单元格上的IPF：依次把每个边际的加权分布调整到目标占比（该边际缺失的单元格不调整）
+    返回 (单元格权重, 迭代轮数, 是否收敛, 最大误差)
+    """
+    weights = cell_base.copy()
+    masks = [codes >= 0 for codes in cell_codes]
+    error = np.inf
+    for iteration in range(1, max_iter + 1):
+        for codes, valid, target in zip(cell_codes, masks, targets):
+            current = np.bincount(codes[valid], weights=weights[valid], minlength=len(target))
+            goal = target * current.sum()
+            factor = np.divide(goal, current, out=np.ones_like(goal), where=current > 0)
+            weights[valid] *= factor[codes[valid]]
+        error = 0.0
+        for codes, valid, target in zip(cell_codes, masks, targets):
+            current = np.bincount(codes[valid], weights=weights[valid], minlength=len(target))
+            total = current.sum()
+            if total > 0:
+                error = max(error, float(np.abs(current / total - target).max()))
+        if error < tol:
+            return weights, iteration, True, error
+    return weights, max_iter, False, error
+
+
+def rake(frame, targets, base_weights=None, trim=None, max_iter=RAKING_MAX_ITER, tol=RAKING_TOL, total=None):
+    """
+    raking（迭代比例拟合，IPF）：调整样本权重使各边际的加权分布等于总体目标分布
+    输入
+        frame:   DataFrame，包含各边际变量列
+        targets: {列名: {类别: 目标占比或人数}}，如 {'g1': {'a低收入': 0.3, ...}, '地区': {...}}
+        base_weights: 可选，基础权重（如设计权重），默认全为1
+        trim:    可选，(下限, 上限)，相对均值的权重截尾范围，如(0.3, 3)；截尾后重新raking，
+                 直到不再需要截尾（最多TRIM_MAX_ROUNDS轮，最后一步为raking，边际优先于截尾范围）
+        max_iter/tol: 每次raking的最大迭代轮数与收敛阈值
+        total:   可选，权重合计（如总体人数），默认权重均值为1
+    返回
+        RakingResult
+    说明
+        样本先按各边际类别组合折叠成单元格，每轮迭代只是在单元格上做一次bincount和一次取数，
+        10万以上样本、多个边际也能在1秒内收敛；某边际缺失的样本不参与该边际的调整
+    """
+    if not targets:
+        raise ValueError("raking至少需要一个边际。")
+    base = weight_series(base_weights, frame.index)
+    base = np.ones(len(frame)) if base is None else base.to_numpy()
+    codes_list, target_list = [], []
+    for col, margin in targets.items():
+        codes, props = encode_margin(frame[col], margin, name=col)
+        present = np.bincount(codes[(codes >= 0) & (base > 0)], minlength=len(props)) > 0
+        empty = [cat for cat, p, ok in zip(margin, props, present) if p > 0 and not ok]
+        if empty:
+            raise ValueError(f"边际{col}的类别{empty}目标占比大于0，但样本中没有该类别。")
+        codes_list.append(codes)
+        target_list.append(props)
+    if trim is not None and not (0 <= trim[0] <= 1 <= trim[1]):
+        raise ValueError(f"trim应为(下限, 上限)且下限<=1<=上限，实际为{trim}。")
+
+    cell_codes, _, inverse = _collapse_cells(codes_list, base)
+    current = base.copy()
+    trimmed = np.zeros(len(base), dtype=bool)
+    trim_rounds = 0
+    while True:
+        cell_base = np.bincount(inverse, weights=current, minlength=len(cell_codes[0]))
+        cell_weights, iterations, converged, error = _rake_cells(cell_codes, cell_base, target_list, max_iter, tol)
+        # 单元格内各样本按基础权重的比例分配
+        factor = np.divide(cell_weights, cell_base, out=np.zeros_like(cell_weights), where=cell_base > 0)
+        weights = current * factor[inverse]
+        mean = weights[weights > 0].mean() if (weights > 0).any() else 1.0
+        weights = weights / mean
+        if trim is None or trim_rounds >= TRIM_MAX_ROUNDS:
+            break
+        lower, upper = trim
+        outside = (weights > 0) & ((weights < lower * (1 - 1e-9)) | (weights > upper * (1 + 1e-9)))
+        if not outside.any():
+            break
+        trimmed |= outside
+        current = np.where(weights > 0, np.clip(weights, lower, upper), 0.0)
+        trim_rounds += 1
+
+    if total is not None:
+        weights = weights * total / weights.sum()
+    weights = pd.Series(weights, index=frame.index, name='weight')
+    return RakingResult(weights, iterations, converged, error, trim_rounds, int(trimmed.sum()),
+                        _margin_report(frame, targets, codes_list, target_list, base, weights.to_numpy()), trim)
+
+
+def _margin_report(frame, targets, codes_list, target_list, base, weights):
+    """各边际各类别的目标占比、原始（基础权重）占比与加权后占比（%）"""
+    rows = []
+    for col, codes, target in zip(targets, codes_list, target_list):
+        valid = codes >= 0
+        before = np.bincount(codes[valid], weights=base[valid], minlength=len(target))
+        after = np.bincount(codes[valid], weights=weights[valid], minlength=len(target))
+        before = before / before.sum() * 100 if before.sum() else before
+        after = after / after.sum() * 100 if after.sum() else after
+        rows.append(pd.DataFrame({
+            'margin': col, 'category': list(targets[col]),
+            'target': target * 100, 'unweighted': before, 'weighted': after,
+        }))
+    return pd.concat(rows, ignore_index=True)
+
+
+def rake_survey(survey, targets, name='weight', base_weights=None, trim=None,
+                max_iter=RAKING_MAX_ITER, tol=RAKING_TOL, total=None, apply=True):
+    """
+    对SurveyData做raking并（默认）设置为样本权重
+    输入
+        survey:  SurveyData对象
+        targets: {列名或单列题号: {类别: 目标占比或人数}}，
+                 如 {'g1': {...}}（process_income_group生成的收入分组）、{'S3': {...}}（年龄段）
+        name:    权重列名，apply时作为META衍生列加入df
+        apply:   为True时调用survey.set_weights，之后所有指标按该权重计算
+        其余参数同rake
+    返回
+        RakingResult
+    """
+    columns = {}
+    for key in targets:
+        if key in survey.df.columns:
+            columns[key] = survey.df[key]
+        else:
+            answers = survey.get_answers_by_qid(key)
+            if answers.shape[1] != 1:
+                raise ValueError(f"边际{key}应为单列题目或列名。")
+            columns[key] = answers.iloc[:, 0]
+    frame = pd.DataFrame(columns, index=survey.df.index)
+    result = rake(frame, targets, base_weights=base_weights, trim=trim, max_iter=max_iter, tol=tol, total=total)
+    if apply:
+        survey.set_weights(result.weights, name=name)
+    return result